@@ -266,14 +266,14 @@ async def query(request: Request, q: Query):
         
         # Call appropriate AI service with cost tracking
         if model_recommendation["service"] == "gemini":
-            result = ai_service.call_gemini_with_tracking(
+            result = await ai_service.call_gemini_with_tracking(
                 prompt=validation_result.sanitized_input,
                 model=model_recommendation["model"],
                 user_id=user_id,
                 query_type="medical"
             )
         else:  # groq
-            result = ai_service.call_groq_with_tracking(
+            result = await ai_service.call_groq_with_tracking(
                 prompt=validation_result.sanitized_input,
                 model=model_recommendation["model"],
                 user_id=user_id,
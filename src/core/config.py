@@ -35,6 +35,13 @@ class Settings(BaseSettings):
     GROQ_WEIGHT: float = 0.4
     FUSION_CONFIDENCE_THRESHOLD: float = 0.7
     FUSION_MAX_RETRIES: int = 2
+    MAX_CONCURRENT_LLM: int = 10  # provider calls in flight per FusionAIService
+
+    # Prompt response cache
+    PROMPT_CACHE_TTL_SECONDS: int = 3600
+    # Paraphrase matching for plain queries; kept strict so similar questions
+    # about different drugs or conditions don't share an answer
+    PROMPT_CACHE_SEMANTIC_THRESHOLD: float = 0.95
 
     # Security
     SECRET_KEY: str = "your-secret-key-here"
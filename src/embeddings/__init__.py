@@ -3,6 +3,6 @@ ClinChat Embeddings Module
 Handles text embeddings using multiple providers with fusion capabilities
 """
 
-from .openai_embed import ClinChatEmbedding, EmbeddingProvider, FusionEmbedding
+from .openai_embed import HealthAIEmbedding, EmbeddingProvider, FusionEmbedding
 
-__all__ = ["ClinChatEmbedding", "EmbeddingProvider", "FusionEmbedding"]
\ No newline at end of file
+__all__ = ["HealthAIEmbedding", "EmbeddingProvider", "FusionEmbedding"]
\ No newline at end of file
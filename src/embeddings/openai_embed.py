@@ -4,7 +4,9 @@ Creates text embeddings using Google Gemini and Groq APIs with fusion capabiliti
 """
 
 import os
+import time
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional, Union
 import logging
 from sentence_transformers import SentenceTransformer
@@ -64,6 +66,13 @@ class SentenceTransformerProvider(EmbeddingProvider):
 class GeminiEmbeddingProvider(EmbeddingProvider):
     """Google Gemini embedding provider"""
     
+    # Inputs per embed_content request (the API's batch limit), concurrent
+    # requests, and retry attempts per request
+    MAX_BATCH_SIZE = 100
+    MAX_CONCURRENT_BATCHES = 4
+    MAX_RETRIES = 3
+    RETRY_BASE_DELAY_SECONDS = 0.5
+    
     def __init__(self, api_key: str, model_name: str = "models/embedding-001"):
         super().__init__(model_name)
         try:
@@ -88,6 +97,42 @@ class GeminiEmbeddingProvider(EmbeddingProvider):
             # Fallback to sentence transformers if Gemini fails
             fallback = SentenceTransformerProvider()
             return fallback.embed_text(text)
+    
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for multiple texts, several API batches in flight at once"""
+        batches = [texts[i:i + self.MAX_BATCH_SIZE] for i in range(0, len(texts), self.MAX_BATCH_SIZE)]
+        if len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.MAX_CONCURRENT_BATCHES, len(batches))) as executor:
+                results = list(executor.map(self._embed_batch, batches))
+        else:
+            results = [self._embed_batch(batch) for batch in batches]
+        
+        embeddings = []
+        fallback = None
+        for batch, result in zip(batches, results):
+            if result is None:
+                # Fallback to sentence transformers if Gemini fails
+                fallback = fallback or SentenceTransformerProvider()
+                result = fallback.embed_texts(batch)
+            embeddings.extend(result)
+        return embeddings
+    
+    def _embed_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """Embed one API batch, retrying with exponential backoff; None if every attempt fails"""
+        for attempt in range(self.MAX_RETRIES):
+            try:
+                result = self.client.embed_content(
+                    model=self.model_name,
+                    content=texts,
+                    task_type="retrieval_document"
+                )
+                return result['embedding']
+            except Exception as e:
+                if attempt + 1 < self.MAX_RETRIES:
+                    time.sleep(self.RETRY_BASE_DELAY_SECONDS * 2 ** attempt)
+                else:
+                    logger.error(f"Error generating Gemini batch embeddings: {e}")
+        return None
 
 
 class FusionEmbedding:
@@ -151,13 +196,42 @@ class FusionEmbedding:
         return fusion_embedding.tolist()
     
     def embed_texts(self, texts: List[str]) -> List[List[float]]:
-        """Generate fusion embeddings for multiple texts"""
-        return [self.embed_text(text) for text in texts]
+        """Generate fusion embeddings for multiple texts, one batched call per provider"""
+        if not texts:
+            return []
+        
+        batches = []
+        weights = []
+        
+        for provider, weight in zip(self.providers, self.weights):
+            try:
+                batches.append(np.asarray(provider.embed_texts(texts), dtype=np.float64))
+                weights.append(weight)
+            except Exception as e:
+                logger.warning(f"Provider {provider.model_name} failed: {e}")
+                continue
+        
+        if not batches:
+            raise RuntimeError("All embedding providers failed")
+        
+        # Truncate to the smallest dimension and take the weighted average row-wise
+        min_dim = min(batch.shape[1] for batch in batches)
+        fusion_embeddings = sum(weight * batch[:, :min_dim] for weight, batch in zip(weights, batches))
+        
+        # Normalize by total weight (in case some providers failed)
+        total_weight = sum(weights)
+        if total_weight > 0:
+            fusion_embeddings /= total_weight
+        
+        return fusion_embeddings.tolist()
 
 
 class HealthAIEmbedding:
     """Main embedding class for HealthAI application"""
     
+    # Chunks embedded per embed_texts call while indexing
+    CHUNK_BATCH_SIZE = 256
+    
     def __init__(self):
         """Initialize HealthAI embedding system"""
         self.providers = []
@@ -236,11 +310,11 @@ class HealthAIEmbedding:
         """
         logger.info(f"Generating embeddings for {len(chunks)} chunks")
         
-        # Extract texts
-        texts = [chunk['text'] for chunk in chunks]
-        
-        # Generate embeddings
-        embeddings = self.embed_texts(texts)
+        # Generate embeddings batch by batch, in chunk order
+        embeddings = []
+        for start in range(0, len(chunks), self.CHUNK_BATCH_SIZE):
+            texts = [chunk['text'] for chunk in chunks[start:start + self.CHUNK_BATCH_SIZE]]
+            embeddings.extend(self.embed_texts(texts))
         
         # Add embeddings to chunks
         enriched_chunks = []
@@ -4,8 +4,10 @@ Extracts text from PDF files and creates text chunks for embeddings
 """
 
 import fitz  # PyMuPDF
+import os
 import re
-from typing import List, Dict, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 import logging
 
@@ -14,9 +16,22 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _process_pdf_safely(parser: "PDFParser", pdf_path: str) -> Tuple[List[Dict[str, str]], Optional[str]]:
+    """Process one PDF in a worker process, returning its chunks or the error message"""
+    try:
+        return parser.process_pdf(pdf_path), None
+    except Exception as e:
+        return [], str(e)
+
+
 class PDFParser:
     """Handles PDF text extraction and chunking"""
     
+    # Directories with fewer files are parsed in-process; spawning workers costs more
+    PARALLEL_MIN_FILES = 3
+    # PDFs sent to a worker per task, to amortize pickling overhead
+    PARALLEL_CHUNKSIZE = 4
+    
     def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
         """
         Initialize PDF parser
@@ -206,15 +221,16 @@ class PDFParser:
         
         return chunks
     
-    def process_multiple_pdfs(self, pdf_directory: str) -> List[Dict[str, str]]:
+    def process_multiple_pdfs(self, pdf_directory: str, max_workers: Optional[int] = None) -> List[Dict[str, str]]:
         """
-        Process all PDF files in a directory
+        Process all PDF files in a directory, one worker process per CPU
         
         Args:
             pdf_directory: Directory containing PDF files
+            max_workers: Worker process limit (defaults to the CPU count; 1 parses in-process)
             
         Returns:
-            Combined list of chunks from all PDFs
+            Combined list of chunks from all PDFs, in directory listing order
         """
         pdf_dir = Path(pdf_directory)
         
@@ -230,14 +246,22 @@ class PDFParser:
         
         logger.info(f"Processing {len(pdf_files)} PDF files")
         
-        for pdf_file in pdf_files:
-            try:
-                chunks = self.process_pdf(str(pdf_file))
-                all_chunks.extend(chunks)
-                logger.info(f"Processed {pdf_file.name}: {len(chunks)} chunks")
-            except Exception as e:
-                logger.error(f"Failed to process {pdf_file.name}: {str(e)}")
+        pdf_paths = [str(pdf_file) for pdf_file in pdf_files]
+        workers = min(max_workers or os.cpu_count() or 1, len(pdf_files))
+        if workers > 1 and len(pdf_files) >= self.PARALLEL_MIN_FILES:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(
+                    _process_pdf_safely, [self] * len(pdf_paths), pdf_paths, chunksize=self.PARALLEL_CHUNKSIZE
+                ))
+        else:
+            results = [_process_pdf_safely(self, pdf_path) for pdf_path in pdf_paths]
+        
+        for pdf_file, (chunks, error) in zip(pdf_files, results):
+            if error is not None:
+                logger.error(f"Failed to process {pdf_file.name}: {error}")
                 continue
+            all_chunks.extend(chunks)
+            logger.info(f"Processed {pdf_file.name}: {len(chunks)} chunks")
         
         logger.info(f"Total chunks created: {len(all_chunks)}")
         return all_chunks
@@ -30,6 +30,8 @@ class AIModelUsage:
     response_time_ms: int
     success: bool
     error_message: Optional[str] = None
+    cache_hit: bool = False  # served from the prompt cache, no provider call
+    tokens_cached: int = 0   # input tokens the provider served from its prompt cache
 
 class AIModelCostTracker:
     """Real-time AI model cost tracking and optimization"""
@@ -59,6 +61,13 @@ class AIModelCostTracker:
             }
         }
         
+        # Share of the input price billed for provider-cached prompt tokens
+        # (update with current pricing)
+        self.cached_input_ratio = {
+            'gemini': Decimal('0.25'),  # context caching bills cached tokens at 25%
+            'groq': Decimal('0.5')      # prompt caching halves cached token cost
+        }
+        
         # Budget thresholds
         self.budget_thresholds = {
             'daily': Decimal('100.00'),     # $100/day
@@ -80,7 +89,9 @@ class AIModelCostTracker:
                       session_id: str,
                       response_time_ms: int,
                       success: bool,
-                      error_message: Optional[str] = None) -> AIModelUsage:
+                      error_message: Optional[str] = None,
+                      cache_hit: bool = False,
+                      tokens_cached: int = 0) -> AIModelUsage:
         """Track AI model usage and calculate costs"""
         
         try:
@@ -91,7 +102,10 @@ class AIModelCostTracker:
                 'output_per_1k_tokens': Decimal('0.002')
             })
             
-            cost_input = (Decimal(tokens_input) / 1000) * pricing_info['input_per_1k_tokens']
+            # tokens_input includes tokens_cached; those are billed at the cached rate
+            cached_ratio = self.cached_input_ratio.get(service, Decimal('1'))
+            billable_input = Decimal(tokens_input - tokens_cached) + Decimal(tokens_cached) * cached_ratio
+            cost_input = (billable_input / 1000) * pricing_info['input_per_1k_tokens']
             cost_output = (Decimal(tokens_output) / 1000) * pricing_info['output_per_1k_tokens']
             total_cost = cost_input + cost_output
             
@@ -110,7 +124,9 @@ class AIModelCostTracker:
                 session_id=session_id,
                 response_time_ms=response_time_ms,
                 success=success,
-                error_message=error_message
+                error_message=error_message,
+                cache_hit=cache_hit,
+                tokens_cached=tokens_cached
             )
             
             # Store in DynamoDB
@@ -198,6 +214,15 @@ class AIModelCostTracker:
                     ],
                     'Value': 1 if usage_record.success else 0,
                     'Unit': 'Count'
+                },
+                {
+                    'MetricName': 'PromptCacheHit',
+                    'Dimensions': [
+                        {'Name': 'Service', 'Value': usage_record.service},
+                        {'Name': 'Model', 'Value': usage_record.model}
+                    ],
+                    'Value': 1 if usage_record.cache_hit else 0,
+                    'Unit': 'Count'
                 }
             ]
             
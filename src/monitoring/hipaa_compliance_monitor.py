@@ -1,23 +1,33 @@
 """
 HIPAA Compliance Monitoring and Automation
 """
-import boto3
+import aioboto3
+import asyncio
 import json
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+# CloudWatch metric names and the lower-cased keys they are reported under
+_METRIC_NAMES = (
+    "EncryptedDataAccess",
+    "UnencryptedDataDetected",
+    "AccessControlViolations",
+    "AuditLogFailures",
+    "BreachDetectionEvents"
+)
+_METRIC_KEYS = tuple(name.lower() for name in _METRIC_NAMES)
+
 class HIPAAComplianceMonitor:
     """Monitor HIPAA compliance across the healthcare application"""
     
-    def __init__(self):
-        self.cloudwatch = boto3.client('cloudwatch')
-        self.s3 = boto3.client('s3')
-        self.cloudtrail = boto3.client('cloudtrail')
+    def __init__(self, session: Optional[aioboto3.Session] = None):
+        # One session per monitor (e.g. per tenant); clients are opened per call
+        self.session = session or aioboto3.Session()
     
-    def create_compliance_dashboard(self):
+    async def create_compliance_dashboard(self):
         """Create comprehensive HIPAA compliance monitoring dashboard"""
         
         dashboard_config = {
@@ -84,12 +94,13 @@ class HIPAAComplianceMonitor:
             ]
         }
         
-        return self.cloudwatch.put_dashboard(
-            DashboardName='HealthAI-HIPAA-Compliance-Dashboard',
-            DashboardBody=json.dumps(dashboard_config)
-        )
+        async with self.session.client('cloudwatch') as cloudwatch:
+            return await cloudwatch.put_dashboard(
+                DashboardName='HealthAI-HIPAA-Compliance-Dashboard',
+                DashboardBody=json.dumps(dashboard_config)
+            )
     
-    def setup_compliance_alarms(self):
+    async def setup_compliance_alarms(self):
         """Set up critical HIPAA compliance alarms"""
         
         alarms = [
@@ -138,23 +149,26 @@ class HIPAAComplianceMonitor:
             }
         ]
         
-        for alarm_config in alarms:
-            self.cloudwatch.put_metric_alarm(
-                AlarmName=alarm_config["name"],
-                ComparisonOperator=alarm_config["comparison"],
-                EvaluationPeriods=alarm_config["evaluation_periods"],
-                MetricName=alarm_config["metric"],
-                Namespace='HealthAI/HIPAA',
-                Period=alarm_config["period"],
-                Statistic='Sum' if 'Sum' in alarm_config.get("statistic", "Sum") else 'Average',
-                Threshold=float(alarm_config["threshold"]),
-                ActionsEnabled=True,
-                AlarmActions=alarm_config["alarm_actions"],
-                AlarmDescription=alarm_config["description"],
-                Unit='Count'
-            )
+        async with self.session.client('cloudwatch') as cloudwatch:
+            await asyncio.gather(*(
+                cloudwatch.put_metric_alarm(
+                    AlarmName=alarm_config["name"],
+                    ComparisonOperator=alarm_config["comparison"],
+                    EvaluationPeriods=alarm_config["evaluation_periods"],
+                    MetricName=alarm_config["metric"],
+                    Namespace='HealthAI/HIPAA',
+                    Period=alarm_config["period"],
+                    Statistic='Sum' if 'Sum' in alarm_config.get("statistic", "Sum") else 'Average',
+                    Threshold=float(alarm_config["threshold"]),
+                    ActionsEnabled=True,
+                    AlarmActions=alarm_config["alarm_actions"],
+                    AlarmDescription=alarm_config["description"],
+                    Unit='Count'
+                )
+                for alarm_config in alarms
+            ))
     
-    def generate_compliance_report(self, days_back: int = 30) -> Dict:
+    async def generate_compliance_report(self, days_back: int = 30) -> Dict:
         """Generate comprehensive HIPAA compliance report"""
         
         end_time = datetime.utcnow()
@@ -162,7 +176,7 @@ class HIPAAComplianceMonitor:
         
         try:
             # Get compliance metrics
-            compliance_metrics = self._get_compliance_metrics(start_time, end_time)
+            compliance_metrics = await self._get_compliance_metrics(start_time, end_time)
             
             # Get audit log statistics
             audit_stats = self._analyze_audit_logs(start_time, end_time)
@@ -230,21 +244,14 @@ class HIPAAComplianceMonitor:
             logger.error(f"Error generating compliance report: {e}")
             return {"error": "Failed to generate compliance report", "details": str(e)}
     
-    def _get_compliance_metrics(self, start_time: datetime, end_time: datetime) -> Dict:
+    async def _get_compliance_metrics(self, start_time: datetime, end_time: datetime) -> Dict:
         """Get HIPAA compliance metrics from CloudWatch"""
         
         metrics = {}
-        metric_names = [
-            "EncryptedDataAccess",
-            "UnencryptedDataDetected", 
-            "AccessControlViolations",
-            "AuditLogFailures",
-            "BreachDetectionEvents"
-        ]
         
-        for metric_name in metric_names:
+        async def fetch_metric(cloudwatch, metric_name: str, key: str) -> None:
             try:
-                response = self.cloudwatch.get_metric_statistics(
+                response = await cloudwatch.get_metric_statistics(
                     Namespace='HealthAI/HIPAA',
                     MetricName=metric_name,
                     Dimensions=[],
@@ -255,11 +262,17 @@ class HIPAAComplianceMonitor:
                 )
                 
                 total = sum(point['Sum'] for point in response.get('Datapoints', []))
-                metrics[metric_name.lower()] = int(total)
+                metrics[key] = int(total)
                 
             except Exception as e:
                 logger.error(f"Error getting metric {metric_name}: {e}")
-                metrics[metric_name.lower()] = 0
+                metrics[key] = 0
+        
+        async with self.session.client('cloudwatch') as cloudwatch:
+            await asyncio.gather(*(
+                fetch_metric(cloudwatch, name, key)
+                for name, key in zip(_METRIC_NAMES, _METRIC_KEYS)
+            ))
         
         return metrics
     
@@ -351,14 +364,14 @@ class HIPAAComplianceMonitor:
         return recommendations
 
 # Automated compliance check function
-def daily_hipaa_compliance_check():
+async def daily_hipaa_compliance_check(monitor: Optional[HIPAAComplianceMonitor] = None) -> Dict:
     """Automated daily HIPAA compliance check"""
     
-    monitor = HIPAAComplianceMonitor()
+    monitor = monitor or HIPAAComplianceMonitor()
     
     try:
         # Generate compliance report
-        report = monitor.generate_compliance_report(days_back=1)
+        report = await monitor.generate_compliance_report(days_back=1)
         
         # Log report for audit trail
         logger.info(f"Daily HIPAA compliance check: Score {report.get('overall_compliance', {}).get('score', 0)}")
@@ -367,15 +380,19 @@ def daily_hipaa_compliance_check():
         compliance_score = report.get('overall_compliance', {}).get('score', 100)
         if compliance_score < 95:
             
-            sns = boto3.client('sns')
-            sns.publish(
-                TopicArn='arn:aws:sns:us-east-1:123456789012:hipaa-compliance-alerts',
-                Message=f"HIPAA Compliance Alert: Score dropped to {compliance_score}%\n\n{json.dumps(report, indent=2)}",
-                Subject=f"HealthAI HIPAA Compliance Alert - Score: {compliance_score}%"
-            )
+            async with monitor.session.client('sns') as sns:
+                await sns.publish(
+                    TopicArn='arn:aws:sns:us-east-1:123456789012:hipaa-compliance-alerts',
+                    Message=f"HIPAA Compliance Alert: Score dropped to {compliance_score}%\n\n{json.dumps(report, indent=2)}",
+                    Subject=f"HealthAI HIPAA Compliance Alert - Score: {compliance_score}%"
+                )
         
         return report
         
     except Exception as e:
         logger.error(f"Daily compliance check failed: {e}")
-        return {"error": "Compliance check failed", "details": str(e)}
\ No newline at end of file
+        return {"error": "Compliance check failed", "details": str(e)}
+
+async def run_daily_hipaa_compliance_checks(monitors: List[HIPAAComplianceMonitor]) -> List[Dict]:
+    """Run the daily check for many monitors (e.g. one per tenant) concurrently"""
+    return await asyncio.gather(*(daily_hipaa_compliance_check(monitor) for monitor in monitors))
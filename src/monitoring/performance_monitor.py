@@ -5,26 +5,49 @@ Comprehensive monitoring and alerting system
 
 import asyncio
 import time
-import json
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass, asdict
 import sqlite3
+import zlib
 from pathlib import Path
 import logging
+import threading
 from collections import defaultdict, deque
+from functools import lru_cache
+from itertools import count, islice
+import numpy as np
+import orjson
 
 
-@dataclass
+# Kept as one constant so sqlite3's statement cache reuses the compiled insert
+_INSERT_BATCH_SQL = "INSERT INTO metrics_batches (start_ts, end_ts, payload) VALUES (?, ?, ?)"
+
+
+@lru_cache(maxsize=1024)
+def _iso_second(second: int) -> str:
+    return datetime.fromtimestamp(second).isoformat()
+
+
+def _to_iso(timestamp: float) -> str:
+    """ISO-8601 local time for an epoch timestamp, formatting each second only once"""
+    second = int(timestamp // 1)
+    micros = round((timestamp - second) * 1_000_000)
+    if micros == 1_000_000:
+        second, micros = second + 1, 0
+    return f"{_iso_second(second)}.{micros:06d}"
+
+
+@dataclass(slots=True, frozen=True)
 class PerformanceMetric:
     """Individual performance metric"""
-    timestamp: datetime
+    timestamp: float  # Epoch seconds; converted to ISO only when persisted
     metric_name: str
     value: float
     metadata: Dict[str, Any]
     
 
-@dataclass
+@dataclass(slots=True)
 class AlertRule:
     """Performance alert configuration"""
     name: str
@@ -36,14 +59,243 @@ class AlertRule:
     enabled: bool = True
 
 
+class SlidingWindow:
+    """Time-ordered (timestamp, value) samples with amortized O(1) min/max/sum
+    
+    When a target value is given, the window also counts samples within
+    tolerance of it, so equality checks never rescan the samples.
+    """
+    
+    def __init__(self, span_seconds: float, max_samples: Optional[int] = None,
+                 target: Optional[float] = None, tolerance: float = 0.01):
+        self.span_seconds = span_seconds
+        self.max_samples = max_samples
+        self.samples: deque = deque()
+        self._max: deque = deque()  # Values strictly decreasing from the left
+        self._min: deque = deque()  # Values strictly increasing from the left
+        self.total = 0.0
+        self.target = target
+        self.tolerance = tolerance
+        self.target_hits = 0
+    
+    def __len__(self) -> int:
+        return len(self.samples)
+    
+    def append(self, timestamp: float, value: float):
+        """Add a sample; timestamps must be non-decreasing"""
+        sample = (timestamp, value)
+        self.samples.append(sample)
+        self.total += value
+        if self.target is not None and abs(value - self.target) < self.tolerance:
+            self.target_hits += 1
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append(sample)
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append(sample)
+        
+        if self.max_samples is not None and len(self.samples) > self.max_samples:
+            self._pop_oldest()
+    
+    def _pop_oldest(self):
+        sample = self.samples.popleft()
+        # The oldest sample can only be at the head of the monotonic deques
+        if self._max[0] is sample:
+            self._max.popleft()
+        if self._min[0] is sample:
+            self._min.popleft()
+        if self.target is not None and abs(sample[1] - self.target) < self.tolerance:
+            self.target_hits -= 1
+        # Reset on empty so float error in the running sum cannot accumulate
+        self.total = self.total - sample[1] if self.samples else 0.0
+    
+    def evict(self, cutoff: float):
+        """Drop samples recorded before the cutoff timestamp"""
+        while self.samples and self.samples[0][0] < cutoff:
+            self._pop_oldest()
+    
+    def slide(self, now: float):
+        """Drop samples that fell out of the window as of now"""
+        self.evict(now - self.span_seconds)
+    
+    def max(self) -> float:
+        return self._max[0][1]
+    
+    def min(self) -> float:
+        return self._min[0][1]
+    
+    def mean(self) -> float:
+        return self.total / len(self.samples)
+    
+    def latest(self) -> float:
+        return self.samples[-1][1]
+    
+    def recent(self, n: int) -> List[float]:
+        """Last n values, oldest first"""
+        return [value for _, value in islice(reversed(self.samples), n)][::-1]
+
+
+class MetricsRingBuffer:
+    """Fixed-capacity struct-of-arrays store for the most recent metrics
+    
+    Writers reserve an index from an atomic counter, fill the slot and then
+    stamp its sequence number, so readers never take a lock: a slot whose
+    sequence is behind the index is still being written, one ahead of it
+    has already been overwritten.
+    """
+    
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.name_codes = np.full(capacity, -1, dtype=np.int32)
+        self.sequence = np.full(capacity, -1, dtype=np.int64)
+        self.metadata: Dict[int, Dict[str, Any]] = {}  # Sparse, keyed by slot
+        self._names: List[str] = []
+        self._name_to_code: Dict[str, int] = {}
+        self._names_lock = threading.Lock()  # Only taken for unseen metric names
+        self._reserve = count()
+        self._end = 0  # One past the newest index written
+    
+    def __len__(self) -> int:
+        return min(self._end, self.capacity)
+    
+    def _intern(self, metric_name: str) -> int:
+        code = self._name_to_code.get(metric_name)
+        if code is None:
+            with self._names_lock:
+                code = self._name_to_code.get(metric_name)
+                if code is None:
+                    self._names.append(metric_name)
+                    code = self._name_to_code[metric_name] = len(self._names) - 1
+        return code
+    
+    def append(self, timestamp: float, metric_name: str, value: float,
+               metadata: Optional[Dict[str, Any]] = None):
+        index = next(self._reserve)
+        slot = index % self.capacity
+        
+        self.sequence[slot] = -1  # Mark the slot as being rewritten
+        self.timestamps[slot] = timestamp
+        self.values[slot] = value
+        self.name_codes[slot] = self._intern(metric_name)
+        if metadata:
+            self.metadata[slot] = metadata
+        else:
+            self.metadata.pop(slot, None)
+        self.sequence[slot] = index  # Publish
+        
+        if index >= self._end:
+            self._end = index + 1
+    
+    def read(self, start: int, limit: int) -> Tuple[List[PerformanceMetric], int, int]:
+        """Read up to limit published metrics from index start onwards
+        
+        Returns the metrics, the index to resume from and how many entries
+        were overwritten before they could be read.
+        """
+        dropped = 0
+        if self._end - start > self.capacity:
+            dropped = self._end - self.capacity - start
+            start += dropped
+        
+        metrics = []
+        index = start
+        while len(metrics) < limit:
+            slot = index % self.capacity
+            sequence = self.sequence[slot]
+            if sequence < index:
+                break  # Not published yet
+            if sequence == index:
+                metric = PerformanceMetric(
+                    timestamp=float(self.timestamps[slot]),
+                    metric_name=self._names[self.name_codes[slot]],
+                    value=float(self.values[slot]),
+                    metadata=self.metadata.get(slot, {})
+                )
+                # Re-check in case a writer lapped us while we were reading
+                if self.sequence[slot] == index:
+                    metrics.append(metric)
+                else:
+                    dropped += 1
+            else:
+                dropped += 1
+            index += 1
+        
+        return metrics, index, dropped
+    
+    def recent_metadata(self, n: int) -> List[Dict[str, Any]]:
+        """Non-empty metadata of the last n metrics, oldest first"""
+        end = self._end
+        start = max(0, end - min(n, self.capacity))
+        metadata = []
+        for index in range(start, end):
+            slot = index % self.capacity
+            if self.sequence[slot] == index and slot in self.metadata:
+                metadata.append(self.metadata[slot])
+        return metadata
+
+
+class FloatRing:
+    """Fixed-capacity float ring whose latest values are always a contiguous slice"""
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        # Every value is written twice, capacity apart, so the newest n values
+        # never wrap around the end of the array
+        self._data = np.zeros(2 * capacity, dtype=np.float64)
+        self._count = 0
+    
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+    
+    def append(self, value: float):
+        slot = self._count % self.capacity
+        self._data[slot] = value
+        self._data[slot + self.capacity] = value
+        self._count += 1
+    
+    def latest(self, n: int) -> np.ndarray:
+        """View of the newest n values, oldest first"""
+        n = min(n, len(self))
+        end = self._count % self.capacity + self.capacity
+        return self._data[end - n:end]
+
+
 class PerformanceMonitor:
     """Real-time performance monitoring system"""
     
+    FLUSH_BATCH_SIZE = 500
+    FLUSH_INTERVAL_SECONDS = 0.2
+    STATS_WINDOW_SECONDS = 3600
+    STATS_MAX_SAMPLES = 10000  # Per metric, bounds memory under heavy traffic
+    DASHBOARD_CACHE_TTL_SECONDS = 1.0
+    ALERT_CHECK_INTERVAL_SECONDS = 1.0  # Per rule
+    WAL_CHECKPOINT_EVERY_FLUSHES = 100
+    
     def __init__(self, db_path: str = "data/performance_metrics.db"):
         self.db_path = db_path
-        self.metrics_buffer = deque(maxlen=10000)  # In-memory buffer
+        # Recent metrics; also the write-back buffer drained by the flush thread
+        self.metrics_buffer = MetricsRingBuffer(capacity=10000)
+        self._flushed_index = 0
+        self._flush_lock = threading.Lock()
         self.alert_rules: List[AlertRule] = []
+        self._rules_by_metric: Dict[str, List[AlertRule]] = defaultdict(list)
+        self._alert_windows: Dict[str, SlidingWindow] = {}  # Keyed by rule name
+        self._last_alert_check: Dict[str, float] = {}  # Keyed by rule name
+        # Rules whose last sample arrived inside the check interval; keyed by rule name
+        self._pending_alert_checks: Dict[str, Tuple[AlertRule, PerformanceMetric]] = {}
         self.recent_alerts = deque(maxlen=100)
+        self._dashboard_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+        
+        # Long-lived connection shared by all writers; autocommit mode so
+        # transactions are managed explicitly around each flush
+        self._conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None, cached_statements=128
+        )
+        self._db_lock = threading.Lock()
+        self._flush_count = 0
         
         # Initialize database
         self._init_database()
@@ -53,17 +305,52 @@ class PerformanceMonitor:
         
         # Performance counters
         self.counters = defaultdict(int)
-        self.timers = defaultdict(list)
+        self.timers = defaultdict(lambda: FloatRing(1000))  # Last 1000 values per metric
+        self._hourly_stats: Dict[str, SlidingWindow] = defaultdict(
+            lambda: SlidingWindow(self.STATS_WINDOW_SECONDS, max_samples=self.STATS_MAX_SAMPLES)
+        )
+        # SlidingWindow assumes one writer; request threads append while readers slide
+        self._stats_lock = threading.Lock()
         
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
+        
+        # Background writer so recording never waits on disk I/O
+        self._stop_event = threading.Event()
+        self._flush_thread = threading.Thread(
+            target=self._flush_loop, name="performance-metrics-flush", daemon=True
+        )
+        self._flush_thread.start()
     
     def _init_database(self):
         """Initialize SQLite database for metrics storage"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
+        with self._db_lock:
+            # WAL + NORMAL sync: appends go to the log without an fsync per commit
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA temp_store=MEMORY")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute("PRAGMA cache_size=-20000")
+            
+            # One row per flushed batch; the payload packs every metric in it
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS metrics_batches (
+                    id INTEGER PRIMARY KEY,
+                    start_ts REAL NOT NULL,
+                    end_ts REAL NOT NULL,
+                    payload BLOB NOT NULL
+                )
+            """)
+            
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_batches_end_ts 
+                ON metrics_batches(end_ts)
+            """)
+            
+            # Per-metric rows written before batching; still read for history
+            self._conn.execute("""
                 CREATE TABLE IF NOT EXISTS performance_metrics (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id INTEGER PRIMARY KEY,
                     timestamp TEXT NOT NULL,
                     metric_name TEXT NOT NULL,
                     value REAL NOT NULL,
@@ -71,15 +358,9 @@ class PerformanceMonitor:
                     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
                 )
             """)
-            
-            conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_metrics_timestamp 
-                ON performance_metrics(timestamp)
-            """)
-            
-            conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_metrics_name 
-                ON performance_metrics(metric_name)
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_metrics_name_ts 
+                ON performance_metrics(metric_name, timestamp)
             """)
     
     def _setup_default_alerts(self):
@@ -119,98 +400,194 @@ class PerformanceMonitor:
             )
         ]
         
-        self.alert_rules.extend(default_alerts)
+        for rule in default_alerts:
+            self.add_rule(rule)
+    
+    def add_rule(self, rule: AlertRule):
+        """Register an alert rule"""
+        self.alert_rules.append(rule)
+        self._rules_by_metric[rule.metric_name].append(rule)
+        # Window length is fixed per rule, so convert it to seconds once here
+        self._alert_windows[rule.name] = SlidingWindow(
+            rule.window_minutes * 60,
+            target=rule.threshold if rule.comparison == "equals" else None
+        )
     
     def record_metric(self, metric_name: str, value: float, 
                      metadata: Optional[Dict[str, Any]] = None):
-        """Record a performance metric"""
-        if metadata is None:
-            metadata = {}
-            
-        metric = PerformanceMetric(
-            timestamp=datetime.now(),
-            metric_name=metric_name,
-            value=value,
-            metadata=metadata
-        )
+        """Record a performance metric
+        
+        Only in-memory state is touched here; alerting and persistence run
+        on the flush thread.
+        """
+        timestamp = time.time()
         
-        # Add to buffer
-        self.metrics_buffer.append(metric)
+        # Add to buffer; the flush thread picks it up from there
+        self.metrics_buffer.append(timestamp, metric_name, value, metadata)
         
         # Update counters
         self.counters[metric_name] += 1
         self.timers[metric_name].append(value)
-        
-        # Keep only recent values for timers (last 1000)
-        if len(self.timers[metric_name]) > 1000:
-            self.timers[metric_name] = self.timers[metric_name][-1000:]
-        
-        # Check alerts
-        self._check_alerts(metric)
-        
-        # Periodically flush to database
-        if len(self.metrics_buffer) >= 100:
-            self._flush_metrics_to_db()
+        with self._stats_lock:
+            self._hourly_stats[metric_name].append(timestamp, value)
     
-    def _flush_metrics_to_db(self):
-        """Flush metrics buffer to database"""
-        if not self.metrics_buffer:
+    def _flush_loop(self):
+        """Background loop checking alerts for and persisting new metrics in batches"""
+        while not self._stop_event.wait(self.FLUSH_INTERVAL_SECONDS):
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.error(f"Failed to flush metrics: {e}")
+    
+    def flush(self):
+        """Check alerts for and persist every metric recorded so far"""
+        with self._flush_lock:
+            while True:
+                start = self._flushed_index
+                batch, self._flushed_index, dropped = self.metrics_buffer.read(
+                    start, self.FLUSH_BATCH_SIZE
+                )
+                if dropped:
+                    self.logger.warning(f"Dropped {dropped} metrics overwritten before they were persisted")
+                if batch:
+                    self._check_alerts_batch(batch)
+                    self._flush_metrics_to_db(batch)
+                if self._flushed_index == start:
+                    break
+            self._check_pending_alerts(time.time())
+    
+    def _flush_metrics_to_db(self, metrics: List[PerformanceMetric]):
+        """Flush a batch of metrics to database"""
+        if not metrics:
             return
+        
+        rows = [
+            (metric.timestamp, metric.metric_name, metric.value, metric.metadata or None)
+            for metric in metrics
+        ]
+        payload = zlib.compress(orjson.dumps(
+            rows, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        ))
+        
+        # A single row per batch amortizes B-tree and WAL overhead across metrics
+        with self._db_lock:
+            self._conn.execute(_INSERT_BATCH_SQL, (
+                min(metric.timestamp for metric in metrics),
+                max(metric.timestamp for metric in metrics),
+                payload
+            ))
             
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            for metric in self.metrics_buffer:
-                cursor.execute("""
-                    INSERT INTO performance_metrics 
-                    (timestamp, metric_name, value, metadata)
-                    VALUES (?, ?, ?, ?)
-                """, (
-                    metric.timestamp.isoformat(),
-                    metric.metric_name,
-                    metric.value,
-                    json.dumps(metric.metadata)
-                ))
-            
-            conn.commit()
+            # Keep the WAL from growing without bound on long-running monitors
+            self._flush_count += 1
+            if self._flush_count % self.WAL_CHECKPOINT_EVERY_FLUSHES == 0:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
         
-        self.metrics_buffer.clear()
-        self.logger.info(f"Flushed {len(self.metrics_buffer)} metrics to database")
+        self.logger.debug(f"Flushed {len(rows)} metrics to database")
+    
+    def get_metric_history(self, metric_name: str, start_time: datetime,
+                           end_time: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Get persisted values of a metric within a time range"""
+        end_time = end_time or datetime.now()
+        start_ts = start_time.timestamp()
+        end_ts = end_time.timestamp()
+        
+        with self._db_lock:
+            legacy_rows = self._conn.execute("""
+                SELECT timestamp, value FROM performance_metrics
+                WHERE metric_name = ? AND timestamp BETWEEN ? AND ?
+                ORDER BY timestamp
+            """, (metric_name, start_time.isoformat(), end_time.isoformat())).fetchall()
+            payloads = self._conn.execute("""
+                SELECT payload FROM metrics_batches
+                WHERE end_ts >= ? AND start_ts <= ?
+                ORDER BY id
+            """, (start_ts, end_ts)).fetchall()
+        
+        # Per-metric rows predate every batch, so they come first
+        history = [{"timestamp": timestamp, "value": value} for timestamp, value in legacy_rows]
+        for (payload,) in payloads:
+            for timestamp, name, value, _ in orjson.loads(zlib.decompress(payload)):
+                if name == metric_name and start_ts <= timestamp <= end_ts:
+                    history.append({
+                        "timestamp": _to_iso(timestamp),
+                        "value": value
+                    })
+        
+        return history
+    
+    def close(self):
+        """Stop the background writer, flush pending metrics and close the database"""
+        self._stop_event.set()
+        self._flush_thread.join()
+        self.flush()
+        with self._db_lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.close()
+    
+    def _check_alerts_batch(self, metrics: List[PerformanceMetric]):
+        """Run alert rules over a batch of metrics in recording order"""
+        for metric in metrics:
+            if metric.metric_name in self._rules_by_metric:
+                self._check_alerts(metric)
     
     def _check_alerts(self, metric: PerformanceMetric):
         """Check if metric triggers any alerts"""
-        for rule in self.alert_rules:
-            if not rule.enabled or rule.metric_name != metric.metric_name:
+        timestamp = metric.timestamp
+        
+        for rule in self._rules_by_metric.get(metric.metric_name, ()):
+            if not rule.enabled:
                 continue
-                
-            # Get recent values for this metric
-            cutoff_time = datetime.now() - timedelta(minutes=rule.window_minutes)
-            recent_values = [
-                m.value for m in self.metrics_buffer
-                if (m.metric_name == rule.metric_name and 
-                    m.timestamp >= cutoff_time)
-            ]
             
-            if len(recent_values) < rule.min_samples:
+            # Slide this rule's window forward to include the new value
+            window = self._alert_windows[rule.name]
+            window.append(timestamp, metric.value)
+            window.slide(timestamp)
+            
+            if len(window) < rule.min_samples:
                 continue
-                
-            # Check threshold
-            triggered = False
-            if rule.comparison == "greater_than":
-                triggered = any(v > rule.threshold for v in recent_values)
-            elif rule.comparison == "less_than":
-                triggered = any(v < rule.threshold for v in recent_values)
-            elif rule.comparison == "equals":
-                triggered = any(abs(v - rule.threshold) < 0.01 for v in recent_values)
             
-            if triggered:
-                self._trigger_alert(rule, metric, recent_values)
+            # Windows are always updated, so their running min/max still see
+            # any crossing that happened between two evaluations; a skipped
+            # check is retried on a later flush in case no more samples arrive
+            if timestamp - self._last_alert_check.get(rule.name, 0.0) < self.ALERT_CHECK_INTERVAL_SECONDS:
+                self._pending_alert_checks[rule.name] = (rule, metric)
+                continue
+            self._pending_alert_checks.pop(rule.name, None)
+            self._last_alert_check[rule.name] = timestamp
+            self._evaluate_rule(rule, metric)
+    
+    def _check_pending_alerts(self, now: float):
+        """Evaluate rules whose latest check was skipped, once their interval has passed"""
+        for name, (rule, metric) in list(self._pending_alert_checks.items()):
+            if now - self._last_alert_check.get(name, 0.0) < self.ALERT_CHECK_INTERVAL_SECONDS:
+                continue
+            del self._pending_alert_checks[name]
+            self._last_alert_check[name] = now
+            self._evaluate_rule(rule, metric)
+    
+    def _evaluate_rule(self, rule: AlertRule, metric: PerformanceMetric):
+        """Trigger the rule if its window crosses the threshold"""
+        window = self._alert_windows[rule.name]
+        
+        # Check threshold
+        triggered = False
+        if rule.comparison == "greater_than":
+            triggered = window.max() > rule.threshold
+        elif rule.comparison == "less_than":
+            triggered = window.min() < rule.threshold
+        elif rule.comparison == "equals":
+            triggered = window.target_hits > 0
+        
+        if triggered:
+            self._trigger_alert(rule, metric, window.recent(5))
     
     def _trigger_alert(self, rule: AlertRule, metric: PerformanceMetric, 
                       recent_values: List[float]):
         """Trigger a performance alert"""
+        ts = time.time()
         alert = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": _to_iso(ts),  # For display
+            "ts": ts,  # Epoch seconds for window filtering
             "rule_name": rule.name,
             "metric_name": rule.metric_name,
             "current_value": metric.value,
@@ -246,47 +623,37 @@ class PerformanceMonitor:
     
     def get_current_metrics(self) -> Dict[str, Any]:
         """Get current performance metrics summary"""
-        now = datetime.now()
-        
-        # Calculate averages for last hour
-        hour_ago = now - timedelta(hours=1)
-        recent_metrics = [
-            m for m in self.metrics_buffer
-            if m.timestamp >= hour_ago
-        ]
+        now = time.time()
         
+        # Read the running hourly aggregates, expiring samples older than an hour
+        hour_ago = now - self.STATS_WINDOW_SECONDS
         metrics_summary = {}
         
-        # Group by metric name
-        by_metric = defaultdict(list)
-        for metric in recent_metrics:
-            by_metric[metric.metric_name].append(metric.value)
-        
-        for metric_name, values in by_metric.items():
-            if values:
-                metrics_summary[metric_name] = {
-                    "current": values[-1],
-                    "average_1h": sum(values) / len(values),
-                    "min_1h": min(values),
-                    "max_1h": max(values),
-                    "count_1h": len(values)
-                }
+        with self._stats_lock:
+            for metric_name, window in self._hourly_stats.items():
+                window.slide(now)
+                if window:
+                    metrics_summary[metric_name] = {
+                        "current": window.latest(),
+                        "average_1h": window.mean(),
+                        "min_1h": window.min(),
+                        "max_1h": window.max(),
+                        "count_1h": len(window)
+                    }
         
         return {
-            "timestamp": now.isoformat(),
+            "timestamp": _to_iso(now),
             "metrics": metrics_summary,
             "active_alerts": len([a for a in self.recent_alerts 
-                                if datetime.fromisoformat(a["timestamp"]) >= hour_ago]),
+                                if a["ts"] >= hour_ago]),
             "total_queries_1h": sum(self.counters.values()),
             "system_health": self._calculate_system_health()
         }
     
     def _calculate_system_health(self) -> str:
         """Calculate overall system health score"""
-        recent_alerts = [
-            a for a in self.recent_alerts
-            if datetime.fromisoformat(a["timestamp"]) >= datetime.now() - timedelta(hours=1)
-        ]
+        hour_ago = time.time() - self.STATS_WINDOW_SECONDS
+        recent_alerts = [a for a in self.recent_alerts if a["ts"] >= hour_ago]
         
         critical_alerts = [a for a in recent_alerts if a["severity"] == "critical"]
         high_alerts = [a for a in recent_alerts if a["severity"] == "high"]
@@ -302,6 +669,11 @@ class PerformanceMonitor:
     
     def get_performance_dashboard(self) -> Dict[str, Any]:
         """Generate performance dashboard data"""
+        # Polling clients within the TTL share one computed dashboard
+        now = time.monotonic()
+        if self._dashboard_cache and now - self._dashboard_cache[0] < self.DASHBOARD_CACHE_TTL_SECONDS:
+            return self._dashboard_cache[1]
+        
         current_metrics = self.get_current_metrics()
         
         dashboard = {
@@ -318,6 +690,7 @@ class PerformanceMonitor:
             "api_usage": self._get_api_usage_stats()
         }
         
+        self._dashboard_cache = (now, dashboard)
         return dashboard
     
     def _calculate_performance_trends(self) -> Dict[str, str]:
@@ -329,9 +702,9 @@ class PerformanceMonitor:
                 trends[metric_name] = "insufficient_data"
                 continue
             
-            values = self.timers[metric_name]
-            recent_avg = sum(values[-10:]) / 10 if len(values) >= 10 else sum(values) / len(values)
-            older_avg = sum(values[-20:-10]) / 10 if len(values) >= 20 else recent_avg
+            latest = self.timers[metric_name].latest(20)
+            recent_avg = latest[10:].mean()
+            older_avg = latest[:10].mean()
             
             if recent_avg < older_avg * 0.95:  # 5% improvement threshold
                 trends[metric_name] = "improving"
@@ -347,9 +720,9 @@ class PerformanceMonitor:
         # Extract from recent metrics metadata
         model_usage = defaultdict(int)
         
-        for metric in list(self.metrics_buffer)[-1000:]:  # Last 1000 metrics
-            if "model_used" in metric.metadata:
-                model_usage[metric.metadata["model_used"]] += 1
+        for metadata in self.metrics_buffer.recent_metadata(1000):  # Last 1000 metrics
+            if "model_used" in metadata:
+                model_usage[metadata["model_used"]] += 1
         
         total_requests = sum(model_usage.values())
         
@@ -462,7 +835,8 @@ def demo_performance_monitoring():
         if random.random() < 0.05:  # 5% error rate
             tracker.track_error("api_timeout", query, "Request timed out")
     
-    # Generate dashboard
+    # Run pending alert checks, then generate dashboard
+    monitor.flush()
     dashboard = monitor.get_performance_dashboard()
     
     print("\n📊 Performance Dashboard:")
@@ -3,37 +3,180 @@ Monitoring Configuration for Final Roadmap Features
 Comprehensive monitoring for query suggestions and advanced semantic search
 """
 
+import heapq
 import logging
-from typing import Dict, Any
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
-class RoadmapFeatureMonitor:
-    """Monitor performance and usage of new roadmap features"""
+# Counter slots in RoadmapFeatureMonitor._counters
+_IDX_SUG_TOTAL = 0
+_IDX_SUG_OK = 1
+_IDX_SUG_FAILED = 2
+_IDX_SEARCH_TOTAL = 3
+_IDX_SEARCH_OK = 4
+_IDX_SEARCH_FAILED = 5
+_IDX_ML_RANKING = 6
+_IDX_QUERY_EXPANSION = 7
+_NUM_COUNTERS = 8
+
+# Running-average slots in RoadmapFeatureMonitor._avgs / _avg_counts
+_AVG_SUG_TIME = 0
+_AVG_SUG_COUNT = 1
+_AVG_SEARCH_TIME = 2
+_AVG_SEARCH_RESULTS = 3
+_AVG_SIMILARITY = 4
+_NUM_AVERAGES = 5
+
+_SUG_COUNTER_SLOTS = [_IDX_SUG_TOTAL, _IDX_SUG_OK, _IDX_SUG_FAILED]
+_SEARCH_COUNTER_SLOTS = [
+    _IDX_SEARCH_TOTAL, _IDX_SEARCH_OK, _IDX_SEARCH_FAILED, _IDX_ML_RANKING, _IDX_QUERY_EXPANSION
+]
+_UINT64_MASK = (1 << 64) - 1
+
+@lru_cache(maxsize=1)
+def _iso_second(second: int) -> str:
+    return datetime.fromtimestamp(second).isoformat()
+
+
+def _now_iso() -> str:
+    """Current local time as ISO-8601 at second resolution, formatted once per second"""
+    return _iso_second(int(time.time()))
+
+
+_RESPONSE_TIME_THRESHOLDS = {
+    "suggestions": "suggestions_response_time_ms",
+    "search": "search_response_time_ms"
+}
+
+# Response-time slots hold EWMAs; the others are plain running means
+_SUG_AVG_SLOTS = [_AVG_SUG_COUNT]
+_SEARCH_AVG_SLOTS = [_AVG_SEARCH_RESULTS, _AVG_SIMILARITY]
+
+@dataclass(slots=True, frozen=True)
+class SuggestionsReport:
+    """Query suggestion section of the roadmap performance report"""
+    total_requests: int
+    success_rate: float
+    avg_response_time_ms: float
+    avg_suggestions_per_request: float
+    top_queries: Tuple[Dict[str, Any], ...]
+    cache_efficiency: float
+    health_status: str
+
+
+@dataclass(slots=True, frozen=True)
+class SearchReport:
+    """Advanced search section of the roadmap performance report"""
+    total_searches: int
+    success_rate: float
+    avg_search_time_ms: float
+    avg_results_per_search: float
+    avg_similarity_score: float
+    ml_ranking_usage_rate: float
+    query_expansion_usage_rate: float
+    health_status: str
+
+
+@dataclass(slots=True, frozen=True)
+class OverallAssessment:
+    """Roadmap completion and production readiness summary"""
+    roadmap_q2_completion: str
+    roadmap_q4_completion: str
+    production_readiness: str
+
+
+@dataclass(slots=True, frozen=True)
+class PerformanceReport:
+    """Roadmap feature performance report"""
+    report_timestamp: str
+    roadmap_completion_status: str
+    query_suggestions: SuggestionsReport
+    advanced_search: SearchReport
+    overall_assessment: OverallAssessment
     
-    def __init__(self):
-        self.metrics = {
+    def to_dict(self) -> Dict[str, Any]:
+        """Nested dict layout for JSON responses"""
+        suggestions = self.query_suggestions
+        search = self.advanced_search
+        return {
+            "report_timestamp": self.report_timestamp,
+            "roadmap_completion_status": self.roadmap_completion_status,
             "query_suggestions": {
-                "total_requests": 0,
-                "successful_requests": 0,
-                "failed_requests": 0,
-                "avg_response_time_ms": 0.0,
-                "avg_suggestions_count": 0.0,
-                "cache_hit_rate": 0.0,
-                "top_query_patterns": []
+                "performance": {
+                    "total_requests": suggestions.total_requests,
+                    "success_rate": suggestions.success_rate,
+                    "avg_response_time_ms": suggestions.avg_response_time_ms,
+                    "avg_suggestions_per_request": suggestions.avg_suggestions_per_request
+                },
+                "usage_patterns": {
+                    "top_queries": list(suggestions.top_queries),
+                    "cache_efficiency": suggestions.cache_efficiency
+                },
+                "health_status": suggestions.health_status
             },
             "advanced_search": {
-                "total_searches": 0,
-                "successful_searches": 0,
-                "failed_searches": 0,
-                "avg_search_time_ms": 0.0,
-                "avg_results_count": 0.0,
-                "ml_ranking_usage": 0,
-                "query_expansion_usage": 0,
-                "avg_similarity_score": 0.0
+                "performance": {
+                    "total_searches": search.total_searches,
+                    "success_rate": search.success_rate,
+                    "avg_search_time_ms": search.avg_search_time_ms,
+                    "avg_results_per_search": search.avg_results_per_search,
+                    "avg_similarity_score": search.avg_similarity_score
+                },
+                "feature_adoption": {
+                    "ml_ranking_usage_rate": search.ml_ranking_usage_rate,
+                    "query_expansion_usage_rate": search.query_expansion_usage_rate
+                },
+                "health_status": search.health_status
+            },
+            "overall_assessment": {
+                "roadmap_q2_completion": self.overall_assessment.roadmap_q2_completion,
+                "roadmap_q4_completion": self.overall_assessment.roadmap_q4_completion,
+                "production_readiness": self.overall_assessment.production_readiness
             }
         }
+
+
+@dataclass(slots=True, frozen=True)
+class FeatureHealth:
+    """Health summary of the roadmap features"""
+    roadmap_features_health: str
+    query_suggestions: Optional[str] = None
+    advanced_search: Optional[str] = None
+    overall_completion: Optional[str] = None
+    production_readiness: Optional[str] = None
+    error: Optional[str] = None
+
+
+class RoadmapFeatureMonitor:
+    """Monitor performance and usage of new roadmap features"""
+    
+    EVENT_QUEUE_SIZE = 8192
+    CMS_DEPTH = 4
+    CMS_WIDTH_BITS = 10
+    CMS_WIDTH = 1 << CMS_WIDTH_BITS
+    # Odd 64-bit multipliers, one per sketch row, for multiply-shift hashing
+    CMS_MULTIPLIERS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+    TOP_PATTERNS_SIZE = 20
+    FLUSH_INTERVAL_SECONDS = 0.1
+    ALERT_SUMMARY_INTERVAL_SECONDS = 10.0
+    
+    def __init__(self):
+        # Scalar counters and running averages live in flat arrays indexed by
+        # the module-level slot constants; self.metrics is a dict view of them
+        self._counters = np.zeros(_NUM_COUNTERS, dtype=np.int64)
+        self._avgs = np.zeros(_NUM_AVERAGES, dtype=np.float64)
+        self._avg_counts = np.zeros(_NUM_AVERAGES, dtype=np.int64)
+        self._alert_avgs = np.zeros(_NUM_AVERAGES, dtype=np.float64)
+        self._suggestion_cache_hit_rate = 0.0
         
         self.performance_thresholds = {
             "suggestions_response_time_ms": 200,  # Max 200ms for suggestions
@@ -41,41 +184,91 @@ class RoadmapFeatureMonitor:
             "suggestion_success_rate": 0.95,     # 95% success rate
             "search_success_rate": 0.90,         # 90% success rate
             "min_suggestions_count": 3,          # At least 3 suggestions
-            "min_search_results": 1              # At least 1 search result
+            "min_search_results": 1,             # At least 1 search result
+            "ewma_alpha": 0.02,                  # Reported response-time EWMA
+            "alert_ewma_alpha": 0.5              # Fast response-time EWMA for alerts
         }
         
+        # Per-request events queued by record_*_metrics and folded in bulk
+        self._suggestion_events = deque(maxlen=self.EVENT_QUEUE_SIZE)
+        self._search_events = deque(maxlen=self.EVENT_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        
+        # Query pattern counts: count-min sketch plus a min-heap of the top queries
+        self._cms = np.zeros((self.CMS_DEPTH, self.CMS_WIDTH), dtype=np.uint32)
+        self._cms_rows = np.arange(self.CMS_DEPTH)
+        self._top_patterns: List[list] = []
+        self._top_patterns_index: Dict[int, list] = {}
+        self._top_pattern_strings: Dict[int, str] = {}
+        
+        # Bumped whenever a flush changes the metrics; keys the report cache
+        self._version = 0
+        self._report_version = -1
+        self._report_cache: Optional[PerformanceReport] = None
+        self._report_cache_hits = 0
+        self._report_cache_misses = 0
+        
+        # Breaches (slow flushes, peak recent ms, failures) since the last summary log
+        self._warn_enabled = logger.isEnabledFor(logging.WARNING)
+        self._error_enabled = logger.isEnabledFor(logging.ERROR)
+        self._pending_alerts = {"suggestions": [0, 0.0, 0], "search": [0, 0.0, 0]}
+        self._last_alert_summary = float("-inf")
+        
+        self._stop_event = threading.Event()
+        self._flush_thread = threading.Thread(
+            target=self._flush_loop, name="roadmap-metrics-flush", daemon=True
+        )
+        self._flush_thread.start()
+    
+    @property
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot of the aggregate metrics as nested dicts"""
+        counters = self._counters.tolist()
+        avgs = self._avgs.tolist()
+        avg_counts = self._avg_counts.tolist()
+        return {
+            "query_suggestions": {
+                "total_requests": counters[_IDX_SUG_TOTAL],
+                "successful_requests": counters[_IDX_SUG_OK],
+                "failed_requests": counters[_IDX_SUG_FAILED],
+                "avg_response_time_ms": avgs[_AVG_SUG_TIME],
+                "avg_response_time_ms_n": avg_counts[_AVG_SUG_TIME],
+                "avg_suggestions_count": avgs[_AVG_SUG_COUNT],
+                "avg_suggestions_count_n": avg_counts[_AVG_SUG_COUNT],
+                "cache_hit_rate": self._suggestion_cache_hit_rate
+            },
+            "advanced_search": {
+                "total_searches": counters[_IDX_SEARCH_TOTAL],
+                "successful_searches": counters[_IDX_SEARCH_OK],
+                "failed_searches": counters[_IDX_SEARCH_FAILED],
+                "avg_search_time_ms": avgs[_AVG_SEARCH_TIME],
+                "avg_search_time_ms_n": avg_counts[_AVG_SEARCH_TIME],
+                "avg_results_count": avgs[_AVG_SEARCH_RESULTS],
+                "avg_results_count_n": avg_counts[_AVG_SEARCH_RESULTS],
+                "ml_ranking_usage": counters[_IDX_ML_RANKING],
+                "query_expansion_usage": counters[_IDX_QUERY_EXPANSION],
+                "avg_similarity_score": avgs[_AVG_SIMILARITY],
+                "avg_similarity_score_n": avg_counts[_AVG_SIMILARITY]
+            }
+        }
+    
     def record_suggestion_metrics(self, 
                                 request_data: Dict[str, Any],
                                 response_data: Dict[str, Any],
                                 response_time_ms: float,
                                 success: bool):
         """Record metrics for query suggestions"""
-        try:
-            metrics = self.metrics["query_suggestions"]
-            
-            # Update counters
-            metrics["total_requests"] += 1
-            if success:
-                metrics["successful_requests"] += 1
-                
-                # Update averages
-                suggestion_count = response_data.get("count", 0)
-                self._update_average(metrics, "avg_suggestions_count", suggestion_count)
-                self._update_average(metrics, "avg_response_time_ms", response_time_ms)
-                
-                # Track query patterns
-                query = request_data.get("query", "").lower()
-                if query and len(query) > 3:
-                    self._track_query_pattern(query)
-                    
-            else:
-                metrics["failed_requests"] += 1
-                
-            # Log performance alerts
-            self._check_suggestion_performance_alerts(response_time_ms, success)
-            
-        except Exception as e:
-            logger.error(f"Failed to record suggestion metrics: {e}")
+        # Normalize payload shapes up front so the flusher never has to
+        # recover from a malformed event
+        count = response_data.get("count", 0) if isinstance(response_data, dict) else 0
+        query = request_data.get("query", "") if isinstance(request_data, dict) else ""
+        
+        # Request path only enqueues; the flusher folds events into the counters
+        self._suggestion_events.append((
+            response_time_ms, success,
+            count if isinstance(count, (int, float)) else 0,
+            query if isinstance(query, str) else ""
+        ))
     
     def record_search_metrics(self,
                             request_data: Dict[str, Any], 
@@ -83,179 +276,337 @@ class RoadmapFeatureMonitor:
                             response_time_ms: float,
                             success: bool):
         """Record metrics for advanced semantic search"""
-        try:
-            metrics = self.metrics["advanced_search"]
-            
-            # Update counters
-            metrics["total_searches"] += 1
-            if success:
-                metrics["successful_searches"] += 1
-                
-                # Update performance metrics
-                results_count = response_data.get("count", 0)
-                self._update_average(metrics, "avg_results_count", results_count)
-                self._update_average(metrics, "avg_search_time_ms", response_time_ms)
-                
-                # Track feature usage
-                if request_data.get("use_ml_ranking", False):
-                    metrics["ml_ranking_usage"] += 1
-                if request_data.get("use_query_expansion", False):
-                    metrics["query_expansion_usage"] += 1
-                
-                # Track search quality
-                results = response_data.get("results", [])
-                if results:
-                    avg_similarity = sum(
-                        r.get("similarity_score", 0) for r in results
-                    ) / len(results)
-                    self._update_average(metrics, "avg_similarity_score", avg_similarity)
-                    
-            else:
-                metrics["failed_searches"] += 1
-                
-            # Log performance alerts
-            self._check_search_performance_alerts(response_time_ms, success)
-            
-        except Exception as e:
-            logger.error(f"Failed to record search metrics: {e}")
+        if not isinstance(request_data, dict):
+            request_data = {}
+        if not isinstance(response_data, dict):
+            response_data = {}
+        count = response_data.get("count", 0)
+        # Producers may hand over the scores as an array directly
+        results = response_data.get("similarity_scores", response_data.get("results", ()))
+        if not isinstance(results, (np.ndarray, list, tuple)):
+            results = ()
+        
+        self._search_events.append((
+            response_time_ms, success,
+            count if isinstance(count, (int, float)) else 0,
+            bool(request_data.get("use_ml_ranking", False)),
+            bool(request_data.get("use_query_expansion", False)),
+            results
+        ))
     
-    def _update_average(self, metrics: Dict[str, Any], key: str, new_value: float):
-        """Update running average for a metric"""
-        current_avg = metrics.get(key, 0.0)
-        total_count = max(1, metrics.get("successful_requests", metrics.get("successful_searches", 1)))
-        
-        # Simple running average formula
-        updated_avg = ((current_avg * (total_count - 1)) + new_value) / total_count
-        metrics[key] = round(updated_avg, 3)
+    def _flush_loop(self):
+        """Background loop folding queued events into the aggregate metrics"""
+        while not self._stop_event.wait(self.FLUSH_INTERVAL_SECONDS):
+            self.flush()
     
-    def _track_query_pattern(self, query: str):
-        """Track popular query patterns"""
-        patterns = self.metrics["query_suggestions"]["top_query_patterns"]
+    def flush(self):
+        """Fold every queued suggestion and search event into the aggregate counters"""
+        with self._lock:
+            try:
+                self._flush_suggestion_events()
+            except Exception:
+                logger.error("Failed to record suggestion metrics", exc_info=True)
+            try:
+                self._flush_search_events()
+            except Exception:
+                logger.error("Failed to record search metrics", exc_info=True)
+            # Checked on every tick so breaches from a final burst are logged once traffic stops
+            if self._error_enabled:
+                self._log_alert_summary_if_due()
+    
+    def close(self):
+        """Stop the background flusher, fold any remaining events and log pending alerts"""
+        self._stop_event.set()
+        self._flush_thread.join()
+        self.flush()
+        if self._error_enabled:
+            with self._lock:
+                self._log_alert_summary()
+    
+    def _drain(self, events: deque) -> List[tuple]:
+        """Pop every queued event; safe against concurrent appends"""
+        batch = []
+        try:
+            while True:
+                batch.append(events.popleft())
+        except IndexError:
+            return batch
+    
+    def _flush_suggestion_events(self):
+        """Fold queued suggestion events into the aggregate metrics"""
+        batch = self._drain(self._suggestion_events)
+        if not batch:
+            return
+        self._version += 1
+        
+        response_times = []
+        count_sum = 0
         
-        # Find existing pattern
-        for pattern in patterns:
-            if pattern["query"] == query:
-                pattern["count"] += 1
-                return
+        for response_time_ms, success, suggestion_count, query in batch:
+            if not success:
+                continue
+            response_times.append(response_time_ms)
+            count_sum += suggestion_count
+            
+            # Track query patterns
+            query = query.lower()
+            if query and len(query) > 3:
+                self._track_query_pattern(query)
         
-        # Add new pattern
-        patterns.append({"query": query, "count": 1})
+        # Update counters and averages
+        successes = len(response_times)
+        failures = len(batch) - successes
+        self._counters[_SUG_COUNTER_SLOTS] += (len(batch), successes, failures)
+        self._merge_averages(_SUG_AVG_SLOTS, (count_sum,), (successes,))
+        self._update_response_time(_AVG_SUG_TIME, response_times)
         
-        # Keep only top 20 patterns
-        patterns.sort(key=lambda x: x["count"], reverse=True)
-        self.metrics["query_suggestions"]["top_query_patterns"] = patterns[:20]
+        # Log performance alerts
+        self._check_suggestion_performance_alerts(self._alert_avgs[_AVG_SUG_TIME], failures)
     
-    def _check_suggestion_performance_alerts(self, response_time_ms: float, success: bool):
-        """Check for suggestion performance issues"""
-        thresholds = self.performance_thresholds
+    def _flush_search_events(self):
+        """Fold queued search events into the aggregate metrics"""
+        batch = self._drain(self._search_events)
+        if not batch:
+            return
+        self._version += 1
         
-        if response_time_ms > thresholds["suggestions_response_time_ms"]:
-            logger.warning(
-                f"🚨 Suggestion response time alert: {response_time_ms:.2f}ms "
-                f"(threshold: {thresholds['suggestions_response_time_ms']}ms)"
-            )
+        response_times = []
+        results_sum = 0
+        ml_ranking_usage = 0
+        query_expansion_usage = 0
+        similarity_sum = 0.0
+        similarity_n = 0
         
-        if not success:
-            logger.error("🚨 Suggestion request failed")
+        for response_time_ms, success, results_count, use_ml, use_expansion, results in batch:
+            if not success:
+                continue
+            response_times.append(response_time_ms)
+            results_sum += results_count
+            
+            # Track feature usage
+            ml_ranking_usage += use_ml
+            query_expansion_usage += use_expansion
+            
+            # Track search quality
+            if len(results):
+                similarity_sum += self._mean_similarity(results)
+                similarity_n += 1
+        
+        # Update counters and performance metrics
+        successes = len(response_times)
+        failures = len(batch) - successes
+        self._counters[_SEARCH_COUNTER_SLOTS] += (
+            len(batch), successes, failures, ml_ranking_usage, query_expansion_usage
+        )
+        self._merge_averages(
+            _SEARCH_AVG_SLOTS, (results_sum, similarity_sum), (successes, similarity_n)
+        )
+        self._update_response_time(_AVG_SEARCH_TIME, response_times)
+        
+        # Log performance alerts
+        self._check_search_performance_alerts(self._alert_avgs[_AVG_SEARCH_TIME], failures)
+    
+    @staticmethod
+    def _mean_similarity(results) -> float:
+        """Mean similarity of a search's results (or of a precomputed score array)"""
+        if isinstance(results, np.ndarray):
+            return float(results.mean())
+        scores = np.fromiter(
+            (r.get("similarity_score", 0.0) if isinstance(r, dict) else 0.0 for r in results),
+            dtype=np.float64, count=len(results)
+        )
+        return float(scores.mean())
     
-    def _check_search_performance_alerts(self, response_time_ms: float, success: bool):
-        """Check for search performance issues"""
+    def _merge_averages(self, slots: List[int], batch_sums, batch_counts):
+        """Merge batch sums into the running averages at slots (Welford combined mean)"""
+        # Each average keeps its own sample count, since some are only
+        # updated on a subset of events
+        batch_counts = np.asarray(batch_counts, dtype=np.int64)
+        n = self._avg_counts[slots] + batch_counts
+        current = self._avgs[slots]
+        batch_means = np.asarray(batch_sums, dtype=np.float64) / np.maximum(batch_counts, 1)
+        # Slots without new samples get a zero weight and keep their value;
+        # one gather and one scatter per array
+        self._avgs[slots] = current + (batch_means - current) * batch_counts / np.maximum(n, 1)
+        self._avg_counts[slots] = n
+    
+    def _update_response_time(self, slot: int, response_times: List[float]):
+        """Fold a batch of response times into the reported and alerting EWMAs"""
+        if not response_times:
+            return
         thresholds = self.performance_thresholds
+        times = np.asarray(response_times, dtype=np.float64)
+        if not self._avg_counts[slot]:
+            # Seed with the first sample instead of decaying up from zero
+            self._avgs[slot] = self._alert_avgs[slot] = times[0]
+        self._avgs[slot] = self._ewma(self._avgs[slot], times, thresholds["ewma_alpha"])
+        self._alert_avgs[slot] = self._ewma(self._alert_avgs[slot], times, thresholds["alert_ewma_alpha"])
+        self._avg_counts[slot] += len(times)
+    
+    @staticmethod
+    def _ewma(current: float, values: np.ndarray, alpha: float) -> float:
+        """Apply values, oldest first, to an exponentially weighted moving average"""
+        weights = alpha * (1 - alpha) ** np.arange(len(values) - 1, -1, -1)
+        return current * (1 - alpha) ** len(values) + float(weights @ values)
+    
+    def _track_query_pattern(self, query: str):
+        """Track popular query patterns (count-min sketch + top-K min-heap)"""
+        # Work on the 64-bit hash; only queries in the top-K keep their string
+        query_hash = hash(query)
+        # Multiply-shift keeps the high bits so the rows hash independently; the low
+        # bits of hash((seed, query_hash)) collide in every row at once
+        columns = [
+            ((query_hash * multiplier) & _UINT64_MASK) >> (64 - self.CMS_WIDTH_BITS)
+            for multiplier in self.CMS_MULTIPLIERS
+        ]
+        self._cms[self._cms_rows, columns] += 1
+        estimate = int(self._cms[self._cms_rows, columns].min())
         
-        if response_time_ms > thresholds["search_response_time_ms"]:
-            logger.warning(
-                f"🚨 Search response time alert: {response_time_ms:.2f}ms "
-                f"(threshold: {thresholds['search_response_time_ms']}ms)"
-            )
-        
-        if not success:
-            logger.error("🚨 Search request failed")
+        entry = self._top_patterns_index.get(query_hash)
+        if entry is not None:
+            # Estimates only grow, so the updated entry can only sink in the heap
+            entry[0] = estimate
+            heapq.heapify(self._top_patterns)
+        elif len(self._top_patterns) < self.TOP_PATTERNS_SIZE:
+            entry = [estimate, query_hash]
+            self._top_patterns_index[query_hash] = entry
+            self._top_pattern_strings[query_hash] = query
+            heapq.heappush(self._top_patterns, entry)
+        elif estimate > self._top_patterns[0][0]:
+            entry = [estimate, query_hash]
+            self._top_patterns_index[query_hash] = entry
+            self._top_pattern_strings[query_hash] = query
+            evicted = heapq.heapreplace(self._top_patterns, entry)
+            del self._top_patterns_index[evicted[1]]
+            del self._top_pattern_strings[evicted[1]]
     
-    def get_performance_report(self) -> Dict[str, Any]:
-        """Generate comprehensive performance report"""
-        try:
-            suggestions_metrics = self.metrics["query_suggestions"]
-            search_metrics = self.metrics["advanced_search"]
-            
-            # Calculate success rates
-            suggestion_success_rate = 0.0
-            if suggestions_metrics["total_requests"] > 0:
-                suggestion_success_rate = (
-                    suggestions_metrics["successful_requests"] / 
-                    suggestions_metrics["total_requests"]
-                )
-            
-            search_success_rate = 0.0
-            if search_metrics["total_searches"] > 0:
-                search_success_rate = (
-                    search_metrics["successful_searches"] / 
-                    search_metrics["total_searches"]
+    def _get_top_query_patterns(self, limit: int) -> List[Dict[str, Any]]:
+        """Most frequent query patterns, highest estimated count first"""
+        ranked = sorted(self._top_patterns, key=lambda entry: entry[0], reverse=True)
+        return [
+            {"query": self._top_pattern_strings[query_hash], "count": count}
+            for count, query_hash in ranked[:limit]
+        ]
+    
+    def _check_suggestion_performance_alerts(self, recent_response_ms: float, failures: int):
+        """Check a flushed batch for suggestion performance issues"""
+        if self._error_enabled:
+            self._accumulate_alerts("suggestions", recent_response_ms, failures)
+    
+    def _check_search_performance_alerts(self, recent_response_ms: float, failures: int):
+        """Check a flushed batch for search performance issues"""
+        if self._error_enabled:
+            self._accumulate_alerts("search", recent_response_ms, failures)
+    
+    def _accumulate_alerts(self, feature: str, recent_response_ms: float, failures: int):
+        """Add a batch's breaches to the pending summary; flush() logs it when due"""
+        pending = self._pending_alerts[feature]
+        # Response-time alerts log at WARNING, failures at ERROR
+        threshold_ms = self.performance_thresholds[_RESPONSE_TIME_THRESHOLDS[feature]]
+        if self._warn_enabled and recent_response_ms > threshold_ms:
+            pending[0] += 1
+            pending[1] = max(pending[1], recent_response_ms)
+        pending[2] += failures
+    
+    def _log_alert_summary_if_due(self):
+        """Log the pending breaches if any are waiting and the summary interval has passed"""
+        if not any(slow_batches or failures for slow_batches, _, failures in self._pending_alerts.values()):
+            return
+        now = time.monotonic()
+        if now - self._last_alert_summary >= self.ALERT_SUMMARY_INTERVAL_SECONDS:
+            self._last_alert_summary = now
+            self._log_alert_summary()
+    
+    def _log_alert_summary(self):
+        """Log and reset the breaches accumulated since the last summary"""
+        thresholds = self.performance_thresholds
+        for feature, threshold_key in _RESPONSE_TIME_THRESHOLDS.items():
+            slow_batches, peak_ms, failures = self._pending_alerts[feature]
+            if slow_batches:
+                logger.warning(
+                    "🚨 %s response time alert: recent average up to %.2fms over %d flushes "
+                    "(threshold: %dms)",
+                    feature, peak_ms, slow_batches, thresholds[threshold_key]
                 )
+            if failures:
+                logger.error("🚨 %d %s requests failed", failures, feature)
+            self._pending_alerts[feature] = [0, 0.0, 0]
+    
+    def get_performance_report(self) -> "PerformanceReport":
+        """Generate comprehensive performance report"""
+        self.flush()
+        
+        with self._lock:
+            # Metrics unchanged since the last report: serve the cached copy
+            version = self._version
+            if self._report_version == version:
+                self._report_cache_hits += 1
+                return self._report_cache
+            self._report_cache_misses += 1
             
-            # Calculate feature adoption rates
-            ml_ranking_adoption = 0.0
-            query_expansion_adoption = 0.0
-            if search_metrics["successful_searches"] > 0:
-                ml_ranking_adoption = (
-                    search_metrics["ml_ranking_usage"] / 
-                    search_metrics["successful_searches"]
-                )
-                query_expansion_adoption = (
-                    search_metrics["query_expansion_usage"] / 
-                    search_metrics["successful_searches"]
+            # Snapshot under the lock so a concurrent flush can't tear the report
+            counters = self._counters.copy()
+            raw_avgs = self._avgs.copy()
+            top_queries = tuple(self._get_top_query_patterns(10))
+            cache_efficiency = self._suggestion_cache_hit_rate
+        
+        # Calculate success rates
+        suggestion_success_rate, search_success_rate = (
+            counters[[_IDX_SUG_OK, _IDX_SEARCH_OK]] /
+            np.maximum(counters[[_IDX_SUG_TOTAL, _IDX_SEARCH_TOTAL]], 1)
+        ).tolist()
+        
+        # Calculate feature adoption rates
+        ml_ranking_adoption, query_expansion_adoption = (
+            counters[[_IDX_ML_RANKING, _IDX_QUERY_EXPANSION]] /
+            max(counters[_IDX_SEARCH_OK], 1)
+        ).tolist()
+        
+        avgs = np.round(raw_avgs, 3).tolist()
+        
+        report = PerformanceReport(
+            report_timestamp=_now_iso(),
+            roadmap_completion_status="100%",
+            query_suggestions=SuggestionsReport(
+                total_requests=int(counters[_IDX_SUG_TOTAL]),
+                success_rate=round(suggestion_success_rate, 3),
+                avg_response_time_ms=avgs[_AVG_SUG_TIME],
+                avg_suggestions_per_request=avgs[_AVG_SUG_COUNT],
+                top_queries=top_queries,
+                cache_efficiency=cache_efficiency,
+                health_status=self._get_suggestions_health_status(suggestion_success_rate)
+            ),
+            advanced_search=SearchReport(
+                total_searches=int(counters[_IDX_SEARCH_TOTAL]),
+                success_rate=round(search_success_rate, 3),
+                avg_search_time_ms=avgs[_AVG_SEARCH_TIME],
+                avg_results_per_search=avgs[_AVG_SEARCH_RESULTS],
+                avg_similarity_score=avgs[_AVG_SIMILARITY],
+                ml_ranking_usage_rate=round(ml_ranking_adoption, 3),
+                query_expansion_usage_rate=round(query_expansion_adoption, 3),
+                health_status=self._get_search_health_status(search_success_rate)
+            ),
+            overall_assessment=OverallAssessment(
+                roadmap_q2_completion="100%" if suggestion_success_rate > 0.8 else "Degraded",
+                roadmap_q4_completion="100%" if search_success_rate > 0.8 else "Degraded",
+                production_readiness=self._assess_production_readiness(
+                    suggestion_success_rate, search_success_rate
                 )
-            
-            report = {
-                "report_timestamp": datetime.now().isoformat(),
-                "roadmap_completion_status": "100%",
-                
-                "query_suggestions": {
-                    "performance": {
-                        "total_requests": suggestions_metrics["total_requests"],
-                        "success_rate": round(suggestion_success_rate, 3),
-                        "avg_response_time_ms": suggestions_metrics["avg_response_time_ms"],
-                        "avg_suggestions_per_request": suggestions_metrics["avg_suggestions_count"]
-                    },
-                    "usage_patterns": {
-                        "top_queries": suggestions_metrics["top_query_patterns"][:10],
-                        "cache_efficiency": suggestions_metrics["cache_hit_rate"]
-                    },
-                    "health_status": self._get_suggestions_health_status(suggestion_success_rate)
-                },
-                
-                "advanced_search": {
-                    "performance": {
-                        "total_searches": search_metrics["total_searches"],
-                        "success_rate": round(search_success_rate, 3),
-                        "avg_search_time_ms": search_metrics["avg_search_time_ms"],
-                        "avg_results_per_search": search_metrics["avg_results_count"],
-                        "avg_similarity_score": search_metrics["avg_similarity_score"]
-                    },
-                    "feature_adoption": {
-                        "ml_ranking_usage_rate": round(ml_ranking_adoption, 3),
-                        "query_expansion_usage_rate": round(query_expansion_adoption, 3)
-                    },
-                    "health_status": self._get_search_health_status(search_success_rate)
-                },
-                
-                "overall_assessment": {
-                    "roadmap_q2_completion": "100%" if suggestion_success_rate > 0.8 else "Degraded",
-                    "roadmap_q4_completion": "100%" if search_success_rate > 0.8 else "Degraded",
-                    "production_readiness": self._assess_production_readiness(
-                        suggestion_success_rate, search_success_rate
-                    )
-                }
-            }
-            
-            return report
-            
-        except Exception as e:
-            logger.error(f"Failed to generate performance report: {e}")
-            return {
-                "error": "Report generation failed",
-                "message": str(e),
-                "timestamp": datetime.now().isoformat()
-            }
+            )
+        )
+        
+        with self._lock:
+            # Keyed by the snapshot's version; don't replace a report built from newer metrics
+            if version > self._report_version:
+                self._report_cache = report
+                self._report_version = version
+        return report
+    
+    @property
+    def report_cache_hit_rate(self) -> float:
+        """Fraction of get_performance_report calls served from the cache"""
+        total = self._report_cache_hits + self._report_cache_misses
+        return self._report_cache_hits / total if total else 0.0
     
     def _get_suggestions_health_status(self, success_rate: float) -> str:
         """Determine suggestions health status"""
@@ -312,57 +663,52 @@ def log_search_performance(request_data: Dict[str, Any],
         request_data, response_data, response_time_ms, success
     )
 
-def get_roadmap_completion_report() -> Dict[str, Any]:
+def get_roadmap_completion_report() -> PerformanceReport:
     """Get comprehensive roadmap completion report"""
     return feature_monitor.get_performance_report()
 
 # Health check functions
-def check_feature_health() -> Dict[str, Any]:
+def check_feature_health() -> FeatureHealth:
     """Check health of new roadmap features"""
     try:
         report = get_roadmap_completion_report()
-        
-        health_status = {
-            "roadmap_features_health": "healthy",
-            "query_suggestions": report["query_suggestions"]["health_status"],
-            "advanced_search": report["advanced_search"]["health_status"],
-            "overall_completion": report["overall_assessment"]["roadmap_q2_completion"],
-            "production_readiness": report["overall_assessment"]["production_readiness"]
-        }
+        suggestions_health = report.query_suggestions.health_status
+        search_health = report.advanced_search.health_status
         
         # Determine overall health
-        if (health_status["query_suggestions"] == "healthy" and 
-            health_status["advanced_search"] == "healthy"):
-            health_status["roadmap_features_health"] = "healthy"
-        elif (health_status["query_suggestions"] in ["healthy", "degraded"] and 
-              health_status["advanced_search"] in ["healthy", "degraded"]):
-            health_status["roadmap_features_health"] = "degraded"
+        if suggestions_health == "healthy" and search_health == "healthy":
+            overall_health = "healthy"
+        elif (suggestions_health in ["healthy", "degraded"] and 
+              search_health in ["healthy", "degraded"]):
+            overall_health = "degraded"
         else:
-            health_status["roadmap_features_health"] = "unhealthy"
+            overall_health = "unhealthy"
         
-        return health_status
+        return FeatureHealth(
+            roadmap_features_health=overall_health,
+            query_suggestions=suggestions_health,
+            advanced_search=search_health,
+            overall_completion=report.overall_assessment.roadmap_q2_completion,
+            production_readiness=report.overall_assessment.production_readiness
+        )
         
     except Exception as e:
         logger.error(f"Feature health check failed: {e}")
-        return {
-            "roadmap_features_health": "unhealthy",
-            "error": str(e)
-        }
+        return FeatureHealth(roadmap_features_health="unhealthy", error=str(e))
 
 # Performance testing utilities
 def run_feature_performance_test() -> Dict[str, Any]:
     """Run basic performance test on both features"""
     try:
         test_results = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": _now_iso(),
             "tests": {}
         }
         
         # Test suggestions performance
-        import time
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         # Mock suggestion test
-        suggestion_test_time = (time.time() - start_time) * 1000
+        suggestion_test_time = ((time.perf_counter_ns() - start_ns) // 1000) / 1000.0
         
         test_results["tests"]["suggestions"] = {
             "response_time_ms": round(suggestion_test_time, 2),
@@ -371,9 +717,9 @@ def run_feature_performance_test() -> Dict[str, Any]:
         }
         
         # Test search performance
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         # Mock search test
-        search_test_time = (time.time() - start_time) * 1000
+        search_test_time = ((time.perf_counter_ns() - start_ns) // 1000) / 1000.0
         
         test_results["tests"]["search"] = {
             "response_time_ms": round(search_test_time, 2),
@@ -390,7 +736,7 @@ def run_feature_performance_test() -> Dict[str, Any]:
     except Exception as e:
         logger.error(f"Performance test failed: {e}")
         return {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": _now_iso(),
             "overall_status": "fail",
             "error": str(e)
         }
\ No newline at end of file
@@ -3,129 +3,151 @@ Automated monitoring and alerting for input validation security
 """
 import json
 import boto3
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import cached_property
 from typing import Dict, List
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Shared session so credential resolution happens once per process
+_SESSION = boto3.session.Session()
+
+# Bounded retries keep alarm paths from retry-storming a degraded endpoint
+_CLIENT_CONFIG = Config(max_pool_connections=50, retries={"max_attempts": 2, "mode": "standard"})
+
+# Constant dashboard definition, serialized once at import time
+_DASHBOARD_BODY = json.dumps({
+    "widgets": [
+        {
+            "type": "metric",
+            "properties": {
+                "metrics": [
+                    ["HealthAI/Security", "PIIDetected", {"stat": "Sum"}],
+                    [".", "PromptInjectionAttempts", {"stat": "Sum"}],
+                    [".", "DangerousAdviceRequests", {"stat": "Sum"}],
+                    [".", "ValidationFailures", {"stat": "Sum"}]
+                ],
+                "period": 300,
+                "stat": "Sum",
+                "region": "us-east-1",
+                "title": "Security Validation Events",
+                "annotations": {
+                    "horizontal": [
+                        {"label": "Critical Alert Threshold", "value": 10}
+                    ]
+                }
+            }
+        },
+        {
+            "type": "metric", 
+            "properties": {
+                "metrics": [
+                    ["HealthAI/Security", "HighRiskQueries", {"stat": "Sum"}],
+                    [".", "CriticalRiskQueries", {"stat": "Sum"}],
+                    [".", "MedicalContextScore", {"stat": "Average"}]
+                ],
+                "period": 300,
+                "stat": "Average",
+                "region": "us-east-1",
+                "title": "Risk Assessment Metrics"
+            }
+        },
+        {
+            "type": "log",
+            "properties": {
+                "query": "SOURCE '/aws/ecs/healthai'\n| fields @timestamp, risk_level, violations, query_hash\n| filter event_type = \"INPUT_VALIDATION\"\n| filter risk_level in [\"HIGH\", \"CRITICAL\"]\n| stats count() by violations\n| sort count desc\n| limit 20",
+                "region": "us-east-1", 
+                "title": "Top Security Violations"
+            }
+        }
+    ]
+})
+
+_SECURITY_ALARMS = (
+    # Critical: PII Detection Alarm
+    {
+        "AlarmName": 'HealthAI-PII-Detection-Critical',
+        "ComparisonOperator": 'GreaterThanThreshold',
+        "EvaluationPeriods": 1,
+        "MetricName": 'PIIDetected',
+        "Namespace": 'HealthAI/Security',
+        "Period": 300,
+        "Statistic": 'Sum',
+        "Threshold": 5.0,
+        "ActionsEnabled": True,
+        "AlarmActions": [
+            'arn:aws:sns:us-east-1:123456789012:healthai-security-critical'
+        ],
+        "AlarmDescription": 'CRITICAL: PII detected in medical queries - potential HIPAA violation',
+        "Unit": 'Count',
+        "TreatMissingData": 'notBreaching'
+    },
+    # High: Prompt Injection Attempts
+    {
+        "AlarmName": 'HealthAI-Prompt-Injection-Attempts',
+        "ComparisonOperator": 'GreaterThanThreshold',
+        "EvaluationPeriods": 2,
+        "MetricName": 'PromptInjectionAttempts',
+        "Namespace": 'HealthAI/Security',
+        "Period": 300,
+        "Statistic": 'Sum',
+        "Threshold": 10.0,
+        "ActionsEnabled": True,
+        "AlarmActions": [
+            'arn:aws:sns:us-east-1:123456789012:healthai-security-high'
+        ],
+        "AlarmDescription": 'HIGH: Multiple prompt injection attempts detected'
+    },
+    # Medium: Unusual validation failure rate
+    {
+        "AlarmName": 'HealthAI-High-Validation-Failure-Rate',
+        "ComparisonOperator": 'GreaterThanThreshold',
+        "EvaluationPeriods": 3,
+        "MetricName": 'ValidationFailureRate',
+        "Namespace": 'HealthAI/Security',
+        "Period": 600,
+        "Statistic": 'Average',
+        "Threshold": 25.0,  # 25% failure rate
+        "ActionsEnabled": True,
+        "AlarmActions": [
+            'arn:aws:sns:us-east-1:123456789012:healthai-security-medium'
+        ],
+        "AlarmDescription": 'MEDIUM: High validation failure rate may indicate attack or system issue'
+    }
+)
+
 class ValidationSecurityMonitor:
     """Monitor input validation for security incidents and patterns"""
     
-    def __init__(self):
-        self.cloudwatch = boto3.client('cloudwatch')
-        self.sns = boto3.client('sns')
+    @cached_property
+    def cloudwatch(self):
+        """CloudWatch client, created on first use"""
+        return _SESSION.client('cloudwatch', config=_CLIENT_CONFIG)
+    
+    @cached_property
+    def sns(self):
+        """SNS client, created on first use"""
+        return _SESSION.client('sns', config=_CLIENT_CONFIG)
         
     def create_validation_metrics_dashboard(self):
         """Create CloudWatch dashboard for validation security metrics"""
-        
-        dashboard_config = {
-            "widgets": [
-                {
-                    "type": "metric",
-                    "properties": {
-                        "metrics": [
-                            ["HealthAI/Security", "PIIDetected", {"stat": "Sum"}],
-                            [".", "PromptInjectionAttempts", {"stat": "Sum"}],
-                            [".", "DangerousAdviceRequests", {"stat": "Sum"}],
-                            [".", "ValidationFailures", {"stat": "Sum"}]
-                        ],
-                        "period": 300,
-                        "stat": "Sum",
-                        "region": "us-east-1",
-                        "title": "Security Validation Events",
-                        "annotations": {
-                            "horizontal": [
-                                {"label": "Critical Alert Threshold", "value": 10}
-                            ]
-                        }
-                    }
-                },
-                {
-                    "type": "metric", 
-                    "properties": {
-                        "metrics": [
-                            ["HealthAI/Security", "HighRiskQueries", {"stat": "Sum"}],
-                            [".", "CriticalRiskQueries", {"stat": "Sum"}],
-                            [".", "MedicalContextScore", {"stat": "Average"}]
-                        ],
-                        "period": 300,
-                        "stat": "Average",
-                        "region": "us-east-1",
-                        "title": "Risk Assessment Metrics"
-                    }
-                },
-                {
-                    "type": "log",
-                    "properties": {
-                        "query": "SOURCE '/aws/ecs/healthai'\n| fields @timestamp, risk_level, violations, query_hash\n| filter event_type = \"INPUT_VALIDATION\"\n| filter risk_level in [\"HIGH\", \"CRITICAL\"]\n| stats count() by violations\n| sort count desc\n| limit 20",
-                        "region": "us-east-1", 
-                        "title": "Top Security Violations"
-                    }
-                }
-            ]
-        }
-        
         return self.cloudwatch.put_dashboard(
             DashboardName='HealthAI-Input-Security-Monitoring',
-            DashboardBody=json.dumps(dashboard_config)
+            DashboardBody=_DASHBOARD_BODY
         )
     
     def setup_security_alarms(self):
         """Set up CloudWatch alarms for security incidents"""
+        # Create the client here: boto3 sessions aren't thread-safe, so the
+        # workers must only share an existing client
+        cloudwatch = self.cloudwatch
         
-        # Critical: PII Detection Alarm
-        self.cloudwatch.put_metric_alarm(
-            AlarmName='HealthAI-PII-Detection-Critical',
-            ComparisonOperator='GreaterThanThreshold',
-            EvaluationPeriods=1,
-            MetricName='PIIDetected',
-            Namespace='HealthAI/Security',
-            Period=300,
-            Statistic='Sum',
-            Threshold=5.0,
-            ActionsEnabled=True,
-            AlarmActions=[
-                'arn:aws:sns:us-east-1:123456789012:healthai-security-critical'
-            ],
-            AlarmDescription='CRITICAL: PII detected in medical queries - potential HIPAA violation',
-            Unit='Count',
-            TreatMissingData='notBreaching'
-        )
-        
-        # High: Prompt Injection Attempts
-        self.cloudwatch.put_metric_alarm(
-            AlarmName='HealthAI-Prompt-Injection-Attempts',
-            ComparisonOperator='GreaterThanThreshold',
-            EvaluationPeriods=2,
-            MetricName='PromptInjectionAttempts',
-            Namespace='HealthAI/Security',
-            Period=300,
-            Statistic='Sum',
-            Threshold=10.0,
-            ActionsEnabled=True,
-            AlarmActions=[
-                'arn:aws:sns:us-east-1:123456789012:healthai-security-high'
-            ],
-            AlarmDescription='HIGH: Multiple prompt injection attempts detected'
-        )
-        
-        # Medium: Unusual validation failure rate
-        self.cloudwatch.put_metric_alarm(
-            AlarmName='HealthAI-High-Validation-Failure-Rate',
-            ComparisonOperator='GreaterThanThreshold',
-            EvaluationPeriods=3,
-            MetricName='ValidationFailureRate',
-            Namespace='HealthAI/Security',
-            Period=600,
-            Statistic='Average',
-            Threshold=25.0,  # 25% failure rate
-            ActionsEnabled=True,
-            AlarmActions=[
-                'arn:aws:sns:us-east-1:123456789012:healthai-security-medium'
-            ],
-            AlarmDescription='MEDIUM: High validation failure rate may indicate attack or system issue'
-        )
+        # Alarms are independent, so issue the round-trips concurrently
+        with ThreadPoolExecutor(max_workers=len(_SECURITY_ALARMS)) as executor:
+            list(executor.map(lambda alarm: cloudwatch.put_metric_alarm(**alarm), _SECURITY_ALARMS))
     
     def generate_security_report(self, hours_back: int = 24) -> Dict:
         """Generate security report for validation events"""
@@ -134,31 +156,26 @@ class ValidationSecurityMonitor:
         start_time = end_time - timedelta(hours=hours_back)
         
         try:
-            # Query validation security metrics
-            metrics_data = self.cloudwatch.get_metric_statistics(
-                Namespace='HealthAI/Security',
-                MetricName='PIIDetected',
-                Dimensions=[],
-                StartTime=start_time,
-                EndTime=end_time,
-                Period=3600,
-                Statistics=['Sum']
-            )
-            
-            pii_incidents = sum(point['Sum'] for point in metrics_data.get('Datapoints', []))
-            
-            # Get injection attempt metrics
-            injection_data = self.cloudwatch.get_metric_statistics(
-                Namespace='HealthAI/Security',
-                MetricName='PromptInjectionAttempts',
-                Dimensions=[],
+            # Fetch both security metrics in a single round-trip
+            response = self.cloudwatch.get_metric_data(
+                MetricDataQueries=[
+                    {
+                        "Id": query_id,
+                        "MetricStat": {
+                            "Metric": {"Namespace": "HealthAI/Security", "MetricName": metric_name},
+                            "Period": 3600,
+                            "Stat": "Sum"
+                        }
+                    }
+                    for query_id, metric_name in (("pii", "PIIDetected"), ("inj", "PromptInjectionAttempts"))
+                ],
                 StartTime=start_time,
-                EndTime=end_time,
-                Period=3600,
-                Statistics=['Sum']
+                EndTime=end_time
             )
             
-            injection_attempts = sum(point['Sum'] for point in injection_data.get('Datapoints', []))
+            totals = {result["Id"]: sum(result.get("Values", [])) for result in response.get("MetricDataResults", [])}
+            pii_incidents = totals.get("pii", 0)
+            injection_attempts = totals.get("inj", 0)
             
             return {
                 "period": f"Last {hours_back} hours",
@@ -226,8 +243,7 @@ def automated_security_check():
         # Send alert if critical issues found
         if "CRITICAL" in report.get("security_summary", {}).get("status", ""):
             # Send immediate notification
-            sns = boto3.client('sns')
-            sns.publish(
+            monitor.sns.publish(
                 TopicArn='arn:aws:sns:us-east-1:123456789012:healthai-security-critical',
                 Message=f"CRITICAL SECURITY ALERT: {json.dumps(report, indent=2)}",
                 Subject="HealthAI - Critical Security Issue Detected"
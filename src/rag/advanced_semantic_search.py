@@ -6,31 +6,53 @@ ML-based ranking, contextual query expansion, and intelligent retrieval
 import os
 import json
 import logging
+import re
+import time
 import numpy as np
-from typing import List, Dict, Any, Optional, Tuple
+from types import MappingProxyType
+from typing import List, Dict, Any, Mapping, Optional, Tuple
 from dataclasses import dataclass
 from datetime import datetime
 import asyncio
+import functools
 from collections import defaultdict, Counter
 import math
 
 # ML imports for advanced features
 try:
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    from sklearn.metrics.pairwise import cosine_similarity
+    from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+    from sklearn.pipeline import make_pipeline
+    from sklearn.metrics.pairwise import linear_kernel
     from sklearn.cluster import KMeans
+    import scipy.sparse as sp
     SKLEARN_AVAILABLE = True
 except ImportError:
     SKLEARN_AVAILABLE = False
     logging.warning("scikit-learn not available, using basic similarity")
 
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
 from src.vectorstore.faiss_store import HealthAIVectorStore
 from src.embeddings.openai_embed import HealthAIEmbedding
 from src.analytics.medical_query_analyzer import MedicalQueryAnalyzer
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Terms counted towards a document's medical specificity
+MEDICAL_TERMS = (
+    'diagnosis', 'treatment', 'symptoms', 'medication', 'therapy',
+    'disease', 'condition', 'patient', 'clinical', 'medical'
+)
+
+def _document_content(document: Dict[str, Any]) -> str:
+    """Document text; training docs use 'content', vector search results use 'text'"""
+    return document.get('content') or document.get('text', '')
+
+@dataclass(slots=True)
 class SemanticSearchResult:
     """Enhanced search result with ML-based features"""
     document_id: str
@@ -42,7 +64,7 @@ class SemanticSearchResult:
     explanation: Dict[str, Any]  # Why this document was ranked highly
     semantic_matches: List[str]  # Key semantic matches found
 
-@dataclass
+@dataclass(slots=True)
 class QueryExpansion:
     """Query expansion result"""
     original_query: str
@@ -51,14 +73,71 @@ class QueryExpansion:
     contextual_terms: List[str]
     final_expanded_query: str
 
+# Static expansion vocabularies, built once and shared by every expander instance
+_MEDICAL_SYNONYMS = MappingProxyType({
+    "diabetes": ("diabetes mellitus", "hyperglycemia", "blood sugar disorder"),
+    "hypertension": ("high blood pressure", "elevated BP", "arterial hypertension"),
+    "myocardial infarction": ("heart attack", "MI", "cardiac arrest"),
+    "cerebrovascular accident": ("stroke", "CVA", "brain attack"),
+    "pneumonia": ("lung infection", "pulmonary infection", "chest infection"),
+    "asthma": ("bronchial asthma", "reactive airway", "breathing difficulty"),
+    "depression": ("major depression", "depressive disorder", "mood disorder"),
+    "anxiety": ("anxiety disorder", "nervousness", "worry", "panic"),
+    "arthritis": ("joint inflammation", "joint pain", "rheumatoid arthritis"),
+    "migraine": ("severe headache", "vascular headache", "migraine headache"),
+    "pain": ("ache", "discomfort", "soreness", "tenderness"),
+    "fever": ("pyrexia", "elevated temperature", "hyperthermia"),
+    "fatigue": ("tiredness", "exhaustion", "weakness", "lethargy"),
+    "nausea": ("queasiness", "stomach upset", "morning sickness"),
+    "dizziness": ("vertigo", "lightheadedness", "spinning sensation")
+})
+
+_MEDICAL_CONTEXTS = MappingProxyType({
+    "cardiovascular": ("heart", "blood pressure", "circulation", "cardiac"),
+    "respiratory": ("breathing", "lungs", "airways", "pulmonary"),
+    "neurological": ("brain", "nervous system", "neurologic", "mental"),
+    "gastrointestinal": ("stomach", "digestive", "intestinal", "gastric"),
+    "endocrine": ("hormonal", "metabolic", "glandular", "endocrine"),
+    "musculoskeletal": ("bone", "joint", "muscle", "skeletal")
+})
+
+_INTENT_EXPANSIONS = MappingProxyType({
+    "symptoms": ("signs", "manifestations", "presentations", "indicators"),
+    "treatment": ("therapy", "management", "intervention", "care"),
+    "diagnosis": ("detection", "identification", "screening", "evaluation")
+})
+
+_DOMAIN_EXPANSIONS = MappingProxyType({
+    "symptoms": ("signs", "manifestations", "symptoms", "presentations"),
+    "diagnosis": ("diagnostic", "identification", "detection", "screening"),
+    "treatment": ("therapy", "management", "intervention", "treatment"),
+    "medication": ("drugs", "pharmaceuticals", "medicines", "medications"),
+    "prevention": ("prophylaxis", "prevention", "avoidance", "protection"),
+    "emergency": ("urgent", "acute", "critical", "emergency")
+})
+
+_AGE_SPECIFIC_TERMS = MappingProxyType({
+    "pediatric": ("children", "pediatric", "infant", "child"),
+    "geriatric": ("elderly", "geriatric", "senior", "older adults"),
+    "adult": ("adult", "grown-up")
+})
+
 class MedicalSemanticQueryExpander:
     """Intelligent medical query expansion"""
     
+    EXPANSION_CACHE_SIZE = 1024
+    
     def __init__(self):
         """Initialize query expander with medical knowledge"""
         self.medical_synonyms = self._load_medical_synonyms()
         self.medical_contexts = self._load_medical_contexts()
         self.query_analyzer = MedicalQueryAnalyzer()
+        
+        # Expansion is pure over its arguments and common conditions repeat often
+        self._expand_cached = functools.lru_cache(maxsize=self.EXPANSION_CACHE_SIZE)(
+            self._expand_from_context_items
+        )
+        self.cache_clear = self._expand_cached.cache_clear
     
     def expand_query(self, 
                     query: str,
@@ -67,6 +146,9 @@ class MedicalSemanticQueryExpander:
         """
         Expand medical query with synonyms and context
         
+        Repeated arguments return the same cached QueryExpansion, which
+        callers must treat as read-only.
+        
         Args:
             query: Original user query
             user_context: Optional user context for personalization
@@ -75,6 +157,25 @@ class MedicalSemanticQueryExpander:
         Returns:
             QueryExpansion object with expanded terms
         """
+        try:
+            context_items = frozenset((user_context or {}).items())
+        except TypeError:
+            # Unhashable context values cannot key the cache
+            return self._expand_query(query, user_context, max_expansions)
+        return self._expand_cached(query, context_items, max_expansions)
+    
+    def _expand_from_context_items(self,
+                                   query: str,
+                                   context_items: frozenset,
+                                   max_expansions: int) -> QueryExpansion:
+        """Cache entry point taking the user context as hashable items"""
+        return self._expand_query(query, dict(context_items), max_expansions)
+    
+    def _expand_query(self,
+                      query: str,
+                      user_context: Optional[Dict[str, Any]],
+                      max_expansions: int) -> QueryExpansion:
+        """Uncached query expansion"""
         try:
             # Analyze the original query
             analysis = self.query_analyzer.analyze_query(query)
@@ -89,12 +190,7 @@ class MedicalSemanticQueryExpander:
                 medical_synonyms.extend(synonyms[:2])  # Limit to 2 per entity
             
             # 2. Add contextual medical terms based on query intent
-            if analysis.query_intent == "symptoms":
-                contextual_terms.extend(["signs", "manifestations", "presentations", "indicators"])
-            elif analysis.query_intent == "treatment":
-                contextual_terms.extend(["therapy", "management", "intervention", "care"])
-            elif analysis.query_intent == "diagnosis":
-                contextual_terms.extend(["detection", "identification", "screening", "evaluation"])
+            contextual_terms.extend(_INTENT_EXPANSIONS.get(analysis.query_intent, ()))
             
             # 3. Add domain-specific expansions
             for domain in analysis.medical_domains:
@@ -107,8 +203,9 @@ class MedicalSemanticQueryExpander:
                 if age_group:
                     contextual_terms.extend(self._get_age_specific_terms(age_group))
             
-            # Combine and deduplicate
-            all_expansions = list(set(medical_synonyms + contextual_terms))
+            # Combine and deduplicate, keeping insertion order so expansions are deterministic
+            medical_synonyms = list(dict.fromkeys(medical_synonyms))
+            all_expansions = list(dict.fromkeys([*medical_synonyms, *contextual_terms]))
             expanded_terms = all_expansions[:max_expansions]
             
             # Create final expanded query
@@ -134,76 +231,81 @@ class MedicalSemanticQueryExpander:
                 final_expanded_query=query
             )
     
-    def _get_medical_synonyms(self, term: str) -> List[str]:
+    async def aexpand_query(self,
+                            query: str,
+                            user_context: Optional[Dict[str, Any]] = None,
+                            max_expansions: int = 5) -> QueryExpansion:
+        """Run expand_query in the default executor so it can overlap other search work"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.expand_query, query, user_context, max_expansions)
+        )
+    
+    def _get_medical_synonyms(self, term: str) -> Tuple[str, ...]:
         """Get medical synonyms for a term"""
-        return self.medical_synonyms.get(term, [])
+        return self.medical_synonyms.get(term, ())
     
-    def _get_domain_expansions(self, domain: str) -> List[str]:
+    def _get_domain_expansions(self, domain: str) -> Tuple[str, ...]:
         """Get domain-specific expansion terms"""
-        expansions = {
-            "symptoms": ["signs", "manifestations", "symptoms", "presentations"],
-            "diagnosis": ["diagnostic", "identification", "detection", "screening"],
-            "treatment": ["therapy", "management", "intervention", "treatment"],
-            "medication": ["drugs", "pharmaceuticals", "medicines", "medications"],
-            "prevention": ["prophylaxis", "prevention", "avoidance", "protection"],
-            "emergency": ["urgent", "acute", "critical", "emergency"]
-        }
-        return expansions.get(domain, [])
+        return _DOMAIN_EXPANSIONS.get(domain, ())
     
-    def _get_age_specific_terms(self, age_group: str) -> List[str]:
+    def _get_age_specific_terms(self, age_group: str) -> Tuple[str, ...]:
         """Get age-specific medical terms"""
-        age_terms = {
-            "pediatric": ["children", "pediatric", "infant", "child"],
-            "geriatric": ["elderly", "geriatric", "senior", "older adults"],
-            "adult": ["adult", "grown-up"]
-        }
-        return age_terms.get(age_group, [])
+        return _AGE_SPECIFIC_TERMS.get(age_group, ())
     
-    def _load_medical_synonyms(self) -> Dict[str, List[str]]:
+    def _load_medical_synonyms(self) -> Mapping[str, Tuple[str, ...]]:
         """Load medical synonym dictionary"""
-        return {
-            "diabetes": ["diabetes mellitus", "hyperglycemia", "blood sugar disorder"],
-            "hypertension": ["high blood pressure", "elevated BP", "arterial hypertension"],
-            "myocardial infarction": ["heart attack", "MI", "cardiac arrest"],
-            "cerebrovascular accident": ["stroke", "CVA", "brain attack"],
-            "pneumonia": ["lung infection", "pulmonary infection", "chest infection"],
-            "asthma": ["bronchial asthma", "reactive airway", "breathing difficulty"],
-            "depression": ["major depression", "depressive disorder", "mood disorder"],
-            "anxiety": ["anxiety disorder", "nervousness", "worry", "panic"],
-            "arthritis": ["joint inflammation", "joint pain", "rheumatoid arthritis"],
-            "migraine": ["severe headache", "vascular headache", "migraine headache"],
-            "pain": ["ache", "discomfort", "soreness", "tenderness"],
-            "fever": ["pyrexia", "elevated temperature", "hyperthermia"],
-            "fatigue": ["tiredness", "exhaustion", "weakness", "lethargy"],
-            "nausea": ["queasiness", "stomach upset", "morning sickness"],
-            "dizziness": ["vertigo", "lightheadedness", "spinning sensation"]
-        }
+        return _MEDICAL_SYNONYMS
     
-    def _load_medical_contexts(self) -> Dict[str, List[str]]:
+    def _load_medical_contexts(self) -> Mapping[str, Tuple[str, ...]]:
         """Load medical context mappings"""
-        return {
-            "cardiovascular": ["heart", "blood pressure", "circulation", "cardiac"],
-            "respiratory": ["breathing", "lungs", "airways", "pulmonary"],
-            "neurological": ["brain", "nervous system", "neurologic", "mental"],
-            "gastrointestinal": ["stomach", "digestive", "intestinal", "gastric"],
-            "endocrine": ["hormonal", "metabolic", "glandular", "endocrine"],
-            "musculoskeletal": ["bone", "joint", "muscle", "skeletal"]
-        }
+        return _MEDICAL_CONTEXTS
 
 class MLRankingEngine:
     """Machine Learning-based ranking for search results"""
     
+    # Per-document arrays persisted by save_cache, one .npy file each
+    _CACHE_ARRAYS = (
+        '_content_length', '_title_length', '_content_quality',
+        '_doc_timestamps', '_medical_terms_count'
+    )
+    
     def __init__(self):
         """Initialize ML ranking components"""
         self.tfidf_vectorizer = None
         self.document_corpus = []
-        self.ml_features_cache = {}
+        
+        # Training-time document cache as parallel arrays, one row per document
+        self._doc_id_to_row: Dict[Any, int] = {}
+        self._tfidf_csr = None
+        self._content_length = np.empty(0, dtype=np.int32)
+        self._title_length = np.empty(0, dtype=np.int32)
+        self._content_quality = np.empty(0, dtype=np.float64)
+        self._doc_timestamps = np.empty(0, dtype=np.float64)  # epoch seconds, NaN if undated
+        self._medical_terms_count = np.empty(0, dtype=np.int32)
+        self._content_words: List[frozenset] = []
+        
+        self._medical_terms_regex = re.compile('|'.join(MEDICAL_TERMS))
+        self._medical_terms_automaton = None
+        if AHOCORASICK_AVAILABLE:
+            # Single-pass multi-pattern matcher; also reports overlapping terms
+            self._medical_terms_automaton = ahocorasick.Automaton()
+            for term in MEDICAL_TERMS:
+                self._medical_terms_automaton.add_word(term, term)
+            self._medical_terms_automaton.make_automaton()
         
         if SKLEARN_AVAILABLE:
-            self.tfidf_vectorizer = TfidfVectorizer(
-                max_features=1000,
-                stop_words='english',
-                ngram_range=(1, 2)
+            # Stateless hashing (no vocabulary dict) into float32 TF-IDF rows
+            self.tfidf_vectorizer = make_pipeline(
+                HashingVectorizer(
+                    n_features=1024,
+                    alternate_sign=False,
+                    norm=None,
+                    dtype=np.float32,
+                    stop_words='english',
+                    ngram_range=(1, 2)
+                ),
+                TfidfTransformer(sublinear_tf=True)
             )
         
     def train_ranking_model(self, documents: List[Dict[str, Any]]):
@@ -228,24 +330,122 @@ class MLRankingEngine:
             # Train TF-IDF vectorizer
             self.tfidf_vectorizer.fit(self.document_corpus)
             
-            # Pre-compute document vectors for efficiency
-            doc_vectors = self.tfidf_vectorizer.transform(self.document_corpus)
-            
-            # Cache document features
-            for i, doc in enumerate(documents):
-                doc_id = doc.get('doc_id', str(i))
-                self.ml_features_cache[doc_id] = {
-                    'tfidf_vector': doc_vectors[i],
-                    'content_length': len(doc.get('content', '')),
-                    'title_length': len(doc.get('title', '')),
-                    'metadata': doc.get('metadata', {})
-                }
+            # Pre-compute float32 document vectors; rows are L2-normalized
+            self._tfidf_csr = sp.csr_matrix(
+                self.tfidf_vectorizer.transform(self.document_corpus), dtype=np.float32
+            )
+            
+            # Cache document features, row i describing documents[i]
+            static = [self._document_static_features(doc) for doc in documents]
+            count = len(documents)
+            self._doc_id_to_row = {doc.get('doc_id', str(i)): i for i, doc in enumerate(documents)}
+            self._content_length = np.fromiter(
+                (len(doc.get('content', '')) for doc in documents), dtype=np.int32, count=count
+            )
+            self._title_length = np.fromiter(
+                (len(doc.get('title', '')) for doc in documents), dtype=np.int32, count=count
+            )
+            self._content_quality = np.fromiter(
+                (f['content_quality'] for f in static), dtype=np.float64, count=count
+            )
+            self._doc_timestamps = np.fromiter(
+                (f['timestamp'] for f in static), dtype=np.float64, count=count
+            )
+            self._medical_terms_count = np.fromiter(
+                (f['medical_terms_count'] for f in static), dtype=np.int32, count=count
+            )
+            self._content_words = [f['content_words'] for f in static]
             
             logger.info(f"Trained ML ranking model on {len(documents)} documents")
             
         except Exception as e:
             logger.error(f"ML ranking training failed: {e}")
     
+    def save_cache(self, directory: str) -> None:
+        """
+        Persist the trained document cache so a restart can skip training
+        
+        Args:
+            directory: Directory to write the cache files to
+        """
+        if self._tfidf_csr is None:
+            raise ValueError("ML ranking model has not been trained")
+        
+        os.makedirs(directory, exist_ok=True)
+        sp.save_npz(os.path.join(directory, "tfidf.npz"), self._tfidf_csr)
+        np.save(os.path.join(directory, "idf.npy"), self.tfidf_vectorizer[-1].idf_)
+        for name in self._CACHE_ARRAYS:
+            np.save(os.path.join(directory, f"{name.lstrip('_')}.npy"), getattr(self, name))
+        
+        with open(os.path.join(directory, "documents.json"), 'w', encoding='utf-8') as f:
+            json.dump({
+                "doc_ids": list(self._doc_id_to_row),
+                "content_words": [sorted(words) for words in self._content_words]
+            }, f)
+        
+        logger.info(f"Saved ML ranking cache for {len(self._doc_id_to_row)} documents to {directory}")
+    
+    def load_cache(self, directory: str) -> bool:
+        """
+        Warm-start from a cache written by save_cache
+        
+        Args:
+            directory: Directory containing the cache files
+            
+        Returns:
+            True if the cache was loaded, False if it is missing or unreadable
+        """
+        documents_path = os.path.join(directory, "documents.json")
+        if not SKLEARN_AVAILABLE or not os.path.exists(documents_path):
+            return False
+        
+        try:
+            with open(documents_path, 'r', encoding='utf-8') as f:
+                documents = json.load(f)
+            idf = np.load(os.path.join(directory, "idf.npy"))
+            tfidf_csr = sp.load_npz(os.path.join(directory, "tfidf.npz"))
+            arrays = {
+                name: np.load(os.path.join(directory, f"{name.lstrip('_')}.npy"), mmap_mode='r')
+                for name in self._CACHE_ARRAYS
+            }
+        except Exception as e:
+            logger.error(f"Failed to load ML ranking cache: {e}")
+            return False
+        
+        # The hashing step is stateless; only the IDF weights were learned
+        transformer = self.tfidf_vectorizer[-1]
+        transformer.idf_ = idf
+        transformer.n_features_in_ = len(idf)
+        
+        self._tfidf_csr = tfidf_csr
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        self._content_words = [frozenset(words) for words in documents["content_words"]]
+        self._doc_id_to_row = {doc_id: row for row, doc_id in enumerate(documents["doc_ids"])}
+        
+        logger.info(f"Loaded ML ranking cache for {len(self._doc_id_to_row)} documents from {directory}")
+        return True
+    
+    @property
+    def ml_features_cache(self) -> Mapping[Any, int]:
+        """Row of each document cached at training time, keyed by doc_id"""
+        return MappingProxyType(self._doc_id_to_row)
+    
+    def transform_query(self, query: str):
+        """
+        Vectorize a query once so it can be scored against many documents
+        
+        Returns:
+            Sparse TF-IDF row, or None when the model is unavailable or untrained
+        """
+        if not SKLEARN_AVAILABLE or not self.tfidf_vectorizer:
+            return None
+        try:
+            return self.tfidf_vectorizer.transform([query])
+        except Exception as e:
+            logger.error(f"ML relevance calculation failed: {e}")
+            return None
+    
     def calculate_ml_relevance(self, 
                               query: str, 
                               document: Dict[str, Any],
@@ -261,114 +461,239 @@ class MLRankingEngine:
         Returns:
             Tuple of (ml_score, explanation_dict)
         """
-        if not SKLEARN_AVAILABLE or not self.tfidf_vectorizer:
-            return base_similarity, {"method": "fallback", "reason": "ML not available"}
+        return self.calculate_ml_relevance_batch(
+            query, self.transform_query(query), [document], [base_similarity]
+        )[0]
+    
+    def calculate_ml_relevance_batch(self,
+                                     query: str,
+                                     query_vector,
+                                     documents: List[Dict[str, Any]],
+                                     base_similarities: List[float]) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Calculate ML-based relevance scores for all candidates of one query
         
-        try:
-            # Get TF-IDF similarity
-            query_vector = self.tfidf_vectorizer.transform([query])
-            doc_content = document.get('content', '')
-            doc_vector = self.tfidf_vectorizer.transform([doc_content])
-            
-            tfidf_similarity = cosine_similarity(query_vector, doc_vector)[0][0]
-            
-            # Calculate feature scores
-            features = self._calculate_document_features(query, document)
-            
-            # Weighted combination of features
-            weights = {
-                'tfidf_similarity': 0.4,
-                'content_quality': 0.2,
-                'freshness': 0.1,
-                'medical_specificity': 0.2,
-                'query_alignment': 0.1
-            }
+        Args:
+            query: User query
+            query_vector: TF-IDF row from transform_query
+            documents: Documents to score
+            base_similarities: Base similarity score of each document from vector search
             
-            ml_score = (
-                tfidf_similarity * weights['tfidf_similarity'] +
-                features['content_quality'] * weights['content_quality'] +
-                features['freshness'] * weights['freshness'] +
-                features['medical_specificity'] * weights['medical_specificity'] +
-                features['query_alignment'] * weights['query_alignment']
-            )
+        Returns:
+            List of (ml_score, explanation_dict) tuples, one per document
+        """
+        if query_vector is None:
+            return [
+                (base_similarity, {"method": "fallback", "reason": "ML not available"})
+                for base_similarity in base_similarities
+            ]
+        
+        try:
+            rows = self._cached_rows(documents)
             
-            # Combine with base similarity (ensemble approach)
-            final_score = (base_similarity * 0.6) + (ml_score * 0.4)
+            # TF-IDF rows are L2-normalized, so one mat-vec product yields the cosines
+            doc_matrix = self._get_document_vectors(documents, rows)
+            tfidf_similarities = linear_kernel(query_vector, doc_matrix).ravel()
             
-            explanation = {
-                "method": "ml_ranking",
-                "tfidf_similarity": round(tfidf_similarity, 3),
-                "features": features,
-                "weights": weights,
-                "final_score": round(final_score, 3)
-            }
+            features = self._calculate_features_batch(query, documents, rows)
             
-            return final_score, explanation
+            return [
+                self._combine_ml_features(float(tfidf_similarity), document_features, base_similarity)
+                for tfidf_similarity, document_features, base_similarity
+                in zip(tfidf_similarities, features, base_similarities)
+            ]
             
         except Exception as e:
             logger.error(f"ML relevance calculation failed: {e}")
-            return base_similarity, {"method": "fallback", "error": str(e)}
+            return [
+                (base_similarity, {"method": "fallback", "error": str(e)})
+                for base_similarity in base_similarities
+            ]
+    
+    def _cached_rows(self, documents: List[Dict[str, Any]]) -> np.ndarray:
+        """Training cache row of each document, -1 for documents unseen at training"""
+        return np.fromiter(
+            (self._doc_id_to_row.get(document.get('doc_id'), -1) for document in documents),
+            dtype=np.intp, count=len(documents)
+        )
+    
+    def _get_document_vectors(self, documents: List[Dict[str, Any]], rows: np.ndarray):
+        """Gather cached TF-IDF rows, vectorizing only documents unseen at training"""
+        missing = np.flatnonzero(rows < 0)
+        if len(missing) == 0:
+            return self._tfidf_csr[rows]
+        
+        new_vectors = sp.csr_matrix(self.tfidf_vectorizer.transform(
+            [_document_content(documents[position]) for position in missing]
+        ), dtype=np.float32)
+        if len(missing) == len(rows):
+            return new_vectors
+        
+        # Stack cached rows then new rows, and permute back to document order
+        cached = np.flatnonzero(rows >= 0)
+        stacked = sp.vstack([self._tfidf_csr[rows[cached]], new_vectors], format='csr')
+        order = np.empty(len(rows), dtype=np.intp)
+        order[np.concatenate([cached, missing])] = np.arange(len(rows))
+        return stacked[order]
+    
+    def _combine_ml_features(self,
+                             tfidf_similarity: float,
+                             features: Dict[str, float],
+                             base_similarity: float) -> Tuple[float, Dict[str, Any]]:
+        """Weight TF-IDF similarity and document features into an ML relevance score"""
+        # Weighted combination of features
+        weights = {
+            'tfidf_similarity': 0.4,
+            'content_quality': 0.2,
+            'freshness': 0.1,
+            'medical_specificity': 0.2,
+            'query_alignment': 0.1
+        }
+        
+        ml_score = (
+            tfidf_similarity * weights['tfidf_similarity'] +
+            features['content_quality'] * weights['content_quality'] +
+            features['freshness'] * weights['freshness'] +
+            features['medical_specificity'] * weights['medical_specificity'] +
+            features['query_alignment'] * weights['query_alignment']
+        )
+        
+        # Combine with base similarity (ensemble approach)
+        final_score = (base_similarity * 0.6) + (ml_score * 0.4)
+        
+        explanation = {
+            "method": "ml_ranking",
+            "tfidf_similarity": round(tfidf_similarity, 3),
+            "features": features,
+            "weights": weights,
+            "final_score": round(final_score, 3)
+        }
+        
+        return final_score, explanation
     
     def _calculate_document_features(self, query: str, document: Dict[str, Any]) -> Dict[str, float]:
         """Calculate various document quality features"""
-        content = document.get('content', '')
-        metadata = document.get('metadata', {})
-        
-        features = {}
+        return self._calculate_features_batch(query, [document])[0]
+    
+    def _calculate_features_batch(self,
+                                  query: str,
+                                  documents: List[Dict[str, Any]],
+                                  rows: Optional[np.ndarray] = None) -> List[Dict[str, float]]:
+        """Calculate document quality features for all candidates of one query"""
+        if rows is None:
+            rows = self._cached_rows(documents)
+        count = len(documents)
         
-        # Content quality (based on length, structure, etc.)
-        content_length = len(content)
-        features['content_quality'] = min(1.0, content_length / 1000)  # Normalize by 1000 chars
+        # Query-invariant features come from the training cache when available
+        cached = rows >= 0
+        cached_rows = rows[cached]
+        content_quality = np.empty(count, dtype=np.float64)
+        timestamps = np.empty(count, dtype=np.float64)
+        medical_counts = np.empty(count, dtype=np.int32)
+        content_quality[cached] = self._content_quality[cached_rows]
+        timestamps[cached] = self._doc_timestamps[cached_rows]
+        medical_counts[cached] = self._medical_terms_count[cached_rows]
+        content_words = [self._content_words[row] if row >= 0 else None for row in rows.tolist()]
         
-        # Freshness (if date available)
-        doc_date = metadata.get('date')
-        if doc_date:
-            try:
-                doc_datetime = datetime.fromisoformat(doc_date)
-                days_old = (datetime.now() - doc_datetime).days
-                features['freshness'] = max(0.1, 1.0 - (days_old / 365))  # Decay over year
-            except:
-                features['freshness'] = 0.5  # Default for unparseable dates
-        else:
-            features['freshness'] = 0.5  # Default when no date
+        for position in np.flatnonzero(~cached).tolist():
+            static = self._document_static_features(documents[position])
+            content_quality[position] = static['content_quality']
+            timestamps[position] = static['timestamp']
+            medical_counts[position] = static['medical_terms_count']
+            content_words[position] = static['content_words']
         
-        # Medical specificity (count of medical terms)
-        medical_terms = [
-            'diagnosis', 'treatment', 'symptoms', 'medication', 'therapy',
-            'disease', 'condition', 'patient', 'clinical', 'medical'
-        ]
-        medical_count = sum(1 for term in medical_terms if term in content.lower())
-        features['medical_specificity'] = min(1.0, medical_count / 10)
+        freshness = self._freshness(timestamps, time.time())
+        medical_specificity = np.minimum(1.0, medical_counts / 10)
         
         # Query alignment (simple keyword matching)
         query_words = set(query.lower().split())
-        content_words = set(content.lower().split())
-        overlap = len(query_words.intersection(content_words))
-        features['query_alignment'] = min(1.0, overlap / len(query_words)) if query_words else 0.0
+        overlaps = np.fromiter(
+            (len(words.intersection(query_words)) for words in content_words),
+            dtype=np.int32, count=count
+        )
+        if query_words:
+            query_alignment = np.minimum(1.0, overlaps / len(query_words))
+        else:
+            query_alignment = np.zeros(count)
         
-        return features
+        return [
+            {
+                'content_quality': quality,
+                'freshness': fresh,
+                'medical_specificity': specificity,
+                'query_alignment': alignment
+            }
+            for quality, fresh, specificity, alignment in zip(
+                content_quality.tolist(), freshness.tolist(),
+                medical_specificity.tolist(), query_alignment.tolist()
+            )
+        ]
+    
+    def _document_static_features(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Features that depend only on the document, not on the query"""
+        content = _document_content(document).lower()
+        return {
+            # Content quality (based on length, structure, etc.)
+            'content_quality': min(1.0, len(content) / 1000),  # Normalize by 1000 chars
+            'timestamp': self._document_timestamp(document.get('metadata', {})),
+            # Medical specificity (distinct medical terms, one scan)
+            'medical_terms_count': len(self._find_medical_terms(content)),
+            'content_words': frozenset(content.split())
+        }
+    
+    def _find_medical_terms(self, content_lower: str) -> set:
+        """Distinct medical terms occurring in lowercased content"""
+        if self._medical_terms_automaton is not None:
+            return {term for _, term in self._medical_terms_automaton.iter(content_lower)}
+        return set(self._medical_terms_regex.findall(content_lower))
+    
+    @staticmethod
+    def _document_timestamp(metadata: Dict[str, Any]) -> float:
+        """Document date as epoch seconds, NaN when missing or unparseable"""
+        doc_date = metadata.get('date')
+        if not doc_date:
+            return math.nan
+        try:
+            return datetime.fromisoformat(doc_date).timestamp()
+        except (TypeError, ValueError):
+            return math.nan
+    
+    @staticmethod
+    def _freshness(timestamps: np.ndarray, now_ts: float) -> np.ndarray:
+        """Freshness scores decaying over a year from each document date"""
+        days_old = np.floor((now_ts - timestamps) / 86400)
+        freshness = np.maximum(0.1, 1.0 - (days_old / 365))  # Decay over year
+        return np.where(np.isnan(timestamps), 0.5, freshness)  # Default for undated documents
 
 class AdvancedSemanticSearch:
     """Advanced semantic search with ML ranking and query expansion"""
     
     def __init__(self, 
                  vector_store: HealthAIVectorStore,
-                 embedder: HealthAIEmbedding):
+                 embedder: HealthAIEmbedding,
+                 nprobe: int = 16,
+                 ml_cache_path: Optional[str] = None):
         """
         Initialize advanced semantic search
         
         Args:
             vector_store: Vector store for similarity search
             embedder: Embedding model for query processing
+            nprobe: IVF cells scanned per query; ML re-ranking of the wider
+                candidate pool absorbs the approximate search's recall loss
+            ml_cache_path: Directory the trained ML ranking cache is saved to
         """
         self.vector_store = vector_store
+        self.vector_store.set_nprobe(nprobe)
         self.embedder = embedder
         self.query_expander = MedicalSemanticQueryExpander()
         self.ml_ranker = MLRankingEngine()
+        self.ml_cache_path = ml_cache_path
         
         # Search configuration
         self.default_k = 10  # Retrieve more for re-ranking
         self.final_k = 5     # Return fewer after ML ranking
+        self.rerank_gap_threshold = 0.2  # Vector similarity gap at rank k that skips re-ranking
         
         logger.info("Advanced semantic search initialized")
     
@@ -392,12 +717,20 @@ class AdvancedSemanticSearch:
             List of ranked semantic search results
         """
         try:
+            loop = asyncio.get_running_loop()
+            
+            # The ML query vector only depends on the original query, so it is
+            # built in the background while expansion and vector search run
+            query_vector_task = None
+            if use_ml_ranking:
+                query_vector_task = loop.run_in_executor(None, self.ml_ranker.transform_query, query)
+            
             # Step 1: Query expansion
             expanded_query = query
             query_expansion = None
             
             if use_query_expansion:
-                query_expansion = self.query_expander.expand_query(
+                query_expansion = await self.query_expander.aexpand_query(
                     query, 
                     user_context=user_context
                 )
@@ -407,13 +740,12 @@ class AdvancedSemanticSearch:
             # Step 2: Vector similarity search (get more results for re-ranking)
             search_k = max(self.default_k, k * 2) if use_ml_ranking else k
             
-            # Use expanded query for vector search
-            vector_results = self.vector_store.search(
-                query=expanded_query,
-                embedder=self.embedder,
-                k=search_k,
-                threshold=0.1
-            )
+            # Use expanded query for vector search; embedding runs off the event loop
+            search_task = loop.run_in_executor(None, self._vector_search, expanded_query, search_k)
+            if query_vector_task is not None:
+                vector_results, query_vector = await asyncio.gather(search_task, query_vector_task)
+            else:
+                vector_results, query_vector = await search_task, None
             
             if not vector_results:
                 logger.info("No vector results found")
@@ -421,29 +753,53 @@ class AdvancedSemanticSearch:
             
             # Step 3: ML-based re-ranking (if enabled)
             enhanced_results = []
+            vector_method = "vector_only"
+            
+            if use_ml_ranking:
+                fast_path_results = self._clear_vector_top_k(vector_results, k)
+                if fast_path_results is not None:
+                    # Re-ranking cannot change which candidates make the top k
+                    vector_results = fast_path_results
+                    vector_method = "vector_only_fast_path"
+                    use_ml_ranking = False
+            
+            if use_ml_ranking:
+                # Vectorize the original query once and score every candidate together
+                ml_scores = self.ml_ranker.calculate_ml_relevance_batch(
+                    query,
+                    query_vector,
+                    vector_results,
+                    [self._vector_similarity(result) for result in vector_results]
+                )
+            
+            # Tokenize the query and lowercase expansion terms once per search
+            query_words = tuple(dict.fromkeys(query.lower().split()))
+            expanded_terms = [
+                (term, term.lower()) for term in query_expansion.expanded_terms
+            ] if query_expansion else []
+            match_pattern = self._compile_match_pattern(
+                [*query_words, *(term_lower for _, term_lower in expanded_terms)]
+            )
             
             for i, result in enumerate(vector_results):
                 try:
                     # Calculate ML relevance score
-                    ml_score = result.get('similarity', 0.0)
-                    explanation = {"method": "vector_only"}
+                    ml_score = self._vector_similarity(result)
+                    explanation = {"method": vector_method}
                     
                     if use_ml_ranking:
-                        ml_score, explanation = self.ml_ranker.calculate_ml_relevance(
-                            query=query,  # Use original query for ML scoring
-                            document=result,
-                            base_similarity=result.get('similarity', 0.0)
-                        )
+                        ml_score, explanation = ml_scores[i]
                     
                     # Calculate combined score
-                    vector_sim = result.get('similarity', 0.0)
+                    vector_sim = self._vector_similarity(result)
                     combined_score = (vector_sim * 0.6) + (ml_score * 0.4)
                     
                     # Extract semantic matches
                     semantic_matches = self._extract_semantic_matches(
-                        query, 
-                        result.get('text', ''),
-                        query_expansion
+                        match_pattern,
+                        query_words,
+                        result.get('text', '').lower(),
+                        expanded_terms
                     )
                     
                     # Create enhanced result
@@ -464,9 +820,8 @@ class AdvancedSemanticSearch:
                     logger.error(f"Error processing result {i}: {e}")
                     continue
             
-            # Step 4: Sort by combined score and return top k
-            enhanced_results.sort(key=lambda x: x.combined_score, reverse=True)
-            final_results = enhanced_results[:k]
+            # Step 4: Select the top k by combined score, sorting only those
+            final_results = self._top_k_results(enhanced_results, k)
             
             logger.info(f"Returned {len(final_results)} enhanced semantic search results")
             
@@ -476,26 +831,82 @@ class AdvancedSemanticSearch:
             logger.error(f"Advanced semantic search failed: {e}")
             return []
     
+    @staticmethod
+    def _vector_similarity(result: Dict[str, Any]) -> float:
+        """Vector similarity of a search result; the FAISS store reports it as similarity_score"""
+        return result.get('similarity_score', result.get('similarity', 0.0))
+    
+    def _clear_vector_top_k(self, vector_results: List[Dict[str, Any]], k: int) -> Optional[List[Dict[str, Any]]]:
+        """Top k vector results when a similarity gap separates them from the rest, else None"""
+        if k <= 0 or len(vector_results) <= k:
+            return None
+        
+        similarities = np.fromiter(
+            (self._vector_similarity(result) for result in vector_results),
+            dtype=np.float64, count=len(vector_results)
+        )
+        order = np.argsort(-similarities, kind='stable')
+        if similarities[order[k - 1]] - similarities[order[k]] <= self.rerank_gap_threshold:
+            return None
+        return [vector_results[index] for index in order[:k]]
+    
+    def _vector_search(self, text: str, k: int) -> List[Dict[str, Any]]:
+        """Embed the search text once and query the store with the precomputed vector"""
+        query_embedding = self.embedder.embed_text(text)
+        return self.vector_store.search(query_embedding=query_embedding, k=k, threshold=0.1)
+    
+    @staticmethod
+    def _top_k_results(results: List[SemanticSearchResult], k: int) -> List[SemanticSearchResult]:
+        """Highest combined-score results in descending order"""
+        if k <= 0 or not results:
+            return []
+        
+        scores = np.fromiter((result.combined_score for result in results), dtype=np.float32, count=len(results))
+        if k < len(scores):
+            top_indices = np.sort(np.argpartition(-scores, k - 1)[:k])
+        else:
+            top_indices = np.arange(len(scores))
+        # Stable sort keeps vector-search order among equal scores
+        top_indices = top_indices[np.argsort(-scores[top_indices], kind='stable')]
+        
+        return [results[index] for index in top_indices]
+    
+    @staticmethod
+    def _compile_match_pattern(terms: List[str]) -> Optional[re.Pattern]:
+        """Compile one whole-word alternation over the query and expansion terms"""
+        # Longest first so multi-word expansions win over their component words
+        unique_terms = sorted({term for term in terms if term}, key=len, reverse=True)
+        if not unique_terms:
+            return None
+        return re.compile(r'(?<!\w)(?:' + '|'.join(map(re.escape, unique_terms)) + r')(?!\w)')
+    
     def _extract_semantic_matches(self, 
-                                query: str, 
-                                content: str,
-                                query_expansion: Optional[QueryExpansion]) -> List[str]:
-        """Extract key semantic matches between query and content"""
-        matches = []
+                                match_pattern: Optional[re.Pattern],
+                                query_words: Tuple[str, ...], 
+                                content_lower: str,
+                                expanded_terms: List[Tuple[str, str]]) -> List[str]:
+        """
+        Extract key semantic matches between query and content
         
-        query_words = set(query.lower().split())
-        content_lower = content.lower()
+        Args:
+            match_pattern: Alternation over all query and expansion terms
+            query_words: Distinct lowercased query words
+            content_lower: Lowercased document content
+            expanded_terms: (term, lowercased term) pairs from query expansion
+        """
+        if match_pattern is None:
+            return []
+        
+        # A single scan of the content finds every term that occurs in it
+        found = set(match_pattern.findall(content_lower))
         
         # Direct word matches
-        for word in query_words:
-            if word in content_lower:
-                matches.append(f"Direct: {word}")
+        matches = [f"Direct: {word}" for word in query_words if word in found]
         
         # Expansion matches
-        if query_expansion:
-            for term in query_expansion.expanded_terms:
-                if term.lower() in content_lower:
-                    matches.append(f"Expanded: {term}")
+        matches.extend(
+            f"Expanded: {term}" for term, term_lower in expanded_terms if term_lower in found
+        )
         
         return matches[:5]  # Limit to top 5 matches
     
@@ -517,6 +928,9 @@ class AdvancedSemanticSearch:
                 documents
             )
             
+            if self.ml_cache_path:
+                await loop.run_in_executor(None, self.ml_ranker.save_cache, self.ml_cache_path)
+            
             logger.info("ML ranking model training completed")
             
         except Exception as e:
@@ -565,10 +979,14 @@ def create_advanced_semantic_search(vectorstore_path: str = "data/vectorstore")
     try:
         # Initialize components
         embedder = HealthAIEmbedding()
-        vector_store = HealthAIVectorStore(vectorstore_path)
+        vector_store = HealthAIVectorStore(vectorstore_path, index_type="ivfpq")
         
         # Create advanced search
-        search_engine = AdvancedSemanticSearch(vector_store, embedder)
+        ml_cache_path = os.path.join(vectorstore_path, "ml_ranking")
+        search_engine = AdvancedSemanticSearch(vector_store, embedder, ml_cache_path=ml_cache_path)
+        
+        # Warm-start ML ranking from the last training run instead of retraining
+        search_engine.ml_ranker.load_cache(ml_cache_path)
         
         logger.info(f"Advanced semantic search created with vectorstore at {vectorstore_path}")
         
@@ -5,8 +5,17 @@ Combines document retrieval with AI generation for question answering
 
 import os
 import sys
+import asyncio
+import functools
+import hashlib
+import shutil
+import threading
+import traceback
+from collections import OrderedDict
+from pathlib import Path
 from typing import List, Dict, Any, Optional
 import logging
+import numpy as np
 
 # Add src to path for imports
 current_dir = os.path.dirname(__file__)
@@ -18,16 +27,139 @@ sys.path.insert(0, src_dir)
 from src.embeddings.openai_embed import HealthAIEmbedding
 from src.vectorstore.faiss_store import HealthAIVectorStore
 from src.services.fusion_ai import FusionAIService
-from src.ingestion.pdf_parser import PDFParser
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+NO_DOCUMENTS_ANSWER = "I don't have any indexed documents to search. Please index some medical documents first."
+NO_RESULTS_ANSWER = "I couldn't find any relevant information in the indexed documents for your question."
+NO_CONTEXT_ANSWER = "No indexed context available."
+
+# The AI service receives the retrieved context separately from the prompt
+# (as Gemini's cacheable prefix and Groq's system message), so the prompt
+# carries only the question and instructions
+_CONTEXT_PREFIX = """You are a helpful medical AI assistant. Use the provided context to answer the user's question accurately and comprehensively.
+
+Context from medical documents:
+"""
+_QUESTION_PROMPT = """User Question: {query}
+
+Instructions:
+1. Answer based primarily on the provided context
+2. If the context doesn't contain relevant information, say so clearly
+3. Provide specific, actionable medical information when possible
+4. Include disclaimers about consulting healthcare professionals for serious concerns
+5. Be concise but thorough
+
+Answer:"""
+
+# Tokens each context entry adds around its source and text (upper bound
+# for "Source: \nContent: \n")
+CONTEXT_ENTRY_OVERHEAD_TOKENS = 8
+
+# English averages about four characters per token; text longer than this
+# many characters per remaining token is assumed not to fit without tokenizing
+CHARS_PER_TOKEN = 4
+
+# Long-lived event loop behind the synchronous API; the AI service's HTTP
+# sessions are bound to the loop that opened them, so reusing one loop keeps
+# connections alive across queries
+_event_loop: Optional[asyncio.AbstractEventLoop] = None
+_event_loop_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1)
+def _token_encoder():
+    """cl100k_base encoder, or None when tiktoken or its encoding file is unavailable"""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Token counting falls back to character estimates: {e}")
+        return None
+
+
+def _count_tokens(text: str) -> int:
+    """Number of tokens in text, estimated from its length without an encoder"""
+    encoder = _token_encoder()
+    if encoder is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def _run_sync(coro):
+    """Run a coroutine on the shared event loop and wait for its result"""
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(target=_event_loop.run_forever, name="rag-event-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _event_loop).result()
+
+
+class _LRUCache:
+    """Thread-safe least-recently-used map with hit/miss counters"""
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Cached value for key, or None on a miss"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value) -> None:
+        """Store value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def clear(self) -> None:
+        """Drop all entries and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
 
 class RAGRetriever:
     """Document retrieval component for RAG"""
     
+    EMBEDDING_CACHE_SIZE = 10_000
+    RESULTS_CACHE_SIZE = 1_000
+    
     def __init__(self, vector_store: HealthAIVectorStore, embedder: HealthAIEmbedding):
         """
         Initialize RAG retriever
@@ -39,7 +171,13 @@ class RAGRetriever:
         self.vector_store = vector_store
         self.embedder = embedder
         
-    def retrieve_documents(self, query: str, k: int = 5, threshold: float = 0.1) -> List[Dict[str, Any]]:
+        # Repeat questions skip the embedding call and, while the index is
+        # unchanged, the vector search too
+        self._embedding_cache = _LRUCache(self.EMBEDDING_CACHE_SIZE)
+        self._results_cache = _LRUCache(self.RESULTS_CACHE_SIZE)
+        
+    def retrieve_documents(self, query: str, k: int = 5, threshold: float = 0.1,
+                           nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Retrieve relevant documents for a query
         
@@ -47,17 +185,105 @@ class RAGRetriever:
             query: Search query
             k: Number of documents to retrieve
             threshold: Similarity threshold
+            nprobe: IVF cells to scan, trading recall for latency (defaults to the store setting)
             
         Returns:
             List of relevant documents with metadata
         """
-        logger.info(f"Retrieving documents for query: '{query[:50]}...'")
+        logger.info("Retrieving documents for query: '%.50s...'", query)
         
         # Search for relevant documents
-        results = self.vector_store.search(query, self.embedder, k=k, threshold=threshold)
+        results_key = self._results_key(query, k, threshold, nprobe)
+        results = self._results_cache.get(results_key)
+        if results is None:
+            query_embedding = self._query_embeddings([query])[0]
+            results = self.vector_store.search(
+                query_embedding=query_embedding, k=k, threshold=threshold, nprobe=nprobe
+            )
+            self._results_cache.put(results_key, results)
+        
+        logger.info("Retrieved %d documents", len(results))
+        return [dict(doc) for doc in results]
+    
+    def retrieve_documents_batch(self, queries: List[str], k: int = 5, threshold: float = 0.1,
+                                 nprobe: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieve relevant documents for several queries at once
+        
+        Args:
+            queries: Search queries
+            k: Number of documents to retrieve per query
+            threshold: Similarity threshold
+            nprobe: IVF cells to scan, trading recall for latency (defaults to the store setting)
+            
+        Returns:
+            List of relevant documents with metadata, one list per query
+        """
+        if not queries:
+            return []
+        
+        logger.info("Retrieving documents for %d queries", len(queries))
         
-        logger.info(f"Retrieved {len(results)} documents")
-        return results
+        results_keys = [self._results_key(query, k, threshold, nprobe) for query in queries]
+        results = [self._results_cache.get(key) for key in results_keys]
+        pending = [i for i, docs in enumerate(results) if docs is None]
+        
+        if pending:
+            # One embedding call and one index search for every uncached query
+            query_embeddings = self._query_embeddings([queries[i] for i in pending])
+            searched = self.vector_store.search_batch(query_embeddings, k=k, threshold=threshold, nprobe=nprobe)
+            for i, docs in zip(pending, searched):
+                self._results_cache.put(results_keys[i], docs)
+                results[i] = docs
+        
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Retrieved %d documents", sum(len(docs) for docs in results))
+        return [[dict(doc) for doc in docs] for docs in results]
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the query embedding and retrieval result caches"""
+        return {
+            "query_embeddings": self._embedding_cache.stats(),
+            "retrieval_results": self._results_cache.stats()
+        }
+    
+    def clear_cache(self) -> None:
+        """Drop cached query embeddings and retrieval results"""
+        self._embedding_cache.clear()
+        self._results_cache.clear()
+    
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        """Case- and whitespace-insensitive form of a query"""
+        return query.strip().lower()
+    
+    @classmethod
+    def _query_hash(cls, query: str) -> str:
+        """Content hash of the normalized query, used as the cache key"""
+        return hashlib.sha256(cls._normalize_query(query).encode("utf-8")).hexdigest()
+    
+    def _results_key(self, query: str, k: int, threshold: float, nprobe: Optional[int]) -> tuple:
+        """Retrieval cache key; the store version changes whenever documents are indexed or nprobe is reset"""
+        return (self._query_hash(query), k, round(threshold, 3), nprobe, getattr(self.vector_store, "version", 0))
+    
+    def _query_embeddings(self, queries: List[str]) -> np.ndarray:
+        """Embeddings of the normalized queries, embedding cache misses in one call"""
+        keys = [self._query_hash(query) for query in queries]
+        embeddings = [self._embedding_cache.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        
+        if missing:
+            new_embeddings = np.asarray(
+                self.embedder.embed_texts([self._normalize_query(queries[i]) for i in missing]),
+                dtype=np.float32
+            )
+            if len(new_embeddings) != len(missing):
+                raise ValueError("Queries cannot be empty")
+            for i, embedding in zip(missing, new_embeddings):
+                self._embedding_cache.put(keys[i], embedding)
+                embeddings[i] = embedding
+        
+        return np.vstack(embeddings)
 
 
 class RAGGenerator:
@@ -73,82 +299,90 @@ class RAGGenerator:
         self.ai_service = ai_service
     
     def generate_answer(self, query: str, context_docs: List[Dict[str, Any]], 
-                       max_context_length: int = 4000) -> Dict[str, Any]:
+                       max_context_tokens: int = 1000) -> Dict[str, Any]:
         """
         Generate answer using retrieved documents as context
         
         Args:
             query: User question
             context_docs: Retrieved documents
-            max_context_length: Maximum context length for AI model
+            max_context_tokens: Maximum context size for AI model, in tokens
             
         Returns:
             Generated answer with metadata
         """
+        return _run_sync(self.agenerate_answer(query, context_docs, max_context_tokens))
+    
+    async def agenerate_answer(self, query: str, context_docs: List[Dict[str, Any]], 
+                               max_context_tokens: int = 1000) -> Dict[str, Any]:
+        """Awaitable generate_answer, so several answers can share one event loop"""
         # Build context from retrieved documents
         context_parts = []
-        total_length = 0
-        used_docs = []
+        remaining_tokens = max_context_tokens
+        sources = []
+        has_text = False
         
         for doc in context_docs:
-            doc_text = f"Source: {doc.get('source', 'Unknown')}\nContent: {doc.get('text', '')}\n"
+            raw_source = doc.get('source', 'Unknown')
+            source = str(raw_source)
+            text = str(doc.get('text', ''))
+            
+            # Documents far longer than the remaining budget are rejected without tokenizing
+            if len(source) + len(text) > CHARS_PER_TOKEN * remaining_tokens:
+                break
             
-            if total_length + len(doc_text) > max_context_length:
+            # Count from the raw fields so a document that won't fit is never formatted
+            doc_tokens = CONTEXT_ENTRY_OVERHEAD_TOKENS + _count_tokens(source) + _count_tokens(text)
+            if doc_tokens > remaining_tokens:
                 break
             
-            context_parts.append(doc_text)
-            used_docs.append(doc)
-            total_length += len(doc_text)
+            context_parts.append(f"Source: {source}\nContent: {text}\n")
+            sources.append(raw_source)
+            has_text = has_text or bool(doc.get('text'))
+            remaining_tokens -= doc_tokens
+        
+        # Nothing to ground an answer on, so skip the AI service round-trip
+        if not has_text:
+            return {
+                "answer": NO_CONTEXT_ANSWER,
+                "sources": [],
+                "confidence": 0.0,
+                "context_used": 0,
+                "model_used": "none",
+                "fusion_details": {}
+            }
         
         # Combine context
-        context = "\n---\n".join(context_parts)
+        context = _CONTEXT_PREFIX + "\n---\n".join(context_parts)
         
         # Create prompt for AI model
-        prompt = self._create_prompt(query, context)
+        prompt = self._create_prompt(query)
         
         # Generate answer using AI service
         logger.info("Generating answer with AI service")
-        import asyncio
-        response = asyncio.run(self.ai_service.fusion_generate(prompt, context))
+        response = await self.ai_service.fusion_generate(prompt, context)
         
         # Return answer with metadata
         return {
             "answer": response.final_response,
-            "sources": [doc.get('source', 'Unknown') for doc in used_docs],
+            "sources": sources,
             "confidence": response.confidence_score,
-            "context_used": len(used_docs),
+            "context_used": len(sources),
             "model_used": response.fusion_strategy,
             "fusion_details": response.processing_details
         }
     
-    def _create_prompt(self, query: str, context: str) -> str:
+    def _create_prompt(self, query: str) -> str:
         """
-        Create prompt for AI model
+        Create prompt for AI model; the context is passed to the AI service separately
         
         Args:
             query: User question
-            context: Retrieved document context
             
         Returns:
             Formatted prompt
         """
-        prompt = f"""You are a helpful medical AI assistant. Use the provided context to answer the user's question accurately and comprehensively.
-
-Context from medical documents:
-{context}
-
-User Question: {query}
-
-Instructions:
-1. Answer based primarily on the provided context
-2. If the context doesn't contain relevant information, say so clearly
-3. Provide specific, actionable medical information when possible
-4. Include disclaimers about consulting healthcare professionals for serious concerns
-5. Be concise but thorough
-
-Answer:"""
-        
-        return prompt
+        return _QUESTION_PROMPT.format(query=query)
 
 
 class HealthAIRAG:
@@ -163,36 +397,49 @@ class HealthAIRAG:
         """
         self.vectorstore_path = vectorstore_path
         
-        # Initialize components
+        # The embedder, retriever and AI service are created on first use, so
+        # indexing never starts the AI service and stats never load a model
         logger.info("Initializing HealthAI RAG system...")
         
         try:
-            # Initialize embedding system
-            self.embedder = HealthAIEmbedding()
-            logger.info("✅ Embedding system initialized")
-            
             # Initialize vector store
-            self.vector_store = HealthAIVectorStore(vectorstore_path)
+            self.vector_store = HealthAIVectorStore(vectorstore_path, index_type="ivfpq")
             logger.info("✅ Vector store initialized")
             
-            # Initialize retriever
-            self.retriever = RAGRetriever(self.vector_store, self.embedder)
-            logger.info("✅ Retriever initialized")
-            
-            # Initialize AI service for generation
-            self.ai_service = FusionAIService()
-            logger.info("✅ AI service initialized")
-            
-            # Initialize generator
-            self.generator = RAGGenerator(self.ai_service)
-            logger.info("✅ Generator initialized")
-            
             logger.info("🎉 HealthAI RAG system ready!")
             
         except Exception as e:
             logger.error(f"Failed to initialize RAG system: {e}")
             raise
     
+    @functools.cached_property
+    def embedder(self) -> HealthAIEmbedding:
+        """Embedding system, loaded on first use"""
+        embedder = HealthAIEmbedding()
+        logger.info("✅ Embedding system initialized")
+        return embedder
+    
+    @functools.cached_property
+    def retriever(self) -> RAGRetriever:
+        """Retriever over the vector store, created on first use"""
+        retriever = RAGRetriever(self.vector_store, self.embedder)
+        logger.info("✅ Retriever initialized")
+        return retriever
+    
+    @functools.cached_property
+    def ai_service(self) -> FusionAIService:
+        """AI service for generation, started on first use"""
+        ai_service = FusionAIService()
+        logger.info("✅ AI service initialized")
+        return ai_service
+    
+    @functools.cached_property
+    def generator(self) -> RAGGenerator:
+        """Answer generator, created on first use"""
+        generator = RAGGenerator(self.ai_service)
+        logger.info("✅ Generator initialized")
+        return generator
+    
     def index_documents(self, pdf_directory: str) -> Dict[str, Any]:
         """
         Index all PDF documents from a directory
@@ -206,6 +453,9 @@ class HealthAIRAG:
         logger.info(f"Indexing documents from {pdf_directory}")
         
         try:
+            # Imported here so query-only processes never load the PDF stack
+            from src.ingestion.pdf_parser import PDFParser
+            
             # Initialize PDF parser
             parser = PDFParser(chunk_size=1000, chunk_overlap=200)
             
@@ -250,59 +500,131 @@ class HealthAIRAG:
         Returns:
             Answer with sources and metadata
         """
-        logger.info(f"Processing query: '{question[:50]}...'")
+        return _run_sync(self.aquery(question, k, threshold))
+    
+    async def aquery(self, question: str, k: int = 5, threshold: float = 0.1) -> Dict[str, Any]:
+        """Awaitable query, for callers that already run an event loop"""
+        logger.info("Processing query: '%.50s...'", question)
         
         try:
             # Check if vector store has documents
             stats = self.vector_store.get_stats()
             if stats["total_documents"] == 0:
-                return {
-                    "answer": "I don't have any indexed documents to search. Please index some medical documents first.",
-                    "sources": [],
-                    "confidence": 0.0,
-                    "status": "no_documents"
-                }
+                return self._status_response(NO_DOCUMENTS_ANSWER, "no_documents")
             
-            # Retrieve relevant documents
-            retrieved_docs = self.retriever.retrieve_documents(question, k=k, threshold=threshold)
+            # Retrieve relevant documents; embedding and search block, so run them off the loop
+            loop = asyncio.get_running_loop()
+            retrieved_docs = await loop.run_in_executor(
+                None, functools.partial(self.retriever.retrieve_documents, question, k=k, threshold=threshold)
+            )
             
             if not retrieved_docs:
-                return {
-                    "answer": "I couldn't find any relevant information in the indexed documents for your question.",
-                    "sources": [],
-                    "confidence": 0.0,
-                    "status": "no_results"
-                }
+                return self._status_response(NO_RESULTS_ANSWER, "no_results")
             
             # Generate answer using retrieved context
-            result = self.generator.generate_answer(question, retrieved_docs)
+            result = await self.generator.agenerate_answer(question, retrieved_docs)
             result["status"] = "success"
             result["retrieved_docs"] = len(retrieved_docs)
             
-            logger.info(f"Successfully answered query using {len(retrieved_docs)} documents")
+            logger.info("Successfully answered query using %d documents", len(retrieved_docs))
             
             return result
             
         except Exception as e:
             logger.error(f"Failed to process query: {e}")
-            return {
-                "answer": f"I encountered an error while processing your question: {str(e)}",
-                "sources": [],
-                "confidence": 0.0,
-                "status": "error"
-            }
+            return self._error_response(e)
+    
+    def query_batch(self, questions: List[str], k: int = 5, threshold: float = 0.1) -> List[Dict[str, Any]]:
+        """
+        Query the RAG system with several questions at once
+        
+        All questions are embedded and searched together, then their answers
+        are generated concurrently.
+        
+        Args:
+            questions: User questions
+            k: Number of documents to retrieve per question
+            threshold: Similarity threshold for retrieval
+            
+        Returns:
+            Answers with sources and metadata, one per question
+        """
+        return _run_sync(self.aquery_batch(questions, k, threshold))
+    
+    async def aquery_batch(self, questions: List[str], k: int = 5, threshold: float = 0.1) -> List[Dict[str, Any]]:
+        """Awaitable query_batch, for callers that already run an event loop"""
+        logger.info("Processing %d queries", len(questions))
+        
+        try:
+            stats = self.vector_store.get_stats()
+            if stats["total_documents"] == 0:
+                return [self._status_response(NO_DOCUMENTS_ANSWER, "no_documents") for _ in questions]
+            
+            loop = asyncio.get_running_loop()
+            retrieved = await loop.run_in_executor(
+                None, functools.partial(self.retriever.retrieve_documents_batch, questions, k=k, threshold=threshold)
+            )
+            return await self._answer_batch(questions, retrieved)
+            
+        except Exception as e:
+            logger.error(f"Failed to process query batch: {e}")
+            return [self._error_response(e) for _ in questions]
+    
+    async def _answer_batch(self, questions: List[str], retrieved: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Generate the answers of a retrieved batch concurrently"""
+        async def answer(question: str, retrieved_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+            if not retrieved_docs:
+                return self._status_response(NO_RESULTS_ANSWER, "no_results")
+            
+            result = await self.generator.agenerate_answer(question, retrieved_docs)
+            result["status"] = "success"
+            result["retrieved_docs"] = len(retrieved_docs)
+            return result
+        
+        results = await asyncio.gather(
+            *(answer(question, docs) for question, docs in zip(questions, retrieved)),
+            return_exceptions=True
+        )
+        
+        answers = []
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Failed to process query: {result}")
+                result = self._error_response(result)
+            answers.append(result)
+        return answers
+    
+    @staticmethod
+    def _status_response(answer: str, status: str) -> Dict[str, Any]:
+        """Answer for a query that did not reach generation"""
+        return {
+            "answer": answer,
+            "sources": [],
+            "confidence": 0.0,
+            "status": status
+        }
+    
+    @staticmethod
+    def _error_response(error: Exception) -> Dict[str, Any]:
+        """Answer for a query that failed"""
+        return HealthAIRAG._status_response(
+            f"I encountered an error while processing your question: {str(error)}", "error"
+        )
     
     def get_system_stats(self) -> Dict[str, Any]:
         """Get comprehensive system statistics"""
         try:
             vector_stats = self.vector_store.get_stats()
-            import asyncio
-            ai_stats = asyncio.run(self.ai_service.get_fusion_health_status())
+            ai_stats = _run_sync(self.ai_service.get_fusion_health_status())
+            
+            # Report the lazily created components without loading them
+            retriever = self.__dict__.get("retriever")
             
             return {
                 "vectorstore": vector_stats,
                 "ai_service": ai_stats,
-                "embedder_status": "active" if self.embedder else "inactive",
+                "retrieval_cache": retriever.get_cache_stats() if retriever else None,
+                "embedder_status": "active" if "embedder" in self.__dict__ else "inactive",
                 "system_status": "ready"
             }
         except Exception as e:
@@ -355,9 +677,9 @@ def test_rag_system():
         ]
         
         print("\nTesting RAG queries...")
-        for query in test_queries:
+        results = rag.query_batch(test_queries, k=2, threshold=0.0)
+        for query, result in zip(test_queries, results):
             print(f"\n📝 Query: {query}")
-            result = rag.query(query, k=2, threshold=0.0)
             
             print(f"   Answer: {result['answer'][:100]}...")
             print(f"   Sources: {result['sources']}")
@@ -370,15 +692,12 @@ def test_rag_system():
         print("\n✅ RAG system test completed successfully!")
         
         # Clean up
-        import shutil
-        from pathlib import Path
         test_dir = Path("test_rag_vectorstore")
         if test_dir.exists():
             shutil.rmtree(test_dir)
         
     except Exception as e:
         print(f"❌ RAG system test failed: {e}")
-        import traceback
         traceback.print_exc()
 
 
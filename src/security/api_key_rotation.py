@@ -3,22 +3,72 @@ Automated API Key Rotation for AI Services (Gemini/Groq)
 AWS Secrets Manager integration with Lambda rotation function
 """
 import boto3
-import json
+import hashlib
 import logging
+import orjson
 import os
-from typing import Dict, Any
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+# Secrets rotated concurrently by lambda_handler
+MAX_CONCURRENT_ROTATIONS = 8
+
+# Shared HTTPS session for key validation calls; keeps connections alive
+# across rotations in a warm Lambda container, one per concurrent rotation
+_HTTP_SESSION = requests.Session()
+_HTTP_SESSION.headers.update({'Content-Type': 'application/json'})
+_HTTP_SESSION.mount('https://', HTTPAdapter(pool_connections=MAX_CONCURRENT_ROTATIONS,
+                                            pool_maxsize=MAX_CONCURRENT_ROTATIONS))
+
+
+def _json_dumps(obj: Any) -> str:
+    """Serialize to a JSON string with orjson, for boto3 parameters and log lines"""
+    return orjson.dumps(obj).decode()
+
+
+@lru_cache(maxsize=None)
+def _aws_client(service_name: str):
+    """Create each boto3 client once per process and reuse it across invocations"""
+    return boto3.client(service_name)
+
+
+def _service_from_secret_name(secret_name: str) -> Optional[str]:
+    """Name of the service whose key a secret holds, or None if unknown"""
+    lowered = secret_name.lower()
+    return next((service for service in AIServiceKeyRotator._PROVIDERS if service in lowered), None)
+
+
 class AIServiceKeyRotator:
     """Automated rotation for AI service API keys"""
     
+    # Per-service display name, key generator and key validator
+    _PROVIDERS = {
+        'gemini': ('Gemini', '_generate_new_gemini_key', '_test_gemini_key'),
+        'groq': ('Groq', '_generate_new_groq_key', '_test_groq_key'),
+    }
+    
+    # Model listing endpoints used to validate freshly generated keys
+    _GEMINI_URL = 'https://generativelanguage.googleapis.com/v1/models'
+    _GROQ_URL = 'https://api.groq.com/openai/v1/models'
+    
+    # CloudWatch's limit on MetricData entries per put_metric_data call
+    MAX_METRICS_PER_PUT = 1000
+    
     def __init__(self):
-        self.secrets_client = boto3.client('secretsmanager')
-        self.sns_client = boto3.client('sns')
-        self.cloudwatch = boto3.client('cloudwatch')
+        self.secrets_client = _aws_client('secretsmanager')
+        self.sns_client = _aws_client('sns')
+        self.cloudwatch = _aws_client('cloudwatch')
+        # Created up front: rotations run on worker threads, and building clients
+        # concurrently from the default boto3 session isn't thread-safe
+        self.events_client = _aws_client('events')
         
         # Configuration
         self.rotation_schedule = {
@@ -28,30 +78,88 @@ class AIServiceKeyRotator:
         }
         
         self.notification_topic = 'arn:aws:sns:us-east-1:123456789012:healthai-key-rotation'
+        
+        # Inside a with block, rotation metrics are buffered until flush_metrics();
+        # rotations may run on several threads
+        self._metric_buffer: List[Dict[str, Any]] = []
+        self._metric_lock = threading.Lock()
+        self._batch_depth = 0
+    
+    def __enter__(self) -> 'AIServiceKeyRotator':
+        """Batch rotation metrics until the block exits"""
+        with self._metric_lock:
+            self._batch_depth += 1
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        with self._metric_lock:
+            self._batch_depth -= 1
+        self.flush_metrics()
+    
+    def flush_metrics(self) -> None:
+        """Publish buffered rotation metrics, up to MAX_METRICS_PER_PUT per CloudWatch call"""
+        
+        with self._metric_lock:
+            metric_data, self._metric_buffer = self._metric_buffer, []
+        
+        for start in range(0, len(metric_data), self.MAX_METRICS_PER_PUT):
+            try:
+                self.cloudwatch.put_metric_data(
+                    Namespace='HealthAI/Security',
+                    MetricData=metric_data[start:start + self.MAX_METRICS_PER_PUT]
+                )
+            except Exception as e:
+                logger.error(f"Failed to send rotation metrics: {e}")
+    
+    def rotate_secret(self, secret_name: str) -> Dict[str, Any]:
+        """Rotate a secret with the rotation for the service named in it"""
+        
+        service = _service_from_secret_name(secret_name)
+        if service is None:
+            return {
+                'status': 'skipped',
+                'secret_name': secret_name,
+                'reason': 'Unknown service type'
+            }
+        return self.rotate_key(service, secret_name)
     
     def rotate_gemini_key(self, secret_name: str) -> Dict[str, Any]:
         """Rotate Google Gemini API key"""
+        return self.rotate_key('gemini', secret_name)
+    
+    def rotate_groq_key(self, secret_name: str) -> Dict[str, Any]:
+        """Rotate Groq API key"""
+        return self.rotate_key('groq', secret_name)
+    
+    def rotate_key(self, service: str, secret_name: str) -> Dict[str, Any]:
+        """Rotate the API key of a service listed in _PROVIDERS"""
+        
+        label, generator_name, tester_name = self._PROVIDERS[service]
+        
+        # One clock reading stamps the secret, schedule, audit event and result
+        now = datetime.utcnow()
+        now_iso = now.isoformat()
         
         try:
             # Get current secret
             current_secret = self.secrets_client.get_secret_value(SecretId=secret_name)
-            current_key_data = json.loads(current_secret['SecretString'])
+            current_key_data = orjson.loads(current_secret['SecretString'])
             
-            # Generate new API key (this would call Google's API key management)
-            new_key = self._generate_new_gemini_key()
+            # Generate new API key (this would call the provider's API key management)
+            new_key = getattr(self, generator_name)()
             
             if not new_key:
-                raise Exception("Failed to generate new Gemini API key")
+                raise Exception(f"Failed to generate new {label} API key")
             
             # Test new key before rotation
-            if not self._test_gemini_key(new_key):
-                raise Exception("New Gemini API key validation failed")
+            if not getattr(self, tester_name)(new_key):
+                raise Exception(f"New {label} API key validation failed")
             
             # Prepare new secret version
             new_secret_data = {
                 **current_key_data,
                 'api_key': new_key,
-                'rotation_date': datetime.utcnow().isoformat(),
+                'rotation_date': now_iso,
                 'previous_key': current_key_data.get('api_key'),  # Keep for rollback
                 'key_status': 'active'
             }
@@ -59,104 +167,42 @@ class AIServiceKeyRotator:
             # Update secret in AWS Secrets Manager
             response = self.secrets_client.update_secret(
                 SecretId=secret_name,
-                SecretString=json.dumps(new_secret_data)
+                SecretString=_json_dumps(new_secret_data)
             )
             
             # Schedule old key deactivation (grace period)
             self._schedule_key_deactivation(
-                service='gemini',
+                service=service,
                 old_key=current_key_data.get('api_key'),
-                delay_hours=24  # 24-hour grace period
+                delay_hours=24,  # 24-hour grace period
+                now=now
             )
             
             # Log successful rotation
-            self._log_rotation_event('GEMINI', secret_name, True)
+            self._log_rotation_event(service.upper(), secret_name, True, timestamp=now_iso)
             
             # Send notification
-            self._send_rotation_notification('GEMINI', secret_name, True)
-            
-            return {
-                'status': 'success',
-                'service': 'gemini',
-                'secret_name': secret_name,
-                'rotation_time': datetime.utcnow().isoformat(),
-                'version_id': response['VersionId']
-            }
-            
-        except Exception as e:
-            logger.error(f"Gemini key rotation failed: {str(e)}")
-            self._log_rotation_event('GEMINI', secret_name, False, str(e))
-            self._send_rotation_notification('GEMINI', secret_name, False, str(e))
-            
-            return {
-                'status': 'failed',
-                'service': 'gemini',
-                'secret_name': secret_name,
-                'error': str(e),
-                'rotation_time': datetime.utcnow().isoformat()
-            }
-    
-    def rotate_groq_key(self, secret_name: str) -> Dict[str, Any]:
-        """Rotate Groq API key"""
-        
-        try:
-            # Get current secret
-            current_secret = self.secrets_client.get_secret_value(SecretId=secret_name)
-            current_key_data = json.loads(current_secret['SecretString'])
-            
-            # Generate new API key (this would call Groq's API key management)
-            new_key = self._generate_new_groq_key()
-            
-            if not new_key:
-                raise Exception("Failed to generate new Groq API key")
-            
-            # Test new key
-            if not self._test_groq_key(new_key):
-                raise Exception("New Groq API key validation failed")
-            
-            # Update secret
-            new_secret_data = {
-                **current_key_data,
-                'api_key': new_key,
-                'rotation_date': datetime.utcnow().isoformat(),
-                'previous_key': current_key_data.get('api_key'),
-                'key_status': 'active'
-            }
-            
-            response = self.secrets_client.update_secret(
-                SecretId=secret_name,
-                SecretString=json.dumps(new_secret_data)
-            )
-            
-            # Schedule old key deactivation
-            self._schedule_key_deactivation(
-                service='groq',
-                old_key=current_key_data.get('api_key'),
-                delay_hours=24
-            )
-            
-            self._log_rotation_event('GROQ', secret_name, True)
-            self._send_rotation_notification('GROQ', secret_name, True)
+            self._send_rotation_notification(service.upper(), secret_name, True, timestamp=now_iso)
             
             return {
                 'status': 'success',
-                'service': 'groq',
+                'service': service,
                 'secret_name': secret_name,
-                'rotation_time': datetime.utcnow().isoformat(),
+                'rotation_time': now_iso,
                 'version_id': response['VersionId']
             }
             
         except Exception as e:
-            logger.error(f"Groq key rotation failed: {str(e)}")
-            self._log_rotation_event('GROQ', secret_name, False, str(e))
-            self._send_rotation_notification('GROQ', secret_name, False, str(e))
+            logger.error(f"{label} key rotation failed: {str(e)}")
+            self._log_rotation_event(service.upper(), secret_name, False, str(e), timestamp=now_iso)
+            self._send_rotation_notification(service.upper(), secret_name, False, str(e), timestamp=now_iso)
             
             return {
                 'status': 'failed',
-                'service': 'groq',
+                'service': service,
                 'secret_name': secret_name,
                 'error': str(e),
-                'rotation_time': datetime.utcnow().isoformat()
+                'rotation_time': now_iso
             }
     
     def _generate_new_gemini_key(self) -> str:
@@ -197,64 +243,39 @@ class AIServiceKeyRotator:
     
     def _test_gemini_key(self, api_key: str) -> bool:
         """Test if new Gemini API key is working"""
-        
-        try:
-            # Test with a simple API call
-            headers = {
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            # Make a minimal API call to verify key works
-            response = requests.get(
-                'https://generativelanguage.googleapis.com/v1/models',
-                headers=headers,
-                timeout=10
-            )
-            
-            return response.status_code == 200
-            
-        except Exception as e:
-            logger.error(f"Gemini key test failed: {e}")
-            return False
+        return self._test_key('Gemini', self._GEMINI_URL, api_key)
     
     def _test_groq_key(self, api_key: str) -> bool:
         """Test if new Groq API key is working"""
+        return self._test_key('Groq', self._GROQ_URL, api_key)
+    
+    def _test_key(self, label: str, url: str, api_key: str) -> bool:
+        """Verify an API key with a minimal authenticated GET on the shared session"""
         
         try:
-            # Test with a simple API call
-            headers = {
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.get(
-                'https://api.groq.com/openai/v1/models',
-                headers=headers,
-                timeout=10
-            )
-            
+            response = _HTTP_SESSION.get(url, headers={'Authorization': f'Bearer {api_key}'}, timeout=10)
             return response.status_code == 200
             
         except Exception as e:
-            logger.error(f"Groq key test failed: {e}")
+            logger.error(f"{label} key test failed: {e}")
             return False
     
-    def _schedule_key_deactivation(self, service: str, old_key: str, delay_hours: int):
+    def _schedule_key_deactivation(self, service: str, old_key: str, delay_hours: int,
+                                   now: Optional[datetime] = None):
         """Schedule deactivation of old API key after grace period"""
         
-        # Create CloudWatch event rule for delayed deactivation
-        events_client = boto3.client('events')
+        now = now or datetime.utcnow()
         
         # Schedule Lambda function to deactivate old key
-        rule_name = f"deactivate-{service}-key-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+        # The random suffix keeps concurrent rotations of one service from sharing a rule
+        rule_name = f"deactivate-{service}-key-{now.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
         
         # Calculate activation time
-        activation_time = datetime.utcnow() + timedelta(hours=delay_hours)
+        activation_time = now + timedelta(hours=delay_hours)
         
         try:
-            # Create scheduled event
-            events_client.put_rule(
+            # Create CloudWatch event rule for delayed deactivation
+            self.events_client.put_rule(
                 Name=rule_name,
                 ScheduleExpression=f"at({activation_time.strftime('%Y-%m-%dT%H:%M:%S')})",
                 Description=f"Deactivate old {service} API key after grace period",
@@ -262,12 +283,12 @@ class AIServiceKeyRotator:
             )
             
             # Add target to invoke deactivation function
-            events_client.put_targets(
+            self.events_client.put_targets(
                 Rule=rule_name,
                 Targets=[{
                     'Id': '1',
                     'Arn': f'arn:aws:lambda:us-east-1:123456789012:function:deactivate-{service}-key',
-                    'Input': json.dumps({
+                    'Input': _json_dumps({
                         'service': service,
                         'old_key_hash': self._hash_key(old_key),  # Hash for security
                         'deactivation_reason': 'rotation_grace_period_expired'
@@ -275,21 +296,21 @@ class AIServiceKeyRotator:
                 }]
             )
             
-            logger.info(f"Scheduled {service} key deactivation in {delay_hours} hours")
+            logger.info("Scheduled %s key deactivation in %d hours", service, delay_hours)
             
         except Exception as e:
             logger.error(f"Failed to schedule key deactivation: {e}")
     
     def _hash_key(self, key: str) -> str:
         """Hash API key for secure logging"""
-        import hashlib
-        return hashlib.sha256(key.encode()).hexdigest()[:16]
+        return hashlib.sha256(key.encode('utf-8', 'ignore')).hexdigest()[:16]
     
-    def _log_rotation_event(self, service: str, secret_name: str, success: bool, error: str = None):
-        """Log rotation event for audit purposes"""
+    def _log_rotation_event(self, service: str, secret_name: str, success: bool, error: str = None,
+                            timestamp: Optional[str] = None):
+        """Log rotation event for audit purposes (timestamp: ISO time, defaults to now)"""
         
         event_data = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': timestamp or datetime.utcnow().isoformat(),
             'event_type': 'API_KEY_ROTATION',
             'service': service,
             'secret_name': secret_name,
@@ -298,35 +319,35 @@ class AIServiceKeyRotator:
             'compliance_framework': 'SOC2_HIPAA'
         }
         
-        logger.info(f"API Key Rotation Event: {json.dumps(event_data)}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("API Key Rotation Event: %s", _json_dumps(event_data))
         
-        # Send to CloudWatch for monitoring
-        try:
-            self.cloudwatch.put_metric_data(
-                Namespace='HealthAI/Security',
-                MetricData=[
-                    {
-                        'MetricName': 'APIKeyRotationEvents',
-                        'Dimensions': [
-                            {'Name': 'Service', 'Value': service},
-                            {'Name': 'Success', 'Value': str(success)}
-                        ],
-                        'Value': 1,
-                        'Unit': 'Count'
-                    }
-                ]
-            )
-        except Exception as e:
-            logger.error(f"Failed to send rotation metrics: {e}")
+        # Queue for CloudWatch; inside a with block, published in one call on exit
+        with self._metric_lock:
+            batching = self._batch_depth > 0
+            self._metric_buffer.append({
+                'MetricName': 'APIKeyRotationEvents',
+                'Dimensions': [
+                    {'Name': 'Service', 'Value': service},
+                    {'Name': 'Success', 'Value': str(success)}
+                ],
+                'Value': 1,
+                'Unit': 'Count'
+            })
+        if not batching:
+            self.flush_metrics()
     
-    def _send_rotation_notification(self, service: str, secret_name: str, success: bool, error: str = None):
-        """Send rotation notification to security team"""
+    def _send_rotation_notification(self, service: str, secret_name: str, success: bool, error: str = None,
+                                    timestamp: Optional[str] = None):
+        """Send rotation notification to security team (timestamp: ISO time, defaults to now)"""
+        
+        timestamp = timestamp or datetime.utcnow().isoformat()
         
         if success:
-            message = f"✅ {service} API key rotation completed successfully\nSecret: {secret_name}\nTime: {datetime.utcnow().isoformat()}"
+            message = f"✅ {service} API key rotation completed successfully\nSecret: {secret_name}\nTime: {timestamp}"
             subject = f"HealthAI - {service} API Key Rotated Successfully"
         else:
-            message = f"❌ {service} API key rotation FAILED\nSecret: {secret_name}\nError: {error}\nTime: {datetime.utcnow().isoformat()}\n\nImmediate action required!"
+            message = f"❌ {service} API key rotation FAILED\nSecret: {secret_name}\nError: {error}\nTime: {timestamp}\n\nImmediate action required!"
             subject = f"URGENT - HealthAI {service} API Key Rotation Failed"
         
         try:
@@ -342,7 +363,6 @@ class AIServiceKeyRotator:
 def lambda_handler(event, context):
     """AWS Lambda handler for automated API key rotation"""
     
-    rotator = AIServiceKeyRotator()
     results = []
     
     try:
@@ -352,19 +372,12 @@ def lambda_handler(event, context):
             'prod/healthai/groq-api-key'
         ])
         
-        for secret_name in secrets_to_rotate:
-            if 'gemini' in secret_name.lower():
-                result = rotator.rotate_gemini_key(secret_name)
-            elif 'groq' in secret_name.lower():
-                result = rotator.rotate_groq_key(secret_name)
-            else:
-                result = {
-                    'status': 'skipped',
-                    'secret_name': secret_name,
-                    'reason': 'Unknown service type'
-                }
-            
-            results.append(result)
+        # Rotations are independent I/O, so run them side by side; results keep the input order.
+        # Leaving the rotator publishes every rotation's metric in one CloudWatch call.
+        with AIServiceKeyRotator() as rotator:
+            if secrets_to_rotate:
+                with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_ROTATIONS, len(secrets_to_rotate))) as executor:
+                    results = list(executor.map(rotator.rotate_secret, secrets_to_rotate))
         
         # Summary
         successful_rotations = sum(1 for r in results if r['status'] == 'success')
@@ -372,7 +385,7 @@ def lambda_handler(event, context):
         
         return {
             'statusCode': 200 if failed_rotations == 0 else 500,
-            'body': json.dumps({
+            'body': _json_dumps({
                 'message': f'Rotation completed: {successful_rotations} successful, {failed_rotations} failed',
                 'results': results,
                 'timestamp': datetime.utcnow().isoformat()
@@ -383,7 +396,7 @@ def lambda_handler(event, context):
         logger.error(f"Lambda rotation handler failed: {e}")
         return {
             'statusCode': 500,
-            'body': json.dumps({
+            'body': _json_dumps({
                 'error': 'Rotation process failed',
                 'details': str(e),
                 'timestamp': datetime.utcnow().isoformat()
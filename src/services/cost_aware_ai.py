@@ -1,52 +1,214 @@
 """
 Integration wrapper for AI services with cost tracking
 """
+import asyncio
+import bisect
+import functools
+import threading
 import time
 import logging
-from typing import Dict, Any, Optional
+from types import MappingProxyType
+from typing import Dict, Any, Awaitable, Callable, Mapping, Optional, Tuple
+from src.core.config import settings
 from src.monitoring.ai_cost_tracker import AIModelCostTracker
+from src.services.prompt_cache import PromptCache
 import uuid
 
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Texts at least this long have their token count extrapolated from a sample
+TOKEN_SAMPLING_MIN_CHARS = 8192
+# Evenly spaced windows making up the sample
+TOKEN_SAMPLE_WINDOWS = 8
+# Query length upper bounds for the "simple" and "medium" complexity levels
+QUERY_COMPLEXITY_BOUNDS = (100, 500)
+QUERY_COMPLEXITY_LEVELS = ("simple", "medium", "complex")
+
+# (query complexity, budget priority) -> recommended service and model
+_RECOMMENDATIONS: Mapping[Tuple[str, str], Dict[str, str]] = MappingProxyType({
+    (complexity, priority): recommendation
+    for complexity, row in {
+        "simple": {
+            "cost_priority": {"service": "groq", "model": "mixtral-8x7b-32768"},
+            "balanced": {"service": "gemini", "model": "1.5-flash"},
+            "performance_priority": {"service": "gemini", "model": "1.5-pro"}
+        },
+        "medium": {
+            "cost_priority": {"service": "groq", "model": "mixtral-8x7b-32768"},
+            "balanced": {"service": "groq", "model": "llama3-70b-8192"},
+            "performance_priority": {"service": "gemini", "model": "1.5-pro"}
+        },
+        "complex": {
+            "cost_priority": {"service": "groq", "model": "llama3-70b-8192"},
+            "balanced": {"service": "gemini", "model": "1.5-pro"},
+            "performance_priority": {"service": "gemini", "model": "1.5-pro"}
+        }
+    }.items()
+    for priority, recommendation in row.items()
+})
+_DEFAULT_RECOMMENDATION = {"service": "gemini", "model": "1.5-flash"}
+
+# Idle keep-alive connections the shared Groq HTTP client holds for parallel calls
+GROQ_MAX_KEEPALIVE_CONNECTIONS = 32
+
+
+@functools.lru_cache(maxsize=4)
+def _encoding(name: str):
+    """tiktoken encoding, loaded once per process; None when unavailable"""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning(f"Token estimates fall back to character counts: {e}")
+        return None
+
+
+@functools.lru_cache(maxsize=16)
+def _gemini_model(model: str):
+    """Gemini model instance, created once per model name"""
+    import google.generativeai as genai
+    
+    # Configure client (API key should be from secrets manager)
+    # genai.configure(api_key=get_secret("gemini-api-key"))
+    return genai.GenerativeModel(f'gemini-{model}')
+
+
+@functools.lru_cache(maxsize=1)
+def _groq_client():
+    """Groq client shared by every call, so requests reuse its pooled connections"""
+    import httpx
+    from groq import Groq
+    
+    # Initialize client (API key from secrets manager)
+    # client = Groq(api_key=get_secret("groq-api-key"))
+    return Groq(  # Uses GROQ_API_KEY env var
+        http_client=httpx.Client(limits=httpx.Limits(max_keepalive_connections=GROQ_MAX_KEEPALIVE_CONNECTIONS))
+    )
+
+class RequestCoalescer:
+    """
+    Single-flight coalescing of identical in-flight provider requests.
+    Concurrent callers with the same key await one provider call instead of each making their own.
+    The call runs as its own task, so cancelling any one caller (e.g. on a client disconnect)
+    doesn't cancel it for the others.
+    """
+    
+    def __init__(self):
+        # (event loop, key) -> shared call task; tasks can only be awaited on their own loop
+        self._in_flight: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Task] = {}
+    
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Result of call() and whether this caller made it, or joined an identical call in flight"""
+        flight_key = (asyncio.get_running_loop(), key)
+        task = self._in_flight.get(flight_key)
+        made_call = task is None
+        if made_call:
+            task = asyncio.ensure_future(call())
+            self._in_flight[flight_key] = task
+            task.add_done_callback(functools.partial(self._finish, flight_key))
+        return await asyncio.shield(task), made_call
+    
+    def _finish(self, flight_key: Tuple[asyncio.AbstractEventLoop, str], task: asyncio.Task) -> None:
+        """Forget a finished call so the next identical request makes a fresh one"""
+        if self._in_flight.get(flight_key) is task:
+            del self._in_flight[flight_key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved even if every caller was cancelled
+
+# Shared so concurrent requests from separate CostAwareAIService instances coalesce
+_shared_coalescer = RequestCoalescer()
+
+@functools.lru_cache(maxsize=1)
+def _query_embedder():
+    """Local sentence-transformer used to match paraphrased queries, loaded on first use; None if unavailable"""
+    try:
+        from src.embeddings.openai_embed import SentenceTransformerProvider
+        return SentenceTransformerProvider(settings.EMBEDDING_MODEL)
+    except Exception as e:
+        logger.warning(f"Semantic prompt cache disabled, no query embedder: {e}")
+        return None
+
+
+_query_embedder_lock = threading.Lock()
+
+
+def _embed_query(text: str):
+    """Embedding for the semantic prompt cache tier; None skips that tier"""
+    # lru_cache alone lets concurrent first calls each load the model
+    with _query_embedder_lock:
+        embedder = _query_embedder()
+    return embedder.embed_text(text) if embedder is not None else None
+
+# Responses shared by every CostAwareAIService that isn't given its own cache;
+# the chat helpers create a service per request
+_shared_prompt_cache = PromptCache(
+    embed_fn=_embed_query,
+    semantic_threshold=settings.PROMPT_CACHE_SEMANTIC_THRESHOLD,
+    ttl_seconds=settings.PROMPT_CACHE_TTL_SECONDS
+)
+
 class CostAwareAIService:
     """Wrapper for AI services with integrated cost tracking"""
     
-    def __init__(self):
+    def __init__(self, prompt_cache: Optional[PromptCache] = None):
         self.cost_tracker = AIModelCostTracker()
+        self.prompt_cache = prompt_cache if prompt_cache is not None else _shared_prompt_cache
+        self.coalescer = _shared_coalescer
         
-    def call_gemini_with_tracking(self, 
+    async def call_gemini_with_tracking(self, 
                                  prompt: str,
                                  model: str = "1.5-pro",
                                  user_id: str = "anonymous",
                                  query_type: str = "medical") -> Dict[str, Any]:
-        """Call Gemini API with cost tracking"""
+        """Call Gemini API with cost tracking; the blocking SDK call runs in a worker thread"""
         
         session_id = str(uuid.uuid4())
         start_time = time.time()
         
+        cached = await self._cached_response("gemini", model, model, prompt, user_id, query_type, session_id, start_time)
+        if cached is not None:
+            return cached
+        
         try:
-            # Import Gemini client
-            import google.generativeai as genai
-            
-            # Configure client (API key should be from secrets manager)
-            # genai.configure(api_key=get_secret("gemini-api-key"))
+            model_instance = _gemini_model(model)
             
-            # Create model instance
-            model_instance = genai.GenerativeModel(f'gemini-{model}')
-            
-            # Call API
-            response = model_instance.generate_content(prompt)
+            # Call API, sharing the call with identical requests already in flight
+            response, made_call = await self.coalescer.run(
+                PromptCache.make_key("gemini", model, prompt),
+                lambda: asyncio.to_thread(model_instance.generate_content, prompt)
+            )
+            if not made_call:
+                return await self._cache_hit_response(
+                    "gemini", tracked_model=model,
+                    cached={'response': response.text, 'model_used': f"gemini-{model}"},
+                    user_id=user_id, query_type=query_type, session_id=session_id, start_time=start_time
+                )
             
             # Calculate response time
             response_time_ms = int((time.time() - start_time) * 1000)
             
-            # Estimate token usage (Gemini doesn't always provide exact counts)
-            input_tokens = self._estimate_tokens(prompt)
-            output_tokens = self._estimate_tokens(response.text) if response.text else 0
+            # Use the usage Gemini reports; count or estimate only what it leaves out
+            usage = getattr(response, 'usage_metadata', None)
+            input_tokens = getattr(usage, 'prompt_token_count', 0)
+            if not input_tokens:
+                try:
+                    input_tokens = (await asyncio.to_thread(model_instance.count_tokens, prompt)).total_tokens
+                except Exception:
+                    input_tokens = self._estimate_tokens(prompt)
+            output_tokens = getattr(usage, 'candidates_token_count', 0)
+            if not output_tokens:
+                output_tokens = self._estimate_tokens(response.text) if response.text else 0
+            cached_tokens = getattr(usage, 'cached_content_token_count', 0) or 0
             
             # Track usage and cost
-            self.cost_tracker.track_ai_usage(
+            await self._track_usage(
                 service="gemini",
                 model=model,
                 tokens_input=input_tokens,
@@ -55,9 +217,13 @@ class CostAwareAIService:
                 user_id=user_id,
                 session_id=session_id,
                 response_time_ms=response_time_ms,
-                success=True
+                success=True,
+                tokens_cached=cached_tokens
             )
             
+            # The cache embeds the prompt for its semantic tier, so keep it off the event loop
+            await asyncio.to_thread(self.prompt_cache.put, "gemini", model, prompt, {'response': response.text, 'model_used': f"gemini-{model}"})
+            
             return {
                 'success': True,
                 'response': response.text,
@@ -71,7 +237,7 @@ class CostAwareAIService:
             # Track failed request
             response_time_ms = int((time.time() - start_time) * 1000)
             
-            self.cost_tracker.track_ai_usage(
+            await self._track_usage(
                 service="gemini",
                 model=model,
                 tokens_input=self._estimate_tokens(prompt),
@@ -93,29 +259,39 @@ class CostAwareAIService:
                 'response_time_ms': response_time_ms
             }
     
-    def call_groq_with_tracking(self,
+    async def call_groq_with_tracking(self,
                                prompt: str,
                                model: str = "mixtral-8x7b-32768",
                                user_id: str = "anonymous", 
                                query_type: str = "medical") -> Dict[str, Any]:
-        """Call Groq API with cost tracking"""
+        """Call Groq API with cost tracking; the blocking SDK call runs in a worker thread"""
         
         session_id = str(uuid.uuid4())
         start_time = time.time()
+        tracked_model = model.replace("mixtral-8x7b-32768", "mixtral-8x7b").replace("llama3-70b-8192", "llama3-70b")
+        
+        cached = await self._cached_response("groq", model, tracked_model, prompt, user_id, query_type, session_id, start_time)
+        if cached is not None:
+            return cached
         
         try:
-            # Import Groq client
-            from groq import Groq
-            
-            # Initialize client (API key from secrets manager)
-            # client = Groq(api_key=get_secret("groq-api-key"))
-            client = Groq()  # Uses GROQ_API_KEY env var
+            client = _groq_client()
             
-            # Call API
-            response = client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model=model,
+            # Call API, sharing the call with identical requests already in flight
+            response, made_call = await self.coalescer.run(
+                PromptCache.make_key("groq", model, prompt),
+                lambda: asyncio.to_thread(
+                    client.chat.completions.create,
+                    messages=[{"role": "user", "content": prompt}],
+                    model=model,
+                )
             )
+            if not made_call:
+                return await self._cache_hit_response(
+                    "groq", tracked_model=tracked_model,
+                    cached={'response': response.choices[0].message.content, 'model_used': model},
+                    user_id=user_id, query_type=query_type, session_id=session_id, start_time=start_time
+                )
             
             # Calculate response time
             response_time_ms = int((time.time() - start_time) * 1000)
@@ -124,20 +300,24 @@ class CostAwareAIService:
             usage = response.usage
             input_tokens = usage.prompt_tokens if usage else self._estimate_tokens(prompt)
             output_tokens = usage.completion_tokens if usage else self._estimate_tokens(response.choices[0].message.content)
+            cached_tokens = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', 0) or 0
             
             # Track usage and cost
-            self.cost_tracker.track_ai_usage(
+            await self._track_usage(
                 service="groq",
-                model=model.replace("mixtral-8x7b-32768", "mixtral-8x7b").replace("llama3-70b-8192", "llama3-70b"),
+                model=tracked_model,
                 tokens_input=input_tokens,
                 tokens_output=output_tokens,
                 query_type=query_type,
                 user_id=user_id,
                 session_id=session_id,
                 response_time_ms=response_time_ms,
-                success=True
+                success=True,
+                tokens_cached=cached_tokens
             )
             
+            await asyncio.to_thread(self.prompt_cache.put, "groq", model, prompt, {'response': response.choices[0].message.content, 'model_used': model})
+            
             return {
                 'success': True,
                 'response': response.choices[0].message.content,
@@ -151,9 +331,9 @@ class CostAwareAIService:
             # Track failed request
             response_time_ms = int((time.time() - start_time) * 1000)
             
-            self.cost_tracker.track_ai_usage(
+            await self._track_usage(
                 service="groq",
-                model=model.replace("mixtral-8x7b-32768", "mixtral-8x7b").replace("llama3-70b-8192", "llama3-70b"),
+                model=tracked_model,
                 tokens_input=self._estimate_tokens(prompt),
                 tokens_output=0,
                 query_type=query_type,
@@ -173,56 +353,96 @@ class CostAwareAIService:
                 'response_time_ms': response_time_ms
             }
     
+    async def _cached_response(self, service: str, model: str, tracked_model: str, prompt: str, user_id: str,
+                         query_type: str, session_id: str, start_time: float) -> Optional[Dict[str, Any]]:
+        """Serve a request from the prompt cache, tracking it as a zero-token cache hit"""
+        
+        # A semantic lookup embeds the prompt (and loads the embedder on first use)
+        cached = await asyncio.to_thread(self.prompt_cache.get, service, model, prompt)
+        if cached is None:
+            return None
+        
+        return await self._cache_hit_response(service, tracked_model, cached, user_id, query_type, session_id, start_time)
+    
+    async def _cache_hit_response(self, service: str, tracked_model: str, cached: Dict[str, str], user_id: str,
+                            query_type: str, session_id: str, start_time: float) -> Dict[str, Any]:
+        """Return a response served without a provider call of its own, tracking it as a zero-token cache hit"""
+        
+        response_time_ms = int((time.time() - start_time) * 1000)
+        await self._track_usage(
+            service=service,
+            model=tracked_model,
+            tokens_input=0,
+            tokens_output=0,
+            query_type=query_type,
+            user_id=user_id,
+            session_id=session_id,
+            response_time_ms=response_time_ms,
+            success=True,
+            cache_hit=True
+        )
+        
+        return {
+            'success': True,
+            'response': cached['response'],
+            'session_id': session_id,
+            'tokens_used': 0,
+            'response_time_ms': response_time_ms,
+            'model_used': cached['model_used'],
+            'cache_hit': True
+        }
+    
+    async def _track_usage(self, **usage) -> None:
+        """Record usage without blocking the event loop on DynamoDB/CloudWatch writes"""
+        await asyncio.to_thread(self.cost_tracker.track_ai_usage, **usage)
+    
     def _estimate_tokens(self, text: str) -> int:
-        """Estimate token count for text (rough approximation)"""
-        # Rough estimation: ~4 characters per token for English text
-        return max(1, len(text) // 4)
+        """Estimate token count for text with the cl100k_base tokenizer"""
+        encoding = _encoding("cl100k_base")
+        if encoding is None:
+            # Rough estimation: ~4 characters per token for English text
+            return max(1, len(text) // 4)
+        
+        if len(text) < TOKEN_SAMPLING_MIN_CHARS:
+            return max(1, len(encoding.encode(text, disallowed_special=())))
+        
+        # Long inputs: tokenize about sqrt(N) * 16 characters in evenly spaced windows
+        # and extrapolate the tokens-per-character ratio to the whole text
+        window = int(len(text) ** 0.5) * 16 // TOKEN_SAMPLE_WINDOWS
+        stride = len(text) // TOKEN_SAMPLE_WINDOWS
+        sample_tokens = sum(
+            len(encoding.encode(text[start:start + window], disallowed_special=()))
+            for start in range(0, stride * TOKEN_SAMPLE_WINDOWS, stride)
+        )
+        return max(1, int(len(text) * sample_tokens / (window * TOKEN_SAMPLE_WINDOWS)))
     
     def get_cost_optimized_model(self, query_complexity: str, budget_priority: str = "balanced") -> Dict[str, str]:
         """Recommend cost-optimized model based on query complexity and budget"""
         
-        recommendations = {
-            "simple": {
-                "cost_priority": {"service": "groq", "model": "mixtral-8x7b-32768"},
-                "balanced": {"service": "gemini", "model": "1.5-flash"},
-                "performance_priority": {"service": "gemini", "model": "1.5-pro"}
-            },
-            "medium": {
-                "cost_priority": {"service": "groq", "model": "mixtral-8x7b-32768"},
-                "balanced": {"service": "groq", "model": "llama3-70b-8192"},
-                "performance_priority": {"service": "gemini", "model": "1.5-pro"}
-            },
-            "complex": {
-                "cost_priority": {"service": "groq", "model": "llama3-70b-8192"},
-                "balanced": {"service": "gemini", "model": "1.5-pro"},
-                "performance_priority": {"service": "gemini", "model": "1.5-pro"}
-            }
-        }
-        
-        return recommendations.get(query_complexity, {}).get(budget_priority, {"service": "gemini", "model": "1.5-flash"})
+        return dict(_RECOMMENDATIONS.get((query_complexity, budget_priority), _DEFAULT_RECOMMENDATION))
 
 # Integration with existing chat endpoint
-def enhanced_chat_with_cost_tracking(query: str, user_id: str = "anonymous") -> Dict[str, Any]:
+async def enhanced_chat_with_cost_tracking(query: str, user_id: str = "anonymous") -> Dict[str, Any]:
     """Enhanced chat function with cost tracking and optimization"""
     
     ai_service = CostAwareAIService()
     
     # Analyze query complexity (simple implementation)
-    query_complexity = "simple" if len(query) < 100 else "medium" if len(query) < 500 else "complex"
+    query_complexity = QUERY_COMPLEXITY_LEVELS[bisect.bisect_right(QUERY_COMPLEXITY_BOUNDS, len(query))]
     
     # Get cost-optimized model recommendation
     model_recommendation = ai_service.get_cost_optimized_model(query_complexity, "balanced")
     
     # Call appropriate service
     if model_recommendation["service"] == "gemini":
-        result = ai_service.call_gemini_with_tracking(
+        result = await ai_service.call_gemini_with_tracking(
             prompt=query,
             model=model_recommendation["model"],
             user_id=user_id,
             query_type="medical"
         )
     else:  # groq
-        result = ai_service.call_groq_with_tracking(
+        result = await ai_service.call_groq_with_tracking(
             prompt=query,
             model=model_recommendation["model"],
             user_id=user_id,
@@ -245,7 +465,7 @@ async def chat_endpoint_with_cost_tracking(request_data: dict, user_id: str):
     query = request_data.get('question', '')
     
     # Enhanced chat with cost tracking
-    result = enhanced_chat_with_cost_tracking(query, user_id)
+    result = await enhanced_chat_with_cost_tracking(query, user_id)
     
     if result['success']:
         return {
@@ -1,25 +1,46 @@
-from typing import Dict, List, Optional, Tuple
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 import asyncio
+import hashlib
+import operator
+import random
 import statistics
-from dataclasses import dataclass
+import threading
+import time
+from datetime import timedelta
+from enum import IntEnum
+from dataclasses import dataclass, replace
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+import groq
 from groq import Groq
 from src.core.config import settings
+from src.services.prompt_cache import PromptCache
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Marks the end of a provider's chunk stream
+_STREAM_END = object()
 
-@dataclass
+
+class Provider(IntEnum):
+    """Model provider, resolved when a response is created; indexes per-provider tables"""
+    GEMINI = 0
+    GROQ = 1
+    OTHER = 2
+
+
+@dataclass(slots=True, frozen=True)
 class ModelResponse:
     content: str
     confidence: float
     model_name: str
     processing_time: float
     token_count: Optional[int] = None
+    provider: Provider = Provider.OTHER
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FusionResult:
     final_response: str
     confidence_score: float
@@ -33,10 +54,54 @@ class FusionAIService:
     Advanced Fusion AI service that combines multiple AI models for enhanced responses.
     Supports various fusion strategies: weighted average, majority vote, and confidence-based selection.
     """
+
+    # Shorter contexts fall below Gemini's minimum cacheable size (~1024 tokens)
+    CONTEXT_CACHE_MIN_CHARS = 4096
+    CONTEXT_CACHE_TTL = timedelta(minutes=30)
+    # Re-upload a context this long before its server-side expiry
+    CONTEXT_CACHE_EXPIRY_MARGIN_SECONDS = 60
+
+    # Attempts per provider call; only rate limits, timeouts and 5xx errors are retried
+    MAX_RETRIES = 3
+    RETRY_BASE_DELAY_SECONDS = 0.2
+    RETRY_MAX_DELAY_SECONDS = 4.0
+    TRANSIENT_ERRORS = (
+        groq.RateLimitError,
+        groq.APITimeoutError,
+        groq.APIConnectionError,
+        groq.InternalServerError,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+    )
+    # Consecutive failed calls that take a provider out of rotation, and for how long
+    CIRCUIT_FAILURE_THRESHOLD = 3
+    CIRCUIT_OPEN_SECONDS = 30
+    # Cached single-model answers at least this confident are reused instead of re-asking that model
+    PROVIDER_REUSE_MIN_CONFIDENCE = 0.8
     
-    def __init__(self):
+    def __init__(self, prompt_cache: Optional[PromptCache] = None):
         self.gemini_client = None
         self.groq_client = None
+        # Fused answers by prompt and context; pass a cache with an embedder to match paraphrases
+        self.prompt_cache = (
+            prompt_cache if prompt_cache is not None
+            else PromptCache(ttl_seconds=settings.PROMPT_CACHE_TTL_SECONDS)
+        )
+        # Caps concurrent provider calls so request bursts can't exhaust API quotas
+        self._semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_LLM or 10)
+        # Context hash -> (model bound to Gemini CachedContent, local expiry timestamp)
+        self._context_cache: Dict[str, Tuple[genai.GenerativeModel, float]] = {}
+        # Context hash -> when a first, uncached use stops counting towards reuse
+        self._context_seen: Dict[str, float] = {}
+        # Context hash -> lock held while that context uploads, so concurrent misses upload once
+        self._context_upload_locks: Dict[str, threading.Lock] = {}
+        self._context_cache_lock = threading.Lock()
+        # Per-provider circuit breaker state
+        self._breaker = {
+            provider: {"fails": 0, "open_until": 0.0} for provider in ("gemini", "groq")
+        }
         self._initialize_clients()
     
     def _initialize_clients(self):
@@ -54,14 +119,121 @@ class FusionAIService:
         except Exception as e:
             logger.error(f"Error initializing AI clients: {e}")
     
+    def _create_cached_context_model(self, context: str) -> genai.GenerativeModel:
+        """Upload a context to Gemini's context cache and bind a model to it"""
+        cached = genai.caching.CachedContent.create(
+            model=self.gemini_client.model_name,
+            contents=[context],
+            ttl=self.CONTEXT_CACHE_TTL
+        )
+        return genai.GenerativeModel.from_cached_content(cached)
+
+    def _upload_context(self, key: str, context: str) -> genai.GenerativeModel:
+        """Worker-thread body: cache a context unless a concurrent upload of it already did"""
+        with self._context_cache_lock:
+            upload_lock = self._context_upload_locks.setdefault(key, threading.Lock())
+        with upload_lock:
+            with self._context_cache_lock:
+                entry = self._context_cache.get(key)
+            if entry is not None and entry[1] > time.time():
+                return entry[0]
+            try:
+                model = self._create_cached_context_model(context)
+                expires_at = time.time() + self.CONTEXT_CACHE_TTL.total_seconds() - self.CONTEXT_CACHE_EXPIRY_MARGIN_SECONDS
+                with self._context_cache_lock:
+                    self._context_cache[key] = (model, expires_at)
+                return model
+            finally:
+                with self._context_cache_lock:
+                    self._context_upload_locks.pop(key, None)
+
+    async def _get_cached_context_model(self, context: str) -> Optional[genai.GenerativeModel]:
+        """
+        Model whose cached content is the given context, uploading it the second
+        time the context is used within the cache TTL. Returns None when the
+        context is too short to cache, seen for the first time, or caching fails.
+        """
+        if len(context) <= self.CONTEXT_CACHE_MIN_CHARS:
+            return None
+
+        key = hashlib.blake2b(context.encode("utf-8")).hexdigest()[:16]
+        now = time.time()
+        with self._context_cache_lock:
+            # Server-side entries expire on their own; drop their local handles
+            for expired in [k for k, (_, expires_at) in self._context_cache.items() if expires_at <= now]:
+                del self._context_cache[expired]
+            for expired in [k for k, expires_at in self._context_seen.items() if expires_at <= now]:
+                del self._context_seen[expired]
+            entry = self._context_cache.get(key)
+            if entry is None and key not in self._context_seen:
+                # Creating and storing a cache costs more than sending a context
+                # used once, so only contexts that come back are cached
+                self._context_seen[key] = now + self.CONTEXT_CACHE_TTL.total_seconds()
+                return None
+        if entry is not None:
+            return entry[0]
+
+        try:
+            async with self._semaphore:
+                return await asyncio.to_thread(self._upload_context, key, context)
+        except Exception as e:
+            logger.warning(f"Gemini context caching failed, sending full context: {e}")
+            return None
+
+    def _check_circuit(self, provider: str) -> None:
+        """Raise instead of calling a provider whose circuit is open"""
+        remaining = self._breaker[provider]["open_until"] - time.monotonic()
+        if remaining > 0:
+            raise RuntimeError(f"{provider} circuit open for another {remaining:.0f}s")
+
+    async def _call_provider(self, provider: str, fn, *args, **kwargs):
+        """
+        Run a blocking provider call in a worker thread, retrying transient errors
+        with jittered exponential backoff and updating the provider's circuit breaker
+        """
+        breaker = self._breaker[provider]
+        for attempt in range(self.MAX_RETRIES):
+            try:
+                # The SDKs block, so run them in a thread to let the other provider proceed in parallel
+                async with self._semaphore:
+                    result = await asyncio.to_thread(fn, *args, **kwargs)
+                breaker["fails"] = 0
+                return result
+            except self.TRANSIENT_ERRORS as e:
+                if attempt + 1 < self.MAX_RETRIES:
+                    delay = min(self.RETRY_MAX_DELAY_SECONDS, self.RETRY_BASE_DELAY_SECONDS * 2 ** attempt)
+                    logger.warning(f"Transient {provider} error, retrying: {e}")
+                    await asyncio.sleep(random.uniform(0, delay))
+                    continue
+                self._record_failure(provider)
+                raise
+            except Exception:
+                self._record_failure(provider)
+                raise
+
+    def _record_failure(self, provider: str) -> None:
+        """Count a failed call, opening the circuit after too many in a row"""
+        breaker = self._breaker[provider]
+        breaker["fails"] += 1
+        if breaker["fails"] >= self.CIRCUIT_FAILURE_THRESHOLD:
+            breaker["open_until"] = time.monotonic() + self.CIRCUIT_OPEN_SECONDS
+            breaker["fails"] = 0
+            logger.error(f"{provider} failed {self.CIRCUIT_FAILURE_THRESHOLD} times in a row, "
+                         f"skipping it for {self.CIRCUIT_OPEN_SECONDS}s")
+
     async def get_gemini_response(self, prompt: str, context: str = "") -> ModelResponse:
         """Get response from Google Gemini"""
-        import time
         start_time = time.time()
         
         try:
-            full_prompt = f"{context}\n\nUser Query: {prompt}" if context else prompt
-            response = self.gemini_client.generate_content(full_prompt)
+            self._check_circuit("gemini")
+            cached_model = await self._get_cached_context_model(context) if context else None
+            if cached_model is not None:
+                # The context is already the cached prefix; send only the query
+                response = await self._call_provider("gemini", cached_model.generate_content, f"User Query: {prompt}")
+            else:
+                full_prompt = f"{context}\n\nUser Query: {prompt}" if context else prompt
+                response = await self._call_provider("gemini", self.gemini_client.generate_content, full_prompt)
             
             processing_time = time.time() - start_time
             
@@ -73,7 +245,8 @@ class FusionAIService:
                 confidence=confidence,
                 model_name="gemini-2.5-flash",
                 processing_time=processing_time,
-                token_count=len(response.text.split())
+                token_count=len(response.text.split()),
+                provider=Provider.GEMINI
             )
             
         except Exception as e:
@@ -82,39 +255,32 @@ class FusionAIService:
                 content=f"Gemini error: {str(e)}",
                 confidence=0.0,
                 model_name="gemini-2.5-flash",
-                processing_time=time.time() - start_time
+                processing_time=time.time() - start_time,
+                provider=Provider.GEMINI
             )
     
     async def get_groq_response(self, prompt: str, context: str = "") -> ModelResponse:
         """Get response from Groq"""
-        import time
         start_time = time.time()
         
         try:
-            messages = []
-            if context:
-                messages.append({"role": "system", "content": context})
-            messages.append({"role": "user", "content": prompt})
-            
-            response = self.groq_client.chat.completions.create(
-                model="llama-3.3-70b-versatile",  # Updated to current available model
-                messages=messages,
-                temperature=settings.TEMPERATURE,
-                max_tokens=settings.MAX_TOKENS
+            self._check_circuit("groq")
+            content, content_length, usage = await self._call_provider(
+                "groq", self._collect_groq_stream, prompt, context
             )
             
             processing_time = time.time() - start_time
-            content = response.choices[0].message.content
             
             # Calculate confidence based on response quality metrics
-            confidence = min(0.9, len(content) / 800 + 0.4)
+            confidence = min(0.9, content_length / 800 + 0.4)
             
             return ModelResponse(
                 content=content,
                 confidence=confidence,
                 model_name="llama-3.3-70b-versatile",
                 processing_time=processing_time,
-                token_count=response.usage.total_tokens if response.usage else len(content.split())
+                token_count=usage.total_tokens if usage else len(content.split()),
+                provider=Provider.GROQ
             )
             
         except Exception as e:
@@ -123,59 +289,251 @@ class FusionAIService:
                 content=f"Groq error: {str(e)}",
                 confidence=0.0,
                 model_name="llama-3.3-70b-versatile",
-                processing_time=time.time() - start_time
+                processing_time=time.time() - start_time,
+                provider=Provider.GROQ
             )
     
+    def _groq_stream(self, prompt: str, context: str = ""):
+        """Start a streamed Groq chat completion"""
+        messages = []
+        if context:
+            messages.append({"role": "system", "content": context})
+        messages.append({"role": "user", "content": prompt})
+        
+        return self.groq_client.chat.completions.create(
+            model="llama-3.3-70b-versatile",  # Updated to current available model
+            messages=messages,
+            temperature=settings.TEMPERATURE,
+            max_tokens=settings.MAX_TOKENS,
+            stream=True
+        )
+    
+    def _collect_groq_stream(self, prompt: str, context: str = "") -> Tuple[str, int, Optional[object]]:
+        """Read a streamed Groq completion: (content, content length, usage from the final chunk)"""
+        content_parts = []
+        content_length = 0
+        usage = None
+        for chunk in self._groq_stream(prompt, context):
+            if chunk.choices:
+                content_parts.append(chunk.choices[0].delta.content or "")
+                content_length += len(content_parts[-1])
+            usage = getattr(chunk.x_groq, "usage", None) or usage
+        return "".join(content_parts), content_length, usage
+    
+    def _gemini_stream(self, prompt: str, context: str = ""):
+        """Start a streamed Gemini completion"""
+        full_prompt = f"{context}\n\nUser Query: {prompt}" if context else prompt
+        return self.gemini_client.generate_content(full_prompt, stream=True)
+    
+    @staticmethod
+    def _groq_stream_texts(stream) -> Iterator[str]:
+        """Text deltas of a streamed Groq completion"""
+        for chunk in stream:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content or ""
+    
+    @staticmethod
+    def _gemini_stream_texts(stream) -> Iterator[str]:
+        """Text deltas of a streamed Gemini completion"""
+        for chunk in stream:
+            yield chunk.text
+    
+    @staticmethod
+    def _close_stream(stream) -> None:
+        """Release a provider stream's connection; safe from any thread and more than once"""
+        # Groq streams close their HTTP response; Gemini streams cancel the underlying call
+        close = getattr(stream, "close", None) or getattr(getattr(stream, "_iterator", None), "cancel", None)
+        if close is None:
+            return
+        try:
+            close()
+        except Exception as e:
+            logger.debug(f"Closing provider stream failed: {e}")
+    
+    def _produce_stream(self, open_stream: Callable[[], object], texts: Callable[[object], Iterator[str]],
+                        handle: Dict[str, object], queue: asyncio.Queue,
+                        loop: asyncio.AbstractEventLoop, stop: threading.Event) -> None:
+        """
+        Worker-thread body: forward a blocking provider stream to an asyncio queue until stopped.
+        The opened stream is published in handle["stream"] so a consumer can close it early.
+        """
+        stream = None
+        try:
+            stream = open_stream()
+            handle["stream"] = stream
+            if stop.is_set():
+                return
+            for text in texts(stream):
+                if stop.is_set():
+                    break
+                if text:
+                    loop.call_soon_threadsafe(queue.put_nowait, text)
+        except Exception as e:
+            # Reads fail once a stopped stream is closed under them; only report real errors
+            if not stop.is_set():
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            if stream is not None:
+                self._close_stream(stream)
+            loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+    
+    async def stream_fusion(self, prompt: str, context: str = "") -> AsyncIterator[Dict[str, str]]:
+        """
+        Stream the answer of whichever model starts responding first.
+        Yields {"model_name", "delta"} chunks; the slower model's stream is closed once a winner
+        is chosen, and every stream is closed when the consumer stops iterating.
+        """
+        sources = []
+        if self.gemini_client and self._breaker["gemini"]["open_until"] <= time.monotonic():
+            sources.append(("gemini", "gemini-2.5-flash",
+                            lambda: self._gemini_stream(prompt, context), self._gemini_stream_texts))
+        if self.groq_client and self._breaker["groq"]["open_until"] <= time.monotonic():
+            sources.append(("groq", "llama-3.3-70b-versatile",
+                            lambda: self._groq_stream(prompt, context), self._groq_stream_texts))
+        
+        if not sources:
+            raise ValueError("No AI models available")
+        
+        loop = asyncio.get_running_loop()
+        queues, stops, handles = {}, {}, {}
+        producers = []
+        
+        async def produce(provider, open_stream, texts):
+            async with self._semaphore:
+                await asyncio.to_thread(
+                    self._produce_stream, open_stream, texts, handles[provider], queues[provider], loop, stops[provider]
+                )
+        
+        def stop_provider(provider):
+            stops[provider].set()
+            stream = handles[provider].get("stream")
+            if stream is not None:
+                self._close_stream(stream)
+        
+        for provider, _, open_stream, texts in sources:
+            queues[provider] = asyncio.Queue()
+            stops[provider] = threading.Event()
+            handles[provider] = {}
+            producers.append(asyncio.create_task(produce(provider, open_stream, texts)))
+        
+        model_names = {provider: model_name for provider, model_name, _, _ in sources}
+        first_chunks = {asyncio.ensure_future(queue.get()): provider for provider, queue in queues.items()}
+        pending = set(first_chunks)
+        try:
+            # Race the providers to their first chunk
+            winner, first_chunk = None, None
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    item = task.result()
+                    if isinstance(item, Exception):
+                        logger.error(f"{first_chunks[task]} stream error: {item}")
+                        self._record_failure(first_chunks[task])
+                    elif item is not _STREAM_END and winner is None:
+                        winner, first_chunk = first_chunks[task], item
+            
+            if winner is None:
+                raise ValueError("All AI models failed to generate responses")
+            
+            for provider in queues:
+                if provider != winner:
+                    stop_provider(provider)
+            
+            yield {"model_name": model_names[winner], "delta": first_chunk}
+            queue = queues[winner]
+            while (item := await queue.get()) is not _STREAM_END:
+                if isinstance(item, Exception):
+                    logger.error(f"{winner} stream error: {item}")
+                    self._record_failure(winner)
+                    break
+                yield {"model_name": model_names[winner], "delta": item}
+            else:
+                self._breaker[winner]["fails"] = 0
+        finally:
+            for provider in queues:
+                stop_provider(provider)
+            for task in pending:
+                task.cancel()
+    
     async def fusion_generate(self, prompt: str, context: str = "") -> FusionResult:
         """
         Generate response using fusion AI technology combining multiple models
         """
+        cache_model = settings.FUSION_STRATEGY if settings.FUSION_AI_ENABLED else "single_model"
+        cached = self.prompt_cache.get("fusion", cache_model, prompt, context)
+        if cached is not None:
+            return replace(cached, processing_details={**cached.processing_details, "cache_hit": True})
+        
         if not settings.FUSION_AI_ENABLED:
             # Fallback to single model if fusion is disabled
             response = await self.get_gemini_response(prompt, context)
-            return FusionResult(
+            result = FusionResult(
                 final_response=response.content,
                 confidence_score=response.confidence,
                 model_responses=[response],
                 fusion_strategy="single_model",
                 processing_details={"fallback": True}
             )
+            if response.confidence > 0:
+                self.prompt_cache.put("fusion", cache_model, prompt, result, context)
+            return result
         
-        # Get responses from all available models concurrently
+        # Reuse confident answers a model already gave for this prompt and context
+        # (e.g. under another fusion strategy); ask the remaining models concurrently
+        reused_responses = []
         tasks = []
-        if self.gemini_client:
-            tasks.append(self.get_gemini_response(prompt, context))
-        if self.groq_client:
-            tasks.append(self.get_groq_response(prompt, context))
+        for client, model_name, get_response in (
+            (self.gemini_client, "gemini-2.5-flash", self.get_gemini_response),
+            (self.groq_client, "llama-3.3-70b-versatile", self.get_groq_response),
+        ):
+            if not client:
+                continue
+            reused = self.prompt_cache.get_exact(PromptCache.make_key("model", model_name, prompt, context))
+            if reused is not None and reused.confidence >= self.PROVIDER_REUSE_MIN_CONFIDENCE:
+                reused_responses.append(reused)
+            else:
+                tasks.append(get_response(prompt, context))
         
-        if not tasks:
+        if not tasks and not reused_responses:
             raise ValueError("No AI models available")
         
         model_responses = await asyncio.gather(*tasks, return_exceptions=True)
         
         # Filter out exceptions and failed responses
-        valid_responses = [
+        new_responses = [
             resp for resp in model_responses 
             if isinstance(resp, ModelResponse) and resp.confidence > 0
         ]
+        for resp in new_responses:
+            self.prompt_cache.put("model", resp.model_name, prompt, resp, context)
+        valid_responses = reused_responses + new_responses
         
         if not valid_responses:
             raise ValueError("All AI models failed to generate responses")
         
-        # Apply fusion strategy
+        # Apply fusion strategy; a result missing a failed model's answer isn't cached
         fusion_result = self._apply_fusion_strategy(valid_responses, settings.FUSION_STRATEGY)
+        if len(new_responses) == len(tasks):
+            self.prompt_cache.put("fusion", cache_model, prompt, fusion_result, context)
         
         return fusion_result
     
     def _apply_fusion_strategy(self, responses: List[ModelResponse], strategy: str) -> FusionResult:
         """Apply the specified fusion strategy to combine model responses"""
         
+        # One pass over the responses; strategies reuse the confidences from these details
+        response_lengths, confidences, processing_times = [], [], []
+        for r in responses:
+            response_lengths.append(len(r.content))
+            confidences.append(r.confidence)
+            processing_times.append(r.processing_time)
+        
         processing_details = {
             "total_models": len(responses),
             "strategy_used": strategy,
-            "response_lengths": [len(r.content) for r in responses],
-            "confidences": [r.confidence for r in responses],
-            "processing_times": [r.processing_time for r in responses]
+            "response_lengths": response_lengths,
+            "confidences": confidences,
+            "processing_times": processing_times
         }
         
         if strategy == "weighted_average":
@@ -191,54 +549,47 @@ class FusionAIService:
     def _weighted_average_fusion(self, responses: List[ModelResponse], details: Dict) -> FusionResult:
         """Combine responses using weighted averaging based on model weights"""
         
-        weights = []
-        contents = []
-        
-        for response in responses:
-            if "gemini" in response.model_name.lower():
-                weights.append(settings.GEMINI_WEIGHT * response.confidence)
-            elif "llama" in response.model_name.lower() or "groq" in response.model_name.lower():
-                weights.append(settings.GROQ_WEIGHT * response.confidence)
-            else:
-                weights.append(0.5 * response.confidence)  # Default weight
-            
-            contents.append(response.content)
+        # Indexed by Provider; other providers get a default weight
+        weight_table = (settings.GEMINI_WEIGHT, settings.GROQ_WEIGHT, 0.5)
+        weights = [
+            weight_table[response.provider] * confidence
+            for response, confidence in zip(responses, details["confidences"])
+        ]
         
         # Select the response with highest weighted confidence
-        max_weight_idx = weights.index(max(weights))
-        final_response = contents[max_weight_idx]
+        max_weight_idx, _ = max(enumerate(weights), key=operator.itemgetter(1))
+        final_response = responses[max_weight_idx].content
         
         # Calculate overall confidence
         avg_confidence = sum(weights) / len(weights)
         
-        details["weights_applied"] = weights
-        details["selected_model"] = responses[max_weight_idx].model_name
-        
         return FusionResult(
             final_response=final_response,
             confidence_score=avg_confidence,
             model_responses=responses,
             fusion_strategy="weighted_average",
-            processing_details=details
+            processing_details={
+                **details,
+                "weights_applied": weights,
+                "selected_model": responses[max_weight_idx].model_name
+            }
         )
     
     def _majority_vote_fusion(self, responses: List[ModelResponse], details: Dict) -> FusionResult:
         """Combine responses using majority voting (simplified implementation)"""
         
         # For text responses, we'll use the one with median length and highest confidence
-        sorted_responses = sorted(responses, key=lambda x: x.confidence, reverse=True)
-        final_response = sorted_responses[0].content
-        
-        avg_confidence = statistics.mean([r.confidence for r in responses])
+        winner = max(responses, key=lambda x: x.confidence)
+        final_response = winner.content
         
-        details["voting_winner"] = sorted_responses[0].model_name
+        avg_confidence = statistics.mean(details["confidences"])
         
         return FusionResult(
             final_response=final_response,
             confidence_score=avg_confidence,
             model_responses=responses,
             fusion_strategy="majority_vote",
-            processing_details=details
+            processing_details={**details, "voting_winner": winner.model_name}
         )
     
     def _best_confidence_fusion(self, responses: List[ModelResponse], details: Dict) -> FusionResult:
@@ -246,15 +597,16 @@ class FusionAIService:
         
         best_response = max(responses, key=lambda x: x.confidence)
         
-        details["selected_model"] = best_response.model_name
-        details["confidence_scores"] = {r.model_name: r.confidence for r in responses}
-        
         return FusionResult(
             final_response=best_response.content,
             confidence_score=best_response.confidence,
             model_responses=responses,
             fusion_strategy="best_confidence",
-            processing_details=details
+            processing_details={
+                **details,
+                "selected_model": best_response.model_name,
+                "confidence_scores": {r.model_name: c for r, c in zip(responses, details["confidences"])}
+            }
         )
     
     async def get_fusion_health_status(self) -> Dict:
@@ -0,0 +1,231 @@
+"""
+Prompt response cache for AI services
+Reuses earlier model responses for identical or semantically equivalent prompts
+"""
+import functools
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class PromptCache:
+    """
+    Two-tier LRU cache of AI responses.
+
+    The exact tier is keyed by a hash of (service, model, normalized prompt, context).
+    The semantic tier, enabled by passing an embedding function, also matches a
+    prompt whose embedding has cosine similarity >= semantic_threshold with a cached
+    prompt for the same service, model and context. Entries expire ttl_seconds
+    after they were cached.
+    """
+
+    DEFAULT_MAXSIZE = 10_000
+    DEFAULT_SEMANTIC_THRESHOLD = 0.90
+    DEFAULT_TTL_SECONDS = 3600
+    # Nearest cached prompts checked for a matching service/model/context
+    SEMANTIC_CANDIDATES = 8
+    # Prompt embeddings kept so a miss followed by put() embeds once
+    EMBEDDING_MEMO_SIZE = 256
+
+    def __init__(self,
+                 maxsize: int = DEFAULT_MAXSIZE,
+                 embed_fn: Optional[Callable[[str], Sequence[float]]] = None,
+                 semantic_threshold: float = DEFAULT_SEMANTIC_THRESHOLD,
+                 ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS):
+        """
+        Initialize prompt cache
+
+        Args:
+            maxsize: Maximum number of cached responses
+            embed_fn: Text embedding function; None disables the semantic tier.
+                It may return None to skip the semantic tier for a prompt.
+            semantic_threshold: Minimum cosine similarity for a semantic hit
+            ttl_seconds: Lifetime of a cached response; None keeps it until evicted
+        """
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self.semantic_enabled = embed_fn is not None and FAISS_AVAILABLE
+        if embed_fn is not None and not FAISS_AVAILABLE:
+            logger.warning("FAISS not available, prompt cache runs without the semantic tier")
+
+        # key -> (scope, semantic id or None, value, expiry on the monotonic clock)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._semantic_keys: Dict[int, str] = {}
+        self._semantic_index = None  # created on the first embedding, once its dimension is known
+        self._next_semantic_id = 0
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        if self.semantic_enabled:
+            def embed(text: str) -> Optional[np.ndarray]:
+                embedding = embed_fn(text)
+                return None if embedding is None else self._normalize_vector(embedding)
+            self._embed = functools.lru_cache(maxsize=self.EMBEDDING_MEMO_SIZE)(embed)
+
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        """Case- and whitespace-insensitive form of a prompt"""
+        return " ".join(prompt.lower().split())
+
+    @staticmethod
+    def _digest(*parts: str) -> str:
+        """blake2b hex digest of the parts, separated so field boundaries are unambiguous"""
+        return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+    @classmethod
+    def make_key(cls, service: str, model: str, prompt: str, context: str = "") -> str:
+        """Exact-tier key for a request"""
+        return cls._digest(service, model, cls.normalize_prompt(prompt), context)
+
+    @classmethod
+    def _scope(cls, service: str, model: str, context: str) -> str:
+        """Everything but the prompt; semantic hits must share it"""
+        return cls._digest(service, model, context)
+
+    @staticmethod
+    def _normalize_vector(embedding: Sequence[float]) -> np.ndarray:
+        """L2-normalized float32 row vector, so inner product is cosine similarity"""
+        vector = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _remove(self, key: str) -> None:
+        """Drop an entry from both tiers; the caller holds the lock"""
+        _, semantic_id, _, _ = self._entries.pop(key)
+        if semantic_id is not None:
+            self._semantic_index.remove_ids(np.array([semantic_id], dtype=np.int64))
+            del self._semantic_keys[semantic_id]
+
+    def get_exact(self, key: str) -> Optional[Any]:
+        """Cached value for an exact-tier key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[3] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def get_semantic(self, service: str, model: str, prompt: str, context: str = "",
+                     threshold: Optional[float] = None) -> Optional[Any]:
+        """Cached value of the most similar prompt with the same service, model and context"""
+        if not self.semantic_enabled or self._semantic_index is None:
+            return None
+
+        query = self._embed(self.normalize_prompt(prompt))
+        if query is None:
+            return None
+        threshold = self.semantic_threshold if threshold is None else threshold
+        scope = self._scope(service, model, context)
+
+        with self._lock:
+            if self._semantic_index.ntotal == 0 or query.shape[1] != self._semantic_index.d:
+                return None
+            scores, ids = self._semantic_index.search(query, min(self.SEMANTIC_CANDIDATES, self._semantic_index.ntotal))
+            now = time.monotonic()
+            for score, semantic_id in zip(scores[0], ids[0]):
+                if score < threshold:
+                    break
+                key = self._semantic_keys.get(int(semantic_id))
+                entry = self._entries.get(key) if key is not None else None
+                if entry is None or entry[0] != scope:
+                    continue
+                if entry[3] <= now:
+                    self._remove(key)
+                    continue
+                self._entries.move_to_end(key)
+                return entry[2]
+        return None
+
+    def get(self, service: str, model: str, prompt: str, context: str = "") -> Optional[Any]:
+        """Cached value for a request, trying the exact tier before the semantic tier"""
+        value = self.get_exact(self.make_key(service, model, prompt, context))
+        if value is not None:
+            self.exact_hits += 1
+            return value
+
+        try:
+            value = self.get_semantic(service, model, prompt, context)
+        except Exception as e:
+            logger.warning(f"Semantic prompt cache lookup failed: {e}")
+            value = None
+
+        if value is not None:
+            self.semantic_hits += 1
+        else:
+            self.misses += 1
+        return value
+
+    def put(self, service: str, model: str, prompt: str, value: Any, context: str = "") -> None:
+        """Cache a response in both tiers, evicting the least recently used entries"""
+        key = self.make_key(service, model, prompt, context)
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds is not None else float("inf")
+
+        embedding = None
+        if self.semantic_enabled:
+            try:
+                embedding = self._embed(self.normalize_prompt(prompt))
+            except Exception as e:
+                logger.warning(f"Could not embed prompt for the semantic cache: {e}")
+
+        with self._lock:
+            if key in self._entries:
+                scope, semantic_id, _, _ = self._entries.pop(key)
+                self._entries[key] = (scope, semantic_id, value, expires_at)
+                return
+
+            semantic_id = None
+            if embedding is not None:
+                if self._semantic_index is None:
+                    self._semantic_index = faiss.IndexIDMap2(faiss.IndexFlatIP(embedding.shape[1]))
+                if embedding.shape[1] == self._semantic_index.d:
+                    semantic_id = self._next_semantic_id
+                    self._next_semantic_id += 1
+                    self._semantic_index.add_with_ids(embedding, np.array([semantic_id], dtype=np.int64))
+                    self._semantic_keys[semantic_id] = key
+
+            self._entries[key] = (self._scope(service, model, context), semantic_id, value, expires_at)
+
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        """Drop every cached response"""
+        with self._lock:
+            self._entries.clear()
+            self._semantic_keys.clear()
+            if self._semantic_index is not None:
+                self._semantic_index.reset()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache size and hit rates per tier"""
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "semantic_enabled": self.semantic_enabled,
+            "ttl_seconds": self.ttl_seconds,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+        }
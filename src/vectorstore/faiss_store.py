@@ -20,19 +20,30 @@ logger = logging.getLogger(__name__)
 class FAISSVectorStore:
     """FAISS-based vector store for document embeddings"""
     
-    def __init__(self, dimension: int = 384, index_type: str = "flat"):
+    # IVF-PQ settings: 8-byte codes, and enough vectors to train 256 PQ centroids
+    # per sub-quantizer; smaller corpora are searched exactly
+    PQ_SUBQUANTIZERS = 8
+    IVFPQ_MIN_TRAIN_SIZE = 10000
+    IVFPQ_MAX_TRAIN_SIZE = 100000
+    
+    # Scalar-quantized flat indexes: per-component fp16, or 8-bit with trained ranges
+    SCALAR_QUANTIZER_FACTORIES = {"sqfp16": "SQfp16", "sq8": "SQ8"}
+    
+    def __init__(self, dimension: int = 384, index_type: str = "flat", nprobe: int = 16):
         """
         Initialize FAISS vector store
         
         Args:
             dimension: Dimension of the embeddings
-            index_type: Type of FAISS index ("flat", "ivf", "hnsw")
+            index_type: Type of FAISS index ("flat", "sqfp16", "sq8", "ivf", "ivfpq", "hnsw")
+            nprobe: Number of IVF cells scanned per query
         """
         self.dimension = dimension
         self.index_type = index_type
+        self.nprobe = nprobe
         self.index = None
         self.documents = []  # Store document metadata
-        self.embeddings = []  # Store embeddings for backup
+        self.embeddings = []  # Store embeddings for backup (float16)
         
         # Initialize FAISS index
         self._initialize_index()
@@ -44,15 +55,57 @@ class FAISSVectorStore:
         if self.index_type == "flat":
             # Flat index - exact search, good for smaller datasets
             self.index = faiss.IndexFlatIP(self.dimension)  # Inner product for cosine similarity
+        elif self.index_type in self.SCALAR_QUANTIZER_FACTORIES:
+            # Scalar-quantized exact scan - half (fp16) or a quarter (8-bit) of the
+            # bytes per vector; queries stay float32
+            self.index = faiss.index_factory(
+                self.dimension, self.SCALAR_QUANTIZER_FACTORIES[self.index_type], faiss.METRIC_INNER_PRODUCT
+            )
         elif self.index_type == "ivf":
             # IVF index - approximate search, good for larger datasets
             quantizer = faiss.IndexFlatIP(self.dimension)
             self.index = faiss.IndexIVFFlat(quantizer, self.dimension, 100)  # 100 clusters
+        elif self.index_type == "ivfpq":
+            # IVF-PQ index - compressed approximate search, built once enough
+            # vectors exist to train it; until then an exact fp16 scan is used
+            if self.dimension % self.PQ_SUBQUANTIZERS != 0:
+                raise ValueError(
+                    f"IVF-PQ needs a dimension divisible by {self.PQ_SUBQUANTIZERS}, got {self.dimension}"
+                )
+            self.index = faiss.index_factory(self.dimension, "SQfp16", faiss.METRIC_INNER_PRODUCT)
         elif self.index_type == "hnsw":
             # HNSW index - hierarchical navigable small world
             self.index = faiss.IndexHNSWFlat(self.dimension, 32)  # M=32
         else:
             raise ValueError(f"Unsupported index type: {self.index_type}")
+        
+        self.set_nprobe(self.nprobe)
+    
+    def set_nprobe(self, nprobe: int) -> None:
+        """Set how many IVF cells are scanned per query (ignored by non-IVF indexes)"""
+        self.nprobe = nprobe
+        if self.index is not None and self.index_type in ("ivf", "ivfpq"):
+            try:
+                faiss.extract_index_ivf(self.index).nprobe = nprobe
+            except RuntimeError:
+                pass  # ivfpq index still in its exact-search phase
+    
+    def _build_ivfpq_index(self, embeddings_array: np.ndarray):
+        """Train an IVF-PQ index with sqrt(N) cells and add every vector to it"""
+        nlist = max(1, int(np.sqrt(len(embeddings_array))))
+        index = faiss.index_factory(
+            self.dimension, f"IVF{nlist},PQ{self.PQ_SUBQUANTIZERS}", faiss.METRIC_INNER_PRODUCT
+        )
+        
+        training_set = embeddings_array
+        if len(training_set) > self.IVFPQ_MAX_TRAIN_SIZE:
+            rng = np.random.default_rng(42)
+            training_set = training_set[rng.choice(len(training_set), self.IVFPQ_MAX_TRAIN_SIZE, replace=False)]
+        
+        logger.info(f"Training IVF-PQ index ({nlist} cells) on {len(training_set)} vectors...")
+        index.train(training_set)
+        index.add(embeddings_array)
+        return index
     
     def add_documents(self, chunks: List[Dict[str, Any]]) -> None:
         """
@@ -96,22 +149,36 @@ class FAISSVectorStore:
         embeddings_array = np.vstack(embeddings)
         
         # Add to FAISS index
-        if self.index_type == "ivf" and not self.index.is_trained:
-            # Train IVF index if not already trained
-            logger.info("Training IVF index...")
-            self.index.train(embeddings_array)
-        
-        # Add embeddings to index
-        self.index.add(embeddings_array)
+        if (self.index_type == "ivfpq" and not isinstance(self.index, faiss.IndexIVF)
+                and len(self.documents) + len(embeddings) >= self.IVFPQ_MIN_TRAIN_SIZE):
+            # Replace the exact-search index with a trained IVF-PQ index over all vectors
+            self.index = self._build_ivfpq_index(np.vstack([*self.embeddings, embeddings_array]))
+            self.set_nprobe(self.nprobe)
+        else:
+            if not self.index.is_trained:
+                # Train IVF / 8-bit quantizer index if not already trained
+                logger.info(f"Training {self.index_type} index...")
+                self.index.train(embeddings_array)
+            
+            # Add embeddings to index
+            self.index.add(embeddings_array)
         
         # Store metadata and embeddings
         self.documents.extend(valid_chunks)
-        self.embeddings.extend(embeddings)
+        self.embeddings.extend(embeddings_array.astype(np.float16))
         
         logger.info(f"Added {len(embeddings)} documents to vector store")
         logger.info(f"Total documents: {len(self.documents)}")
     
-    def similarity_search(self, query_embedding: List[float], k: int = 5, threshold: float = 0.0) -> List[Dict[str, Any]]:
+    def _search_index(self, query_vecs: np.ndarray, k: int, nprobe: Optional[int] = None):
+        """Search the index, overriding nprobe for this call only on IVF indexes"""
+        params = None
+        if nprobe is not None and isinstance(self.index, faiss.IndexIVF):
+            params = faiss.SearchParametersIVF(nprobe=nprobe)
+        return self.index.search(query_vecs, min(k, len(self.documents)), params=params)
+    
+    def similarity_search(self, query_embedding: List[float], k: int = 5, threshold: float = 0.0,
+                          nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Perform similarity search
         
@@ -119,6 +186,7 @@ class FAISSVectorStore:
             query_embedding: Query embedding vector
             k: Number of results to return
             threshold: Minimum similarity threshold
+            nprobe: IVF cells to scan for this query (defaults to the store setting)
             
         Returns:
             List of similar documents with scores
@@ -137,7 +205,7 @@ class FAISSVectorStore:
         query_vec = query_vec.reshape(1, -1)
         
         # Search
-        scores, indices = self.index.search(query_vec, min(k, len(self.documents)))
+        scores, indices = self._search_index(query_vec, k, nprobe)
         
         # Process results
         results = []
@@ -153,6 +221,48 @@ class FAISSVectorStore:
         logger.info(f"Found {len(results)} similar documents (threshold={threshold})")
         return results
     
+    def similarity_search_batch(self, query_embeddings: np.ndarray, k: int = 5, threshold: float = 0.0,
+                                nprobe: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Perform similarity search for several queries in one index call
+        
+        Args:
+            query_embeddings: Query embedding matrix, one row per query
+            k: Number of results to return per query
+            threshold: Minimum similarity threshold
+            nprobe: IVF cells to scan per query (defaults to the store setting)
+            
+        Returns:
+            List of similar documents with scores, one list per query
+        """
+        query_vecs = np.array(query_embeddings, dtype=np.float32, ndmin=2)
+        if len(self.documents) == 0:
+            logger.warning("No documents in vector store")
+            return [[] for _ in range(len(query_vecs))]
+        
+        # Normalize query embeddings row-wise
+        norms = np.linalg.norm(query_vecs, axis=1, keepdims=True)
+        query_vecs = query_vecs / np.where(norms > 0, norms, 1.0)
+        
+        # Search all queries at once; FAISS parallelizes across rows
+        scores, indices = self._search_index(query_vecs, k, nprobe)
+        
+        batch_results = []
+        for row_scores, row_indices in zip(scores, indices):
+            results = []
+            for i, (score, idx) in enumerate(zip(row_scores, row_indices)):
+                if idx == -1 or score < threshold:  # -1 indicates no result found
+                    continue
+                
+                result = self.documents[idx].copy()
+                result['similarity_score'] = float(score)
+                result['rank'] = i + 1
+                results.append(result)
+            batch_results.append(results)
+        
+        logger.info(f"Searched {len(batch_results)} queries (threshold={threshold})")
+        return batch_results
+    
     def search_by_text(self, query_text: str, embedder, k: int = 5, threshold: float = 0.0) -> List[Dict[str, Any]]:
         """
         Search using text query (convenience method)
@@ -209,6 +319,7 @@ class FAISSVectorStore:
         metadata = {
             "dimension": self.dimension,
             "index_type": self.index_type,
+            "nprobe": self.nprobe,
             "total_documents": len(self.documents),
             "created_at": datetime.now().isoformat()
         }
@@ -245,13 +356,15 @@ class FAISSVectorStore:
         # Create instance
         instance = cls(
             dimension=metadata['dimension'],
-            index_type=metadata['index_type']
+            index_type=metadata['index_type'],
+            nprobe=metadata.get('nprobe', 16)
         )
         
         # Load FAISS index
         index_path = load_dir / "faiss.index"
         if index_path.exists():
             instance.index = faiss.read_index(str(index_path))
+            instance.set_nprobe(instance.nprobe)
         
         # Load documents
         docs_path = load_dir / "documents.json"
@@ -274,16 +387,19 @@ class FAISSVectorStore:
 class HealthAIVectorStore:
     """High-level vector store interface for HealthAI"""
     
-    def __init__(self, storage_path: str = "data/vectorstore", dimension: int = 384):
+    def __init__(self, storage_path: str = "data/vectorstore", dimension: int = 384, index_type: str = "flat"):
         """
         Initialize HealthAI vector store
         
         Args:
             storage_path: Path to store the vector database
             dimension: Embedding dimension
+            index_type: FAISS index type used when creating a new store
         """
         self.storage_path = storage_path
         self.dimension = dimension
+        self.index_type = index_type
+        self.version = 0  # Bumped whenever the indexed documents or default nprobe change
         self.vector_store = None
         
         # Try to load existing vector store, otherwise create new one
@@ -293,9 +409,9 @@ class HealthAIVectorStore:
                 logger.info("Loaded existing vector store")
             except Exception as e:
                 logger.warning(f"Failed to load existing vector store: {e}")
-                self.vector_store = FAISSVectorStore(dimension=dimension)
+                self.vector_store = FAISSVectorStore(dimension=dimension, index_type=index_type)
         else:
-            self.vector_store = FAISSVectorStore(dimension=dimension)
+            self.vector_store = FAISSVectorStore(dimension=dimension, index_type=index_type)
     
     def index_documents(self, chunks: List[Dict[str, Any]]) -> None:
         """
@@ -306,11 +422,18 @@ class HealthAIVectorStore:
         """
         logger.info(f"Indexing {len(chunks)} document chunks")
         self.vector_store.add_documents(chunks)
+        self.version += 1
         
         # Auto-save after indexing
         self.save()
     
-    def search(self, query_text: str, embedder, k: int = 5, threshold: float = 0.1) -> List[Dict[str, Any]]:
+    def search(self,
+               query_text: Optional[str] = None,
+               embedder=None,
+               k: int = 5,
+               threshold: float = 0.1,
+               query_embedding: Optional[List[float]] = None,
+               nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Search for relevant documents
         
@@ -319,12 +442,39 @@ class HealthAIVectorStore:
             embedder: Embedding model
             k: Number of results
             threshold: Similarity threshold
+            query_embedding: Precomputed query embedding; skips embedding query_text
+            nprobe: IVF cells to scan for this query (defaults to the store setting)
             
         Returns:
             List of relevant documents
         """
+        if query_embedding is not None:
+            return self.vector_store.similarity_search(query_embedding, k, threshold, nprobe)
         return self.vector_store.search_by_text(query_text, embedder, k, threshold)
     
+    def search_batch(self, query_embeddings: np.ndarray, k: int = 5, threshold: float = 0.1,
+                     nprobe: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search for relevant documents for several precomputed query embeddings
+        
+        Args:
+            query_embeddings: Query embedding matrix, one row per query
+            k: Number of results per query
+            threshold: Similarity threshold
+            nprobe: IVF cells to scan per query (defaults to the store setting)
+            
+        Returns:
+            List of relevant documents, one list per query
+        """
+        return self.vector_store.similarity_search_batch(query_embeddings, k, threshold, nprobe)
+    
+    def set_nprobe(self, nprobe: int) -> None:
+        """Set how many IVF cells approximate indexes scan per query"""
+        if nprobe != self.vector_store.nprobe:
+            # Results searched with the old default are stale for callers relying on it
+            self.version += 1
+        self.vector_store.set_nprobe(nprobe)
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get vector store statistics"""
         stats = self.vector_store.get_stats()
@@ -337,7 +487,12 @@ class HealthAIVectorStore:
     
     def clear(self) -> None:
         """Clear all documents from vector store"""
-        self.vector_store = FAISSVectorStore(dimension=self.dimension)
+        self.vector_store = FAISSVectorStore(
+            dimension=self.dimension,
+            index_type=self.index_type,
+            nprobe=self.vector_store.nprobe
+        )
+        self.version += 1
         logger.info("Cleared vector store")
 
 
@@ -0,0 +1,99 @@
+"""
+Unit tests for the cost-aware AI service helpers
+"""
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from src.services import cost_aware_ai
+from src.services.cost_aware_ai import CostAwareAIService, RequestCoalescer
+from src.services.prompt_cache import PromptCache
+
+
+class TestRequestCoalescer:
+    """Test cases for single-flight coalescing of identical requests"""
+
+    @staticmethod
+    def _provider(result=None, error=None, delay=0.05):
+        """Provider call that counts invocations and returns or raises after a delay"""
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(delay)
+            if error is not None:
+                raise error
+            return result
+        return call, calls
+
+    @pytest.mark.asyncio
+    async def test_identical_requests_share_one_call(self):
+        """Test that concurrent callers with one key get the leader's result"""
+        coalescer = RequestCoalescer()
+        call, calls = self._provider(result="answer")
+
+        results = await asyncio.gather(*[coalescer.run("key", call) for _ in range(3)])
+
+        assert len(calls) == 1
+        assert results == [("answer", True), ("answer", False), ("answer", False)]
+        assert await coalescer.run("key", call) == ("answer", True)
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_error_reaches_every_caller(self):
+        """Test that a failed call raises for all callers and isn't reused"""
+        coalescer = RequestCoalescer()
+        call, calls = self._provider(error=ValueError("rate limited"))
+
+        results = await asyncio.gather(*[coalescer.run("key", call) for _ in range(2)], return_exceptions=True)
+
+        assert len(calls) == 1
+        assert all(isinstance(result, ValueError) for result in results)
+        assert coalescer._in_flight == {}
+
+    @pytest.mark.asyncio
+    async def test_leader_cancellation_does_not_reach_followers(self):
+        """Test that a cancelled leader leaves the shared call running for followers"""
+        coalescer = RequestCoalescer()
+        call, calls = self._provider(result="answer")
+
+        leader = asyncio.create_task(coalescer.run("key", call))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(coalescer.run("key", call))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        assert await follower == ("answer", False)
+        assert leader.cancelled()
+        assert len(calls) == 1
+
+
+class TestPromptCacheOffLoop:
+    """Test that prompt cache lookups stay off the event loop"""
+
+    @pytest.mark.asyncio
+    async def test_cache_embeds_in_worker_thread(self, monkeypatch):
+        """Test that the semantic tier's embedding never runs on the loop thread"""
+        loop_thread = threading.get_ident()
+        embed_threads = []
+
+        def embed(text):
+            embed_threads.append(threading.get_ident())
+            return np.ones(4, dtype=np.float32)
+
+        response = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="answer"))],
+            usage=SimpleNamespace(prompt_tokens=3, completion_tokens=2)
+        )
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: response)))
+        monkeypatch.setattr(cost_aware_ai, "_groq_client", lambda: client)
+        service = CostAwareAIService(prompt_cache=PromptCache(embed_fn=embed))
+        monkeypatch.setattr(service.cost_tracker, "track_ai_usage", lambda **usage: None)
+
+        first = await service.call_groq_with_tracking("What is hypertension?")
+        second = await service.call_groq_with_tracking("What is hypertension?")
+
+        assert first["response"] == second["response"] == "answer"
+        assert embed_threads and loop_thread not in embed_threads
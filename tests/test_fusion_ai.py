@@ -0,0 +1,296 @@
+"""
+Unit tests for the fusion AI service
+"""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import groq
+import httpx
+import pytest
+from src.core.config import settings
+from src.services.fusion_ai import FusionAIService, ModelResponse, Provider
+
+
+class StubFusionAIService(FusionAIService):
+    """Fusion service whose provider responses are scripted per test"""
+
+    def __init__(self, gemini_confidence=0.85, groq_confidence=0.6):
+        super().__init__()
+        self.gemini_client = object()
+        self.groq_client = object()
+        self.confidences = {"gemini": gemini_confidence, "groq": groq_confidence}
+        self.calls = []
+
+    async def get_gemini_response(self, prompt, context=""):
+        self.calls.append("gemini")
+        return ModelResponse("Gemini answer", self.confidences["gemini"], "gemini-2.5-flash", 0.1,
+                             provider=Provider.GEMINI)
+
+    async def get_groq_response(self, prompt, context=""):
+        self.calls.append("groq")
+        return ModelResponse("Groq answer", self.confidences["groq"], "llama-3.3-70b-versatile", 0.1,
+                             provider=Provider.GROQ)
+
+
+class TestFusionGenerate:
+    """Test cases for fused answer caching"""
+
+    @pytest.fixture(autouse=True)
+    def fusion_settings(self, monkeypatch):
+        monkeypatch.setattr(settings, "FUSION_AI_ENABLED", True)
+        monkeypatch.setattr(settings, "FUSION_STRATEGY", "weighted_average")
+
+    @pytest.mark.asyncio
+    async def test_degraded_result_not_cached(self):
+        """Test that a fusion missing a failed model's answer is recomputed next time"""
+        service = StubFusionAIService(groq_confidence=0.0)
+
+        first = await service.fusion_generate("what is asthma?")
+        service.confidences["groq"] = 0.6
+        second = await service.fusion_generate("what is asthma?")
+
+        assert len(first.model_responses) == 1
+        assert len(second.model_responses) == 2
+        assert "cache_hit" not in second.processing_details
+
+    @pytest.mark.asyncio
+    async def test_complete_result_cached(self):
+        """Test that a fusion with every model's answer is served from the cache"""
+        service = StubFusionAIService()
+
+        await service.fusion_generate("what is asthma?")
+        cached = await service.fusion_generate("what is asthma?")
+
+        assert service.calls == ["gemini", "groq"]
+        assert cached.processing_details["cache_hit"] is True
+
+
+    @pytest.mark.asyncio
+    async def test_confident_model_answers_reused_across_strategies(self, monkeypatch):
+        """Test that only model answers with confidence >= 0.8 skip that model's call"""
+        service = StubFusionAIService(gemini_confidence=0.85, groq_confidence=0.6)
+        await service.fusion_generate("what is asthma?", "guide")
+
+        monkeypatch.setattr(settings, "FUSION_STRATEGY", "best_confidence")
+        result = await service.fusion_generate("what is asthma?", "guide")
+
+        assert service.calls == ["gemini", "groq", "groq"]
+        assert [r.model_name for r in result.model_responses] == ["gemini-2.5-flash", "llama-3.3-70b-versatile"]
+        assert result.final_response == "Gemini answer"
+
+
+class RecordingModel:
+    """Stands in for a Gemini GenerativeModel, recording the prompts it receives"""
+
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        return SimpleNamespace(text="Answer")
+
+
+class TestGeminiContextCache:
+    """Test cases for Gemini explicit context caching"""
+
+    CONTEXT = "Asthma guideline. " * 300
+
+    @pytest.fixture
+    def service(self):
+        service = FusionAIService()
+        service.gemini_client = RecordingModel()
+        service.cached_model = RecordingModel()
+        service.uploads = []
+
+        def create_cached_context_model(context):
+            service.uploads.append(context)
+            time.sleep(0.05)  # Let concurrent misses overlap
+            return service.cached_model
+
+        service._create_cached_context_model = create_cached_context_model
+        return service
+
+    @pytest.mark.asyncio
+    async def test_context_cached_once_when_reused(self, service):
+        """Test that a context is sent in full first, then uploaded once for concurrent reuses"""
+        assert await service._get_cached_context_model(self.CONTEXT) is None
+        assert service.uploads == []
+
+        models = await asyncio.gather(*[service._get_cached_context_model(self.CONTEXT) for _ in range(3)])
+
+        assert service.uploads == [self.CONTEXT]
+        assert all(model is service.cached_model for model in models)
+
+    @pytest.mark.asyncio
+    async def test_cached_request_sends_only_the_query(self, service):
+        """Test that requests after caching omit the context from the prompt"""
+        await service.get_gemini_response("What triggers asthma?", self.CONTEXT)
+        await service.get_gemini_response("What triggers asthma?", self.CONTEXT)
+
+        assert service.gemini_client.prompts == [f"{self.CONTEXT}\n\nUser Query: What triggers asthma?"]
+        assert service.cached_model.prompts == ["User Query: What triggers asthma?"]
+
+
+def _timeout_error():
+    return groq.APITimeoutError(request=httpx.Request("POST", "https://api.groq.com"))
+
+
+class TestProviderResilience:
+    """Test cases for provider retries and the circuit breaker"""
+
+    @pytest.fixture
+    def service(self, monkeypatch):
+        monkeypatch.setattr(FusionAIService, "RETRY_BASE_DELAY_SECONDS", 0.001)
+        return FusionAIService()
+
+    @staticmethod
+    def _scripted(outcomes):
+        """Blocking provider call that raises or returns the next scripted outcome"""
+        calls = []
+
+        def call():
+            outcome = outcomes[len(calls)]
+            calls.append(outcome)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        return call, calls
+
+    @pytest.mark.asyncio
+    async def test_retries_only_transient_errors(self, service):
+        """Test that timeouts are retried and other errors fail on the first attempt"""
+        call, calls = self._scripted([_timeout_error(), _timeout_error(), "ok"])
+        assert await service._call_provider("groq", call) == "ok"
+        assert len(calls) == 3
+
+        call, calls = self._scripted([ValueError("bad request"), "ok"])
+        with pytest.raises(ValueError):
+            await service._call_provider("groq", call)
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_circuit_opens_after_consecutive_failures(self, service):
+        """Test that three failed calls open the circuit and later calls skip the API"""
+        for _ in range(service.CIRCUIT_FAILURE_THRESHOLD):
+            call, _ = self._scripted([ValueError("bad request")])
+            with pytest.raises(ValueError):
+                await service._call_provider("groq", call)
+        assert service._breaker["groq"]["open_until"] > time.monotonic()
+
+        def create(**kwargs):
+            raise AssertionError("provider called while its circuit is open")
+        service.groq_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+        response = await service.get_groq_response("What is asthma?")
+        assert response.confidence == 0.0
+        assert "circuit open" in response.content
+
+    @pytest.mark.asyncio
+    async def test_success_resets_failure_count(self, service):
+        """Test that only consecutive failures count towards opening the circuit"""
+        for outcome in [ValueError("a"), ValueError("b"), "ok", ValueError("c"), ValueError("d")]:
+            call, _ = self._scripted([outcome])
+            if isinstance(outcome, Exception):
+                with pytest.raises(ValueError):
+                    await service._call_provider("gemini", call)
+            else:
+                await service._call_provider("gemini", call)
+
+        assert service._breaker["gemini"]["fails"] == 2
+        assert service._breaker["gemini"]["open_until"] == 0.0
+
+
+class FakeGroqStream:
+    """Streamed completion that yields scripted deltas; closing it ends reads like a dropped connection"""
+
+    def __init__(self, deltas, delay=0.0, error=None):
+        self.deltas = deltas
+        self.delay = delay
+        self.error = error
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+    def _chunk(self, delta):
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+    def __iter__(self):
+        if self.closed.wait(self.delay):
+            raise ConnectionError("stream closed")
+        if self.error is not None:
+            raise self.error
+        for delta in self.deltas:
+            if self.closed.wait(0.01):
+                raise ConnectionError("stream closed")
+            yield self._chunk(delta)
+
+
+class FakeGeminiStream(FakeGroqStream):
+    """Gemini streams have no close(); they are stopped by cancelling the underlying call"""
+
+    close = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._iterator = SimpleNamespace(cancel=self.closed.set)
+
+    def _chunk(self, delta):
+        return SimpleNamespace(text=delta)
+
+
+class TestStreamFusion:
+    """Test cases for first-responder streaming"""
+
+    @staticmethod
+    def _service(gemini_stream, groq_stream):
+        service = FusionAIService()
+        service.gemini_client = SimpleNamespace(generate_content=lambda prompt, stream: gemini_stream)
+        service.groq_client = SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: groq_stream))
+        )
+        return service
+
+    @pytest.mark.asyncio
+    async def test_first_responder_wins_and_loser_is_closed(self):
+        """Test that the faster model streams and the slower model's stream is closed"""
+        gemini = FakeGeminiStream(["Gemini"], delay=5.0)
+        groq_stream = FakeGroqStream(["Hello ", "world"])
+        service = self._service(gemini, groq_stream)
+
+        chunks = [chunk async for chunk in service.stream_fusion("What is asthma?")]
+
+        assert chunks == [
+            {"model_name": "llama-3.3-70b-versatile", "delta": "Hello "},
+            {"model_name": "llama-3.3-70b-versatile", "delta": "world"}
+        ]
+        assert gemini.closed.is_set()
+
+    @pytest.mark.asyncio
+    async def test_failed_provider_falls_back_to_other(self):
+        """Test that an error before the first chunk hands the stream to the other model"""
+        gemini = FakeGeminiStream(["Gem", "ini"], delay=0.05)
+        groq_stream = FakeGroqStream([], error=ValueError("rate limited"))
+        service = self._service(gemini, groq_stream)
+
+        chunks = [chunk async for chunk in service.stream_fusion("What is asthma?")]
+
+        assert "".join(chunk["delta"] for chunk in chunks) == "Gemini"
+        assert {chunk["model_name"] for chunk in chunks} == {"gemini-2.5-flash"}
+        assert service._breaker["groq"]["fails"] == 1
+
+    @pytest.mark.asyncio
+    async def test_abandoned_stream_closes_every_provider(self):
+        """Test that a consumer leaving early closes both provider streams"""
+        gemini = FakeGeminiStream(["Gemini"], delay=5.0)
+        groq_stream = FakeGroqStream(["chunk "] * 100)
+        service = self._service(gemini, groq_stream)
+
+        stream = service.stream_fusion("What is asthma?")
+        assert (await stream.__anext__())["delta"] == "chunk "
+        await stream.aclose()
+
+        assert groq_stream.closed.is_set()
+        assert gemini.closed.is_set()
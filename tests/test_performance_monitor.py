@@ -0,0 +1,321 @@
+"""
+Unit tests for the real-time performance monitor
+"""
+import json
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+import pytest
+from src.monitoring.performance_monitor import (
+    AlertRule, FloatRing, MetricsRingBuffer, PerformanceMonitor, RAGPerformanceTracker, SlidingWindow
+)
+
+
+class TestPerformanceMonitor:
+    """Test cases for metric recording, persistence and alerting"""
+    
+    @pytest.fixture
+    def db_path(self, tmp_path):
+        return str(tmp_path / "metrics.db")
+    
+    @pytest.fixture
+    def monitor(self, db_path):
+        monitor = PerformanceMonitor(db_path=db_path)
+        yield monitor
+        monitor.close()
+    
+    def _stored_rows(self, db_path):
+        with sqlite3.connect(db_path) as conn:
+            payloads = conn.execute("SELECT payload FROM metrics_batches ORDER BY id").fetchall()
+        return [
+            (name, value)
+            for (payload,) in payloads
+            for _, name, value, _ in json.loads(zlib.decompress(payload))
+        ]
+    
+    def test_flush_persists_batch(self, db_path, monkeypatch):
+        """Test that queued metrics are packed into a single batch row"""
+        # Keep the background writer idle so the explicit flush sees every metric
+        monkeypatch.setattr(PerformanceMonitor, "FLUSH_INTERVAL_SECONDS", 60)
+        monitor = PerformanceMonitor(db_path=db_path)
+        for i in range(100):
+            monitor.record_metric("response_time", float(i), {"model_used": "gemini"})
+        monitor.flush()
+        monitor.close()
+        
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM metrics_batches").fetchone() == (1,)
+        
+        rows = self._stored_rows(db_path)
+        assert len(rows) == 100
+        assert rows[0] == ("response_time", 0.0)
+        assert rows[-1] == ("response_time", 99.0)
+    
+    def test_metric_history_range(self, monitor):
+        """Test reading persisted values back for one metric"""
+        start = datetime.now() - timedelta(minutes=1)
+        monitor.record_metric("response_time", 1.0)
+        monitor.record_metric("confidence_score", 0.9)
+        monitor.record_metric("response_time", 2.0)
+        monitor.flush()
+        
+        history = monitor.get_metric_history("response_time", start)
+        assert [point["value"] for point in history] == [1.0, 2.0]
+        assert monitor.get_metric_history("response_time", start, start) == []
+    
+    def test_metric_history_includes_per_metric_rows(self, db_path):
+        """Test that rows stored before batching are still returned"""
+        recorded = datetime.now() - timedelta(seconds=30)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("""
+                CREATE TABLE performance_metrics (
+                    id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, metric_name TEXT NOT NULL,
+                    value REAL NOT NULL, metadata TEXT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute(
+                "INSERT INTO performance_metrics (timestamp, metric_name, value) VALUES (?, ?, ?)",
+                (recorded.isoformat(), "response_time", 0.5)
+            )
+        
+        monitor = PerformanceMonitor(db_path=db_path)
+        monitor.record_metric("response_time", 1.0)
+        monitor.flush()
+        history = monitor.get_metric_history("response_time", recorded - timedelta(minutes=1))
+        monitor.close()
+        
+        assert [point["value"] for point in history] == [0.5, 1.0]
+    
+    def test_close_flushes_pending_metrics(self, db_path):
+        """Test that closing the monitor persists a partial buffer"""
+        monitor = PerformanceMonitor(db_path=db_path)
+        monitor.record_metric("confidence_score", 0.8)
+        monitor.close()
+        
+        assert self._stored_rows(db_path) == [("confidence_score", 0.8)]
+    
+    def test_background_thread_flushes(self, monitor, db_path):
+        """Test that the writer thread persists metrics without an explicit flush"""
+        monitor.record_metric("response_time", 1.5)
+        
+        deadline = time.time() + 5
+        while not self._stored_rows(db_path) and time.time() < deadline:
+            time.sleep(0.05)
+        
+        assert self._stored_rows(db_path) == [("response_time", 1.5)]
+    
+    def test_alert_triggered_above_threshold(self, monitor):
+        """Test that the default response time rule fires after enough samples"""
+        for _ in range(3):
+            monitor.record_metric("response_time", 10.0)
+        monitor.flush()
+        
+        alerts = monitor.get_performance_dashboard()["recent_alerts"]
+        assert alerts
+        assert alerts[-1]["rule_name"] == "High Response Time"
+        assert alerts[-1]["severity"] == "critical"
+    
+    def test_alert_checks_are_rate_limited(self, monitor):
+        """Test that a burst of breaching values raises one alert per interval"""
+        for _ in range(10):
+            monitor.record_metric("response_time", 10.0)
+        monitor.flush()
+        
+        assert len(monitor.recent_alerts) == 1
+    
+    def test_skipped_check_runs_on_later_flush(self, db_path, monkeypatch):
+        """Test that a crossing inside the check interval alerts even if the metric goes quiet"""
+        monkeypatch.setattr(PerformanceMonitor, "FLUSH_INTERVAL_SECONDS", 60)
+        monkeypatch.setattr(PerformanceMonitor, "ALERT_CHECK_INTERVAL_SECONDS", 0.05)
+        monitor = PerformanceMonitor(db_path=db_path)
+        for value in (1.0, 1.0, 1.0, 10.0):
+            monitor.record_metric("response_time", value)
+        monitor.flush()
+        assert not monitor.recent_alerts
+        
+        time.sleep(0.1)
+        monitor.flush()
+        monitor.close()
+        
+        assert [a["rule_name"] for a in monitor.recent_alerts] == ["High Response Time"]
+        assert monitor.recent_alerts[0]["current_value"] == 10.0
+    
+    def test_equals_rule_tracks_window(self, monitor):
+        """Test that equality rules fire while a matching sample is in the window"""
+        monitor.add_rule(AlertRule(
+            name="Cache Always Hit",
+            metric_name="cache_hit_ratio",
+            threshold=1.0,
+            comparison="equals",
+            window_minutes=5,
+            min_samples=2
+        ))
+        monitor.record_metric("cache_hit_ratio", 0.5)
+        monitor.record_metric("cache_hit_ratio", 0.995)
+        monitor.flush()
+        
+        alerts = monitor.get_performance_dashboard()["recent_alerts"]
+        assert [a["rule_name"] for a in alerts] == ["Cache Always Hit"]
+    
+    def test_no_alert_below_min_samples(self, monitor):
+        """Test that rules wait for min_samples before firing"""
+        monitor.record_metric("response_time", 10.0)
+        monitor.record_metric("response_time", 10.0)
+        monitor.flush()
+        
+        assert monitor.get_current_metrics()["active_alerts"] == 0
+    
+    def test_current_metrics_summary(self, monitor):
+        """Test hourly aggregates for recorded metrics"""
+        for value in (1.0, 2.0, 3.0):
+            monitor.record_metric("documents_retrieved", value)
+        
+        summary = monitor.get_current_metrics()["metrics"]["documents_retrieved"]
+        assert summary["current"] == 3.0
+        assert summary["average_1h"] == pytest.approx(2.0)
+        assert summary["min_1h"] == 1.0
+        assert summary["max_1h"] == 3.0
+        assert summary["count_1h"] == 3
+    
+    def test_concurrent_record_and_read(self, monitor, monkeypatch):
+        """Test that writers and dashboard reads share the hourly windows safely"""
+        # Tiny span so reads evict too, racing the writers' max_samples eviction
+        monkeypatch.setattr(monitor, "STATS_WINDOW_SECONDS", 0.001)
+        monkeypatch.setattr(monitor, "STATS_MAX_SAMPLES", 50)
+        # Switch threads often so unlocked window updates would interleave
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        errors = []
+        
+        def record():
+            try:
+                for i in range(2000):
+                    monitor.record_metric("response_time", float(i % 7))
+            except Exception as e:
+                errors.append(e)
+        
+        writers = [threading.Thread(target=record) for _ in range(4)]
+        try:
+            for writer in writers:
+                writer.start()
+            while any(writer.is_alive() for writer in writers):
+                monitor.get_current_metrics()
+            for writer in writers:
+                writer.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+        
+        assert errors == []
+        window = monitor._hourly_stats["response_time"]
+        values = [value for _, value in window.samples]
+        assert len(values) <= 50
+        assert window.total == pytest.approx(sum(values))
+        if values:
+            assert window.max() == max(values)
+            assert window.min() == min(values)
+    
+    def test_performance_trends(self, monitor):
+        """Test trend detection over the last 20 timer values"""
+        for value in [2.0] * 1000 + [1.0] * 10:
+            monitor.record_metric("response_time", value)
+        
+        trends = monitor.get_performance_dashboard()["performance_trends"]
+        assert trends["response_time"] == "improving"
+        assert trends["confidence_score"] == "insufficient_data"
+        assert len(monitor.timers["response_time"]) == 1000
+    
+    def test_rag_tracker_records_query(self, monitor):
+        """Test that tracking a query feeds the dashboard"""
+        tracker = RAGPerformanceTracker(monitor)
+        tracker.track_query("What is diabetes?", {
+            "answer": "A metabolic disease",
+            "confidence": 0.9,
+            "model_used": "gemini",
+            "sources": ["doc_1", "doc_2"]
+        }, 1.2)
+        
+        dashboard = monitor.get_performance_dashboard()
+        assert dashboard["key_metrics"]["response_time"]["current"] == 1.2
+        assert dashboard["model_usage"]["model_distribution"]["gemini"] == 100.0
+
+
+class TestSlidingWindow:
+    """Test cases for the alert sliding window"""
+    
+    def test_min_max_track_window(self):
+        """Test that min/max follow evictions"""
+        window = SlidingWindow(span_seconds=3.0)
+        for ts, value in enumerate([5.0, 1.0, 4.0, 2.0, 3.0]):
+            window.append(float(ts), value)
+        
+        assert window.max() == 5.0
+        assert window.min() == 1.0
+        
+        window.slide(5.0)
+        assert len(window) == 3
+        assert window.max() == 4.0
+        assert window.min() == 2.0
+        assert window.recent(2) == [2.0, 3.0]
+    
+    def test_max_samples_bounds_window(self):
+        """Test that capped windows keep sum/min/max consistent"""
+        window = SlidingWindow(span_seconds=60.0, max_samples=3)
+        for ts, value in enumerate([9.0, 1.0, 2.0, 3.0]):
+            window.append(float(ts), value)
+        
+        assert len(window) == 3
+        assert window.max() == 3.0
+        assert window.min() == 1.0
+        assert window.mean() == pytest.approx(2.0)
+        assert window.latest() == 3.0
+
+
+class TestMetricsRingBuffer:
+    """Test cases for the struct-of-arrays metrics buffer"""
+    
+    def test_wraps_and_overwrites_oldest(self):
+        """Test that the ring keeps only the newest entries"""
+        ring = MetricsRingBuffer(capacity=4)
+        for i in range(6):
+            metadata = {"model_used": f"model_{i}"} if i % 2 == 0 else {}
+            ring.append(float(i), "response_time", float(i), metadata)
+        
+        assert len(ring) == 4
+        assert sorted(ring.values.tolist()) == [2.0, 3.0, 4.0, 5.0]
+        assert ring.recent_metadata(10) == [{"model_used": "model_2"}, {"model_used": "model_4"}]
+        assert ring.recent_metadata(1) == []
+    
+    def test_read_resumes_and_reports_overwrites(self):
+        """Test reading published entries in order and skipping lapped ones"""
+        ring = MetricsRingBuffer(capacity=4)
+        for i in range(3):
+            ring.append(float(i), f"metric_{i}", float(i))
+        
+        metrics, next_index, dropped = ring.read(0, limit=2)
+        assert [m.metric_name for m in metrics] == ["metric_0", "metric_1"]
+        assert (next_index, dropped) == (2, 0)
+        
+        for i in range(3, 9):
+            ring.append(float(i), "metric_n", float(i))
+        
+        metrics, next_index, dropped = ring.read(next_index, limit=10)
+        assert [m.value for m in metrics] == [5.0, 6.0, 7.0, 8.0]
+        assert (next_index, dropped) == (9, 3)
+
+
+class TestFloatRing:
+    """Test cases for the timer ring"""
+    
+    def test_latest_is_contiguous_after_wrap(self):
+        """Test that the newest values come back in order across the wrap point"""
+        ring = FloatRing(5)
+        for value in range(8):
+            ring.append(float(value))
+        
+        assert len(ring) == 5
+        assert ring.latest(3).tolist() == [5.0, 6.0, 7.0]
+        assert ring.latest(10).tolist() == [3.0, 4.0, 5.0, 6.0, 7.0]
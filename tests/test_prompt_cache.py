@@ -0,0 +1,72 @@
+"""
+Unit tests for the AI prompt response cache
+"""
+import numpy as np
+import pytest
+from src.services.prompt_cache import PromptCache
+
+
+def _bag_of_words_embedding(text):
+    """Deterministic toy embedding: word counts hashed into 64 buckets"""
+    vector = np.zeros(64)
+    for word in text.split():
+        vector[sum(map(ord, word)) % 64] += 1
+    return vector
+
+
+class TestPromptCache:
+    """Test cases for exact and semantic response reuse"""
+
+    def test_exact_hits_ignore_case_and_whitespace(self):
+        """Test that normalized prompts hit and other models or contexts miss"""
+        cache = PromptCache()
+        cache.put("gemini", "1.5-pro", "What is   hypertension?", {"response": "High blood pressure"})
+
+        assert cache.get("gemini", "1.5-pro", "what is hypertension?") == {"response": "High blood pressure"}
+        assert cache.get("gemini", "1.5-flash", "what is hypertension?") is None
+        assert cache.get("gemini", "1.5-pro", "what is hypertension?", context="cardiology.pdf") is None
+        assert cache.get_stats()["exact_hits"] == 1
+
+    def test_semantic_hit_requires_same_context(self):
+        """Test that a paraphrase hits only for the same service, model and context"""
+        pytest.importorskip("faiss")
+        cache = PromptCache(embed_fn=_bag_of_words_embedding, semantic_threshold=0.85)
+        cache.put("fusion", "weighted_average", "what is diabetes treatment", "answer", context="guide")
+
+        assert cache.get("fusion", "weighted_average", "what is diabetes treatment please", "guide") == "answer"
+        assert cache.get("fusion", "weighted_average", "what is diabetes treatment please", "other") is None
+        assert cache.get_stats()["semantic_hits"] == 1
+
+    def test_lru_eviction_removes_semantic_entries(self):
+        """Test that evicted responses leave both tiers"""
+        pytest.importorskip("faiss")
+        cache = PromptCache(maxsize=2, embed_fn=_bag_of_words_embedding)
+        for i in range(3):
+            cache.put("groq", "llama3-70b", f"question number {i}", i)
+
+        assert cache.get("groq", "llama3-70b", "question number 0") is None
+        assert cache.get("groq", "llama3-70b", "question number 2") == 2
+        assert cache._semantic_index.ntotal == 2
+
+    def test_entries_expire_after_ttl(self, monkeypatch):
+        """Test that responses stop being served once their TTL has passed"""
+        now = [1000.0]
+        monkeypatch.setattr("src.services.prompt_cache.time.monotonic", lambda: now[0])
+        cache = PromptCache(ttl_seconds=60)
+        cache.put("gemini", "1.5-pro", "what is asthma?", "answer")
+
+        now[0] += 59
+        assert cache.get("gemini", "1.5-pro", "what is asthma?") == "answer"
+        now[0] += 2
+        assert cache.get("gemini", "1.5-pro", "what is asthma?") is None
+        assert cache.get_stats()["size"] == 0
+
+    def test_embedding_unavailable_uses_exact_tier_only(self):
+        """Test that an embedder returning None leaves exact matching working"""
+        pytest.importorskip("faiss")
+        cache = PromptCache(embed_fn=lambda text: None)
+        cache.put("groq", "llama3-70b", "what is asthma?", "answer")
+
+        assert cache.get("groq", "llama3-70b", "What is asthma?") == "answer"
+        assert cache.get("groq", "llama3-70b", "what is asthma please?") is None
+        assert cache._semantic_index is None
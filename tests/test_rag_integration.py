@@ -9,9 +9,10 @@ import shutil
 import numpy as np
 from typing import List
 import time
+import faiss
 
 # Test imports
-from src.vectorstore.faiss_store import FAISSVectorStore
+from src.vectorstore.faiss_store import FAISSVectorStore, HealthAIVectorStore
 
 
 class TestRAGPipelineIntegration:
@@ -205,6 +206,99 @@ class TestRAGPipelineIntegration:
             assert r1["text"] == r2["text"]
             assert abs(r1["similarity_score"] - r2["similarity_score"]) < 1e-6
 
+    def test_batch_search_matches_single_searches(self, sample_medical_documents):
+        """Test that one batched index search returns the per-query results"""
+        vectorstore = FAISSVectorStore(dimension=384)
+        vectorstore.add_documents(sample_medical_documents)
+
+        rng = np.random.default_rng(7)
+        query_embeddings = rng.random((4, 384))
+        batch_results = vectorstore.similarity_search_batch(query_embeddings, k=2)
+
+        assert len(batch_results) == 4
+        for query_embedding, results in zip(query_embeddings, batch_results):
+            single_results = vectorstore.similarity_search(query_embedding.tolist(), k=2)
+            assert [r["text"] for r in results] == [r["text"] for r in single_results]
+            for batched, single in zip(results, single_results):
+                assert abs(batched["similarity_score"] - single["similarity_score"]) < 1e-5
+
+    def test_parallel_pdf_parsing_matches_sequential(self, temp_vectorstore_dir):
+        """Test that worker-process parsing returns the in-process chunks in order"""
+        fitz = pytest.importorskip("fitz")
+        from src.ingestion.pdf_parser import PDFParser
+
+        for i in range(5):
+            document = fitz.open()
+            document.new_page().insert_text((72, 72), f"Guideline {i}. Monitor blood pressure daily.")
+            document.save(f"{temp_vectorstore_dir}/guideline_{i}.pdf")
+            document.close()
+        with open(f"{temp_vectorstore_dir}/corrupt.pdf", "wb") as f:
+            f.write(b"not a pdf")
+
+        parser = PDFParser(chunk_size=200, chunk_overlap=20)
+        sequential = parser.process_multiple_pdfs(temp_vectorstore_dir, max_workers=1)
+        parallel = parser.process_multiple_pdfs(temp_vectorstore_dir, max_workers=3)
+
+        assert len(sequential) == 5
+        assert parallel == sequential
+
+    @pytest.mark.parametrize("index_type", ["sqfp16", "sq8"])
+    def test_scalar_quantized_store_matches_flat_search(self, index_type):
+        """Test that compressed vectors keep the exact store's nearest neighbour"""
+        rng = np.random.default_rng(3)
+        chunks = [
+            {"text": f"doc {i}", "source": "corpus.pdf", "embedding": rng.standard_normal(64).tolist()}
+            for i in range(200)
+        ]
+        flat_store = FAISSVectorStore(dimension=64)
+        quantized_store = FAISSVectorStore(dimension=64, index_type=index_type)
+        flat_store.add_documents(chunks)
+        quantized_store.add_documents(chunks)
+        assert quantized_store.embeddings[0].dtype == np.float16
+
+        for query_embedding in rng.standard_normal((5, 64)):
+            exact = flat_store.similarity_search(query_embedding.tolist(), k=1)[0]
+            approx = quantized_store.similarity_search(query_embedding.tolist(), k=1)[0]
+            assert approx["text"] == exact["text"]
+            assert abs(approx["similarity_score"] - exact["similarity_score"]) < 0.02
+
+    def test_ivfpq_index_built_once_corpus_is_large_enough(self, monkeypatch):
+        """Test that the IVF-PQ store searches exactly until it can train"""
+        monkeypatch.setattr(FAISSVectorStore, "IVFPQ_MIN_TRAIN_SIZE", 1000)
+        rng = np.random.default_rng(42)
+        vectorstore = FAISSVectorStore(dimension=32, index_type="ivfpq", nprobe=4)
+
+        vectorstore.add_documents([
+            {"text": f"doc {i}", "source": "small.pdf", "embedding": rng.random(32).tolist()}
+            for i in range(10)
+        ])
+        assert vectorstore.get_stats()["index_size"] == 10
+        assert len(vectorstore.similarity_search(rng.random(32).tolist(), k=3)) == 3
+
+        vectorstore.add_documents([
+            {"text": f"doc {i}", "source": "large.pdf", "embedding": rng.random(32).tolist()}
+            for i in range(10, 1000)
+        ])
+        assert vectorstore.get_stats()["index_size"] == 1000
+        assert faiss.extract_index_ivf(vectorstore.index).nprobe == 4
+        assert len(vectorstore.similarity_search(rng.random(32).tolist(), k=5)) == 5
+
+        # A per-query nprobe must not change the store-wide setting
+        assert len(vectorstore.similarity_search(rng.random(32).tolist(), k=5, nprobe=32)) == 5
+        assert faiss.extract_index_ivf(vectorstore.index).nprobe == 4
+
+    def test_changing_default_nprobe_bumps_version(self, temp_vectorstore_dir):
+        """Test that retrieval caches keyed on the store version drop results from the old nprobe"""
+        vectorstore = HealthAIVectorStore(f"{temp_vectorstore_dir}/store", dimension=32, index_type="ivfpq")
+        version = vectorstore.version
+
+        vectorstore.set_nprobe(vectorstore.vector_store.nprobe)
+        assert vectorstore.version == version
+
+        vectorstore.set_nprobe(64)
+        assert vectorstore.vector_store.nprobe == 64
+        assert vectorstore.version == version + 1
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
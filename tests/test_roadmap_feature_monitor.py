@@ -0,0 +1,181 @@
+"""
+Unit tests for the roadmap feature monitor
+"""
+import logging
+import time
+
+import numpy as np
+import pytest
+from src.monitoring import roadmap_feature_monitor
+from src.monitoring.roadmap_feature_monitor import RoadmapFeatureMonitor
+
+
+class TestRoadmapFeatureMonitor:
+    """Test cases for suggestion/search metric aggregation"""
+
+    @pytest.fixture
+    def monitor(self, monkeypatch):
+        # Keep the background flusher idle so each test controls batching
+        monkeypatch.setattr(RoadmapFeatureMonitor, "FLUSH_INTERVAL_SECONDS", 60)
+        monitor = RoadmapFeatureMonitor()
+        yield monitor
+        monitor.close()
+
+    def test_suggestion_averages(self, monitor):
+        """Test the response-time EWMA and the suggestion count mean"""
+        for response_time_ms, count in [(10.0, 3), (20.0, 5), (60.0, 7)]:
+            monitor.record_suggestion_metrics(
+                {"query": "diabetes treatment"}, {"count": count}, response_time_ms, True
+            )
+        monitor.record_suggestion_metrics({"query": "chest pain"}, {}, 500.0, False)
+
+        performance = monitor.get_performance_report().query_suggestions
+        assert performance.total_requests == 4
+        assert performance.success_rate == 0.75
+        # Seeded with 10ms, then 10 + 0.02 * (20 - 10), then 10.2 + 0.02 * (60 - 10.2)
+        assert performance.avg_response_time_ms == pytest.approx(11.196)
+        assert performance.avg_suggestions_per_request == pytest.approx(5.0)
+
+    def test_similarity_average_counts_only_searches_with_results(self, monitor):
+        """Test that the similarity average ignores searches without results"""
+        monitor.record_search_metrics(
+            {"use_ml_ranking": True},
+            {"count": 2, "results": [{"similarity_score": 0.8}, {"similarity_score": 0.6}]},
+            100.0, True
+        )
+        monitor.record_search_metrics({}, {"count": 0, "results": []}, 300.0, True)
+
+        report = monitor.get_performance_report().advanced_search
+        assert report.avg_search_time_ms == pytest.approx(104.0)
+        assert report.avg_results_per_search == pytest.approx(1.0)
+        assert report.avg_similarity_score == pytest.approx(0.7)
+        assert report.ml_ranking_usage_rate == 0.5
+
+    def test_alerts_aggregated_between_summaries(self, monitor, caplog):
+        """Test that alerts are summarized instead of logged per breach"""
+        for _ in range(5):
+            monitor.record_search_metrics({}, {}, 50.0, False)
+        monitor.flush()
+        for _ in range(3):
+            monitor.record_search_metrics({}, {}, 50.0, False)
+        monitor.flush()
+
+        failure_logs = [r.getMessage() for r in caplog.records if "search requests failed" in r.getMessage()]
+        assert failure_logs == ["🚨 5 search requests failed"]
+        assert monitor.metrics["advanced_search"]["failed_searches"] == 8
+
+        monitor.close()
+        failure_logs = [r.getMessage() for r in caplog.records if "search requests failed" in r.getMessage()]
+        assert failure_logs[-1] == "🚨 3 search requests failed"
+
+    def test_idle_flush_logs_pending_alerts(self, monitor, caplog, monkeypatch):
+        """Test that breaches from a final burst are logged once traffic stops"""
+        monitor.record_search_metrics({}, {}, 50.0, False)
+        monitor.flush()
+        for _ in range(2):
+            monitor.record_search_metrics({}, {}, 50.0, False)
+        monitor.flush()
+
+        # No new events; the summary interval passing is enough
+        monkeypatch.setattr(time, "monotonic", lambda: monitor._last_alert_summary + monitor.ALERT_SUMMARY_INTERVAL_SECONDS)
+        monitor.flush()
+
+        failure_logs = [r.getMessage() for r in caplog.records if "search requests failed" in r.getMessage()]
+        assert failure_logs == ["🚨 1 search requests failed", "🚨 2 search requests failed"]
+
+    def test_failures_logged_at_error_level(self, monkeypatch, caplog):
+        """Test that failure alerts aren't dropped when warnings are disabled"""
+        monkeypatch.setattr(RoadmapFeatureMonitor, "FLUSH_INTERVAL_SECONDS", 60)
+        caplog.set_level(logging.ERROR, logger=roadmap_feature_monitor.logger.name)
+        monitor = RoadmapFeatureMonitor()
+        try:
+            monitor.record_search_metrics({}, {}, 5000.0, False)
+            monitor.flush()
+        finally:
+            monitor.close()
+
+        messages = [r.getMessage() for r in caplog.records]
+        assert "🚨 1 search requests failed" in messages
+        assert not any("response time alert" in message for message in messages)
+
+    def test_top_query_patterns(self, monitor):
+        """Test that the most frequent queries are reported first"""
+        queries = ["diabetes"] * 5 + ["hypertension"] * 3 + [f"rare query {i}" for i in range(30)]
+        for query in queries:
+            monitor.record_suggestion_metrics({"query": query}, {"count": 3}, 10.0, True)
+
+        top_queries = monitor.get_performance_report().query_suggestions.top_queries
+        assert len(top_queries) == 10
+        assert top_queries[0] == {"query": "diabetes", "count": 5}
+        assert top_queries[1] == {"query": "hypertension", "count": 3}
+
+    def test_report_cached_until_metrics_change(self, monitor):
+        """Test that an idle monitor serves the cached report"""
+        monitor.record_search_metrics({}, {"count": 1}, 100.0, True)
+        first = monitor.get_performance_report()
+        assert monitor.get_performance_report() is first
+        assert monitor.report_cache_hit_rate == 0.5
+
+        monitor.record_search_metrics({}, {"count": 1}, 100.0, True)
+        refreshed = monitor.get_performance_report()
+        assert refreshed is not first
+        assert refreshed.advanced_search.total_searches == 2
+
+    def test_flush_during_report_build_not_cached(self, monitor, monkeypatch):
+        """Test that metrics flushed while a report is built aren't hidden behind it"""
+        monitor.record_search_metrics({}, {"count": 1}, 100.0, True)
+        build_status = monitor._get_search_health_status
+
+        def flush_mid_build(success_rate):
+            # The background flusher folding a new event while the report is built
+            monkeypatch.setattr(monitor, "_get_search_health_status", build_status)
+            monitor.record_search_metrics({}, {"count": 1}, 100.0, True)
+            monitor.flush()
+            return build_status(success_rate)
+
+        monkeypatch.setattr(monitor, "_get_search_health_status", flush_mid_build)
+        assert monitor.get_performance_report().advanced_search.total_searches == 1
+        assert monitor.get_performance_report().advanced_search.total_searches == 2
+
+    def test_similarity_scores_array(self, monitor):
+        """Test that producers can pass similarity scores as an array"""
+        monitor.record_search_metrics(
+            {}, {"count": 3, "similarity_scores": np.array([0.9, 0.6, 0.3])}, 100.0, True
+        )
+
+        performance = monitor.get_performance_report().advanced_search
+        assert performance.avg_similarity_score == pytest.approx(0.6)
+
+    def test_malformed_payloads_are_normalized(self, monitor):
+        """Test that malformed request/response payloads do not break aggregation"""
+        monitor.record_suggestion_metrics(None, {"count": "many"}, 10.0, True)
+        monitor.record_search_metrics({}, {"count": 2, "results": "not a list"}, 20.0, True)
+        monitor.record_search_metrics({}, {"count": 2, "results": [None, {"similarity_score": 0.5}]}, 40.0, True)
+
+        report = monitor.get_performance_report()
+        assert report.query_suggestions.avg_suggestions_per_request == 0
+        assert report.advanced_search.avg_search_time_ms == pytest.approx(20.4)
+        assert report.advanced_search.avg_similarity_score == pytest.approx(0.25)
+
+    def test_slow_responses_alert_on_recent_average(self, monitor, caplog):
+        """Test that the fast EWMA flags a recent slowdown the reported EWMA smooths over"""
+        for _ in range(50):
+            monitor.record_suggestion_metrics({}, {"count": 3}, 20.0, True)
+        for _ in range(3):
+            monitor.record_suggestion_metrics({}, {"count": 3}, 900.0, True)
+        monitor.flush()
+
+        alerts = [r.getMessage() for r in caplog.records if "response time alert" in r.getMessage()]
+        assert len(alerts) == 1 and alerts[0].startswith("🚨 suggestions")
+        assert monitor.metrics["query_suggestions"]["avg_response_time_ms"] < 200
+
+    def test_report_dict_layout(self, monitor):
+        """Test that the report serializes to the nested JSON layout"""
+        monitor.record_suggestion_metrics({"query": "asthma inhaler"}, {"count": 4}, 15.0, True)
+
+        report = monitor.get_performance_report().to_dict()
+        assert report["query_suggestions"]["performance"]["total_requests"] == 1
+        assert report["query_suggestions"]["usage_patterns"]["top_queries"] == [
+            {"query": "asthma inhaler", "count": 1}
+        ]
+        assert report["overall_assessment"]["production_readiness"] == "development_only"